@@ -49,6 +49,7 @@ def create_app(config_name=None):
     from routes.production import production_bp
     from routes.transactions import transactions_bp
     from routes.inventory import inventory_bp
+    from routes.reports import reports_bp
     
     app.register_blueprint(categories_bp, url_prefix='/api')
     app.register_blueprint(products_bp, url_prefix='/api')
@@ -58,6 +59,7 @@ def create_app(config_name=None):
     app.register_blueprint(production_bp, url_prefix='/api')
     app.register_blueprint(transactions_bp, url_prefix='/api')
     app.register_blueprint(inventory_bp, url_prefix='/api')
+    app.register_blueprint(reports_bp, url_prefix='/api')
 
     # 初始化数据库
     try:
@@ -66,7 +68,14 @@ def create_app(config_name=None):
         logging.getLogger(__name__).info("数据库初始化完成")
     except Exception as e:
         logging.getLogger(__name__).error(f"数据库初始化失败: {e}")
-    
+
+    # 启动事件总线（库存预警等事件由后台线程分发给处理器）
+    try:
+        from core.events import event_bus
+        event_bus.start()
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"事件系统启动失败: {e}")
+
     # 错误处理
     @app.errorhandler(404)
     def not_found(error):
@@ -100,7 +109,8 @@ def create_app(config_name=None):
                 'transactions': '/api/transactions',
                 'orders': '/api/orders',
                 'production': '/api/production',
-                'inventory': '/api/inventory'
+                'inventory': '/api/inventory',
+                'reports': '/api/reports'
             }
         })
     
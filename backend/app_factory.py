@@ -1,5 +1,5 @@
 """应用工厂优化"""
-from flask import Flask
+from flask import Flask, request
 import logging
 from typing import Optional
 
@@ -155,11 +155,15 @@ class ApplicationFactory:
         def get_metrics():
             try:
                 from utils.performance import PerformanceMonitor
+                from utils.database import db_manager
+                from services.bom_engine import bom_cache
                 
                 metrics = {
                     'database_queries': PerformanceMonitor.get_summary('database_query'),
                     'api_requests': PerformanceMonitor.get_summary('api_request'),
-                    'cache_stats': PerformanceMonitor.get_summary('cache_hit')
+                    'cache_stats': PerformanceMonitor.get_summary('cache_hit'),
+                    'bom_cache': bom_cache.get_stats(),
+                    'connection_pool': db_manager.get_pool_stats()
                 }
                 
                 return APIResponse.success(data=metrics, message="监控指标获取成功")
@@ -167,6 +171,26 @@ class ApplicationFactory:
                 logger.error("监控指标获取失败: %s", e)
                 return APIResponse.error("监控指标获取失败")
         
+        @app.route('/api/monitoring/queries')
+        def get_query_stats():
+            try:
+                from utils.database import db_manager
+                
+                if db_manager.profiler is None:
+                    return APIResponse.error("查询剖析未启用", code=404)
+                
+                limit = request.args.get('limit', 20, type=int)
+                sort_by = request.args.get('sort', 'total_ms')
+                if sort_by not in ('total_ms', 'avg_ms', 'max_ms', 'count', 'rows', 'slow_count'):
+                    return APIResponse.error(f"不支持的排序字段: {sort_by}", code=400)
+                
+                data = db_manager.profiler.summary()
+                data['top'] = db_manager.profiler.top(limit=limit, sort_by=sort_by)
+                return APIResponse.success(data=data, message="查询统计获取成功")
+            except Exception as e:
+                logger.error("查询统计获取失败: %s", e)
+                return APIResponse.error("查询统计获取失败")
+        
         logger.debug("性能监控设置完成")
     
     @staticmethod
@@ -17,6 +17,51 @@ class BaseConfig:
     DATABASE_PATH: ClassVar[str] = os.path.join(DATA_DIR, 'inventory.db')
     SQLALCHEMY_DATABASE_URI: ClassVar[str] = f'sqlite:///{DATABASE_PATH}'
     
+    # 连接池配置
+    DB_CONNECTION_MODE: str = "pooled"  # pooled 或 single_writer（单写连接 + 只读连接池）
+    DB_POOL_MIN_SIZE: int = 5  # 常驻连接数，超出部分为溢出连接，归还时关闭
+    DB_POOL_MAX_SIZE: int = 10  # 连接总数上限
+    DB_POOL_TIMEOUT: float = 10.0  # 获取连接的最长等待时间（秒）
+    DB_POOL_HEALTH_CHECK_INTERVAL: float = 60.0  # 空闲超过该时间（秒）的连接在借出前做健康检查
+    
+    # 查询剖析：按指纹聚合耗时，超过阈值的查询连同查询计划写入慢查询日志
+    QUERY_PROFILING_ENABLED: bool = True
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    SLOW_QUERY_LOG_FILE: str = "slow_queries.log"
+    QUERY_STATS_MAX_FINGERPRINTS: int = 500  # 最多跟踪的查询指纹数
+    
+    # SQLite 性能配置：每个连接创建时应用所选配置中的 PRAGMA
+    SQLITE_PROFILE: str = "balanced"
+    SQLITE_PROFILES: ClassVar[Dict[str, Dict[str, Any]]] = {
+        # 每次提交都落盘，断电也不丢已提交事务
+        'durable': {
+            'busy_timeout': 10000,
+            'synchronous': 'FULL',
+            'cache_size': -16000,  # 负数单位为KiB，约16MB
+            'mmap_size': 0,
+            'temp_store': 'DEFAULT',
+            'wal_autocheckpoint': 1000,
+        },
+        # WAL + NORMAL：进程崩溃不丢数据，断电可能丢最后几个事务
+        'balanced': {
+            'busy_timeout': 5000,
+            'synchronous': 'NORMAL',
+            'cache_size': -32000,
+            'mmap_size': 64 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+            'wal_autocheckpoint': 1000,
+        },
+        # 不等待落盘，仅适合开发、测试和可重建的数据
+        'throughput': {
+            'busy_timeout': 5000,
+            'synchronous': 'OFF',
+            'cache_size': -64000,
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+            'wal_autocheckpoint': 4000,
+        },
+    }
+    
     # 应用配置
     DEBUG: bool = False
     TESTING: bool = False
@@ -63,12 +108,16 @@ class DevelopmentConfig(BaseConfig):
     """开发环境配置"""
     DEBUG: bool = True
     LOG_LEVEL: str = "DEBUG"
+    SQLITE_PROFILE: str = "throughput"
 
 class ProductionConfig(BaseConfig):
     """生产环境配置"""
     DEBUG: bool = False
     LOG_LEVEL: str = "INFO"
     CORS_ORIGINS: str = "http://localhost:3000,https://yourdomain.com"
+    DB_CONNECTION_MODE: str = "single_writer"
+    SQLITE_PROFILE: str = "durable"
+    DB_POOL_MAX_SIZE: int = 20
 
 class TestingConfig(BaseConfig):
     """测试环境配置"""
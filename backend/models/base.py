@@ -1,9 +1,9 @@
 """优化后的基础模型类"""
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from contextlib import contextmanager
 import logging
-from utils.database import db_manager, serialize_rows, serialize_row
-from utils.error_handler import DatabaseError, NotFoundError
+from utils.database import db_manager, serialize_row
+from utils.error_handler import AppError, DatabaseError, NotFoundError
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +13,12 @@ class BaseModel:
     # 表名，子类需要重写
     TABLE_NAME: str = None
     
+    # INSERT ... RETURNING 返回的列，子类可追加关联子查询使结果与 get_by_id 一致
+    INSERT_RETURNING: str = '*'
+    
+    # create_many 每个 executemany 批次的行数
+    BULK_CHUNK_SIZE: int = 1000
+    
     @classmethod
     def get_table_name(cls) -> str:
         """获取表名"""
@@ -24,8 +30,16 @@ class BaseModel:
     def execute_query(cls, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
         """执行查询并返回结果"""
         try:
-            rows = db_manager.execute_query(query, params)
-            return serialize_rows(rows)
+            return db_manager.fetch_dicts(query, params)
+        except Exception as e:
+            logger.error("查询执行失败: %s, 参数: %s", query, params)
+            raise DatabaseError(f"数据库查询失败: {str(e)}")
+    
+    @classmethod
+    def iter_query(cls, query: str, params: tuple = ()) -> Iterator[Dict[str, Any]]:
+        """以生成器形式逐行返回查询结果（用于流式响应）"""
+        try:
+            yield from db_manager.iter_query(query, params)
         except Exception as e:
             logger.error("查询执行失败: %s, 参数: %s", query, params)
             raise DatabaseError(f"数据库查询失败: {str(e)}")
@@ -48,9 +62,28 @@ class BaseModel:
             logger.error("批量操作失败: %s, 参数数量: %s", query, len(params_list))
             raise DatabaseError(f"数据库批量操作失败: {str(e)}")
     
+    @classmethod
+    def insert_returning(cls, query: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
+        """执行 INSERT 并返回新记录
+        
+        SQLite 支持 RETURNING 时一条语句完成插入和取回；否则按 lastrowid 回读。
+        """
+        try:
+            record_id, row = db_manager.execute_insert(query, params, cls.INSERT_RETURNING)
+        except Exception as e:
+            logger.error("插入执行失败: %s, 参数: %s", query, params)
+            raise DatabaseError(f"数据库插入失败: {str(e)}")
+        
+        if row is not None:
+            return serialize_row(row)
+        return cls.get_by_id(record_id) if record_id else None
+    
     @classmethod
     def get_last_insert_id(cls) -> Optional[int]:
-        """获取最后插入的行ID"""
+        """获取最后插入的行ID
+        
+        注意：仅在工作单元内与 INSERT 使用同一连接时结果可靠，新代码请使用 insert_returning。
+        """
         try:
             with db_manager.get_connection() as conn:
                 cursor = conn.execute("SELECT last_insert_rowid()")
@@ -112,17 +145,151 @@ class BaseModel:
         query = f'INSERT INTO {cls.TABLE_NAME} ({", ".join(columns)}) VALUES ({", ".join(placeholders)})'
         
         try:
-            cls.execute_update(query, tuple(values))
-            record_id = cls.get_last_insert_id()
+            record = cls.insert_returning(query, tuple(values))
             
-            if record_id:
-                return cls.get_by_id(record_id)
+            if record:
+                return record
             else:
                 raise DatabaseError("创建记录失败，无法获取记录ID")
         except Exception as e:
             logger.error("创建记录失败: %s", e)
             raise DatabaseError(f"创建记录失败: {str(e)}")
     
+    @classmethod
+    def validate_bulk_row(cls, row: Dict[str, Any]) -> Dict[str, Any]:
+        """校验并规范化 create_many 的单行数据，子类按需重写"""
+        return dict(row)
+    
+    @classmethod
+    def prepare_bulk_rows(cls, rows: List[Dict[str, Any]]) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+        """批量校验，返回 ([(行号, 数据)], [错误])
+        
+        默认逐行调用 validate_bulk_row；需要跨行或查库校验的子类可重写此方法一次性完成。
+        """
+        valid, errors = [], []
+        for index, row in enumerate(rows):
+            try:
+                valid.append((index, cls.validate_bulk_row(row)))
+            except (AppError, ValueError, TypeError) as e:
+                errors.append(cls._bulk_error(index, e))
+        return valid, errors
+    
+    @classmethod
+    def after_bulk_insert(cls, conn, created: List[Tuple[int, Dict[str, Any]]]) -> None:
+        """批量插入成功后在同一事务内执行的钩子，created 为 [(新ID, 数据)]"""
+    
+    @classmethod
+    def create_many(cls, rows: List[Dict[str, Any]], chunk_size: int = None) -> Dict[str, Any]:
+        """批量创建记录
+        
+        先整体校验，再在一个事务内按批次 executemany 插入。某个批次失败时回滚到
+        该批次的保存点并逐行重试，只有出错的行被跳过，其余行照常写入。
+        
+        Returns:
+            {'created': 成功数, 'failed': 失败数, 'ids': 按输入顺序的新ID（失败行为 None），
+             'errors': [{'index': 行号, 'error': 错误信息, 'field': 字段}]}
+        """
+        table = cls.get_table_name()
+        chunk_size = chunk_size or cls.BULK_CHUNK_SIZE
+        ids: List[Optional[int]] = [None] * len(rows)
+        
+        valid, errors = cls.prepare_bulk_rows(rows)
+        
+        # 按列集合分组，保证每组列顺序固定，未提供的列使用表默认值
+        groups: Dict[Tuple[str, ...], List[Tuple[int, Dict[str, Any]]]] = {}
+        for index, data in valid:
+            groups.setdefault(tuple(data.keys()), []).append((index, data))
+        
+        created: List[Tuple[int, Dict[str, Any]]] = []
+        try:
+            with db_manager.transaction() as conn:
+                for columns, group in groups.items():
+                    query = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+                    for start in range(0, len(group), chunk_size):
+                        chunk = group[start:start + chunk_size]
+                        for index, record_id, data in cls._insert_chunk(conn, query, columns, chunk, errors):
+                            ids[index] = record_id
+                            created.append((record_id, data))
+                if created:
+                    cls.after_bulk_insert(conn, created)
+        except AppError:
+            raise
+        except Exception as e:
+            logger.error("批量创建失败: 表=%s, 错误=%s", table, e)
+            raise DatabaseError(f"批量创建失败: {str(e)}")
+        
+        errors.sort(key=lambda error: error['index'])
+        logger.info("批量创建完成: 表=%s, 成功=%s, 失败=%s", table, len(created), len(errors))
+        return {
+            'created': len(created),
+            'failed': len(errors),
+            'ids': ids,
+            'errors': errors
+        }
+    
+    @classmethod
+    def _insert_chunk(cls, conn, query: str, columns: Tuple[str, ...],
+                      chunk: List[Tuple[int, Dict[str, Any]]],
+                      errors: List[Dict[str, Any]]) -> List[Tuple[int, int, Dict[str, Any]]]:
+        """插入一个批次，返回 [(行号, 新ID, 数据)]，失败的行记入 errors"""
+        params_list = [tuple(data[column] for column in columns) for _, data in chunk]
+        table = cls.get_table_name()
+        
+        conn.execute('SAVEPOINT bulk_chunk')
+        try:
+            max_before = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM {table}').fetchone()[0]
+            conn.executemany(query, params_list)
+        except Exception as e:
+            conn.execute('ROLLBACK TO SAVEPOINT bulk_chunk')
+            conn.execute('RELEASE SAVEPOINT bulk_chunk')
+            logger.warning("批次插入失败，改为逐行插入: %s", e)
+            return cls._insert_rows(conn, query, chunk, params_list, errors)
+        
+        if 'id' in columns:
+            new_ids = [data['id'] for _, data in chunk]
+        else:
+            # executemany 不返回各行的 rowid：只有新行恰好占满 (插入前最大ID, last_insert_rowid] 区间时
+            # 才能按顺序对应；rowid 达到上限后随机分配等情况下回滚本批次，改为逐行插入取回ID
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            first_id = last_id - len(chunk) + 1
+            count = conn.execute(
+                f'SELECT COUNT(*) FROM {table} WHERE rowid BETWEEN ? AND ?', (first_id, last_id)
+            ).fetchone()[0]
+            if first_id <= max_before or count != len(chunk):
+                conn.execute('ROLLBACK TO SAVEPOINT bulk_chunk')
+                conn.execute('RELEASE SAVEPOINT bulk_chunk')
+                logger.warning("批次插入的ID不连续，改为逐行插入: 表=%s", table)
+                return cls._insert_rows(conn, query, chunk, params_list, errors)
+            new_ids = range(first_id, last_id + 1)
+        conn.execute('RELEASE SAVEPOINT bulk_chunk')
+        return [(index, record_id, data) for (index, data), record_id in zip(chunk, new_ids)]
+    
+    @classmethod
+    def _insert_rows(cls, conn, query: str, chunk: List[Tuple[int, Dict[str, Any]]],
+                     params_list: List[tuple], errors: List[Dict[str, Any]]) -> List[Tuple[int, int, Dict[str, Any]]]:
+        """逐行插入（批次失败时的回退），每行一个保存点"""
+        inserted = []
+        for (index, data), params in zip(chunk, params_list):
+            conn.execute('SAVEPOINT bulk_row')
+            try:
+                cursor = conn.execute(query, params)
+            except Exception as e:
+                conn.execute('ROLLBACK TO SAVEPOINT bulk_row')
+                errors.append(cls._bulk_error(index, e))
+            else:
+                inserted.append((index, cursor.lastrowid, data))
+            conn.execute('RELEASE SAVEPOINT bulk_row')
+        return inserted
+    
+    @staticmethod
+    def _bulk_error(index: int, error: Exception) -> Dict[str, Any]:
+        """构造批量操作的单行错误信息"""
+        return {
+            'index': index,
+            'error': getattr(error, 'message', None) or str(error),
+            'field': getattr(error, 'field', None)
+        }
+    
     @classmethod
     def update(cls, record_id: int, **kwargs) -> Dict[str, Any]:
         """更新记录"""
@@ -1,5 +1,4 @@
 from models.base import BaseModel
-from utils.database import serialize_rows
 from contextlib import contextmanager
 import logging
 
@@ -8,6 +7,9 @@ logger = logging.getLogger(__name__)
 class Category(BaseModel):
     """分类模型"""
     
+    TABLE_NAME = 'categories'
+    INSERT_RETURNING = 'id, name, parent_id, level, created_at, updated_at'
+    
     @classmethod
     def create_table(cls):
         """创建分类表"""
@@ -38,7 +40,7 @@ class Category(BaseModel):
         """获取所有分类（扁平结构）"""
         query = 'SELECT * FROM categories ORDER BY level, name'
         rows = cls.execute_query(query)
-        return serialize_rows(rows)
+        return rows
     
     @classmethod
     def get_all_tree(cls):
@@ -59,7 +61,7 @@ class Category(BaseModel):
         """根据ID获取分类"""
         query = 'SELECT * FROM categories WHERE id = ?'
         rows = cls.execute_query(query, (category_id,))
-        return serialize_rows(rows)[0] if rows else None
+        return rows[0] if rows else None
     
     @classmethod
     def create(cls, name, parent_id=None, level=1):
@@ -85,42 +87,12 @@ class Category(BaseModel):
                 VALUES (?, ?, ?)
             '''
             
-            # 使用数据库连接上下文管理器确保操作在同一连接中完成
-            with cls.get_db_connection() as conn:
-                cursor = conn.execute(query, (name, parent_id, level))
-                conn.commit()
-                
-                # 获取最后插入的ID
-                cursor = conn.execute("SELECT last_insert_rowid()")
-                result = cursor.fetchone()
-                if result:
-                    if isinstance(result, (list, tuple)):
-                        category_id = int(result[0])
-                    elif hasattr(result, '__getitem__'):
-                        category_id = int(result[0])
-                    else:
-                        category_id = int(result)
-                else:
-                    category_id = None
-                    
-                if category_id is None or category_id <= 0:
-                    raise ValueError('创建分类失败，无法获取分类ID')
-                
-                # 直接查询新创建的分类数据
-                result_query = '''
-                    SELECT id, name, parent_id, level, 
-                           created_at, updated_at 
-                    FROM categories 
-                    WHERE id = ?
-                '''
-                result = conn.execute(result_query, (category_id,)).fetchall()
-                
-                if not result:
-                    raise ValueError('创建分类失败，无法查询到刚创建的分类')
-                
-                # 返回新创建的分类
-                category_data = serialize_rows(result)[0]
-                return category_data
+            # INSERT ... RETURNING 一条语句完成插入并取回新分类
+            category_data = cls.insert_returning(query, (name, parent_id, level))
+            if not category_data:
+                raise ValueError('创建分类失败，无法查询到刚创建的分类')
+            
+            return category_data
             
         except Exception as e:
             logger.error("创建分类失败: %s", str(e))
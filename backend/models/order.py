@@ -2,7 +2,9 @@ import logging
 from models.base import BaseModel
 from models.order_item import OrderItem
 from models.product import Product
-from utils.database import serialize_rows
+from utils.database import db_manager
+from utils.uom import uom_registry
+from utils.pagination import keyset_condition, keyset_order, split_page
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -10,6 +12,10 @@ logger = logging.getLogger(__name__)
 class Order(BaseModel):
     """订单模型"""
     
+    TABLE_NAME = 'orders'
+    # 列表排序键（倒序），与 idx_orders_date_created (order_date, created_at, rowid) 一致
+    PAGE_KEYS = ('o.order_date', 'o.created_at', 'o.id')
+    
     @classmethod
     def create_table(cls):
         """创建订单表"""
@@ -34,81 +40,138 @@ class Order(BaseModel):
             )
         '''
         cls.execute_query(query)
-        # 确保旧数据库在表存在的情况下也能添加新的列（向后兼容）
-        try:
-            cols = [r[1] for r in cls.execute_query("PRAGMA table_info(orders)")]
-            # 列出需要确保存在的列及其 SQL 类型
-            extras = {
-                'seller_name': 'TEXT',
-                'seller_address': 'TEXT',
-                'seller_phone': 'TEXT',
-                'seller_taxNo': 'TEXT',
-                'seller_note': 'TEXT',
-                'shipping_cost': 'DECIMAL(10,2)',
-                'status': 'TEXT'
-            }
-            for col, typ in extras.items():
-                if col not in cols:
-                    alter_sql = f'ALTER TABLE orders ADD COLUMN {col} {typ}'
-                    if col == 'shipping_cost':
-                        alter_sql += ' DEFAULT 0'
-                    elif col == 'status':
-                        alter_sql += " DEFAULT 'pending'"
-                    try:
-                        cls.execute_query(alter_sql)
-                    except Exception:
-                        # 如果失败（例如并发或权限问题），忽略以保持兼容性
-                        pass
-        except Exception:
-            # 如果无法查询表结构（例如表不存在），忽略，这种情况会在下一次创建时被覆盖
-            pass
     
     @classmethod
     def get_all(cls, order_type=None, status=None):
         """获取所有订单"""
-        query = 'SELECT * FROM orders WHERE 1=1'
-        params = []
+        where, params = cls._build_list_filters(order_type, status)
+        query = f'SELECT * FROM orders o WHERE {where} ORDER BY {keyset_order(cls.PAGE_KEYS, descending=True)}'
+        
+        orders = cls.execute_query(query, params)
+        return cls._attach_items(orders)
+    
+    @classmethod
+    def get_page(cls, order_type=None, status=None, page=1, per_page=20, cursor=None, include_total=True):
+        """分页获取订单，分页在 SQL 中完成，订单项按本页订单一次批量加载
+        
+        传入 cursor（上一页返回的 next_cursor）时按 (order_date, created_at, id) 倒序游标分页，
+        忽略 page；否则使用 LIMIT/OFFSET。include_total 为 False 时不执行 COUNT(*)。
+        """
+        where, params = cls._build_list_filters(order_type, status)
+        
+        total = None
+        if include_total:
+            rows = cls.execute_query(f'SELECT COUNT(*) AS total FROM orders o WHERE {where}', params)
+            total = rows[0]['total'] if rows else 0
+        
+        keyset, keyset_params = keyset_condition(cls.PAGE_KEYS, cursor, descending=True)
+        if keyset:
+            where += f' AND {keyset}'
+            params += keyset_params
+        
+        query = f'''
+            SELECT * FROM orders o
+            WHERE {where}
+            ORDER BY {keyset_order(cls.PAGE_KEYS, descending=True)}
+            LIMIT ? OFFSET ?
+        '''
+        offset = 0 if cursor else (page - 1) * per_page
+        rows = cls.execute_query(query, params + [per_page + 1, offset])
+        orders, next_cursor = split_page(rows, per_page, ('order_date', 'created_at', 'id'))
+        
+        return {
+            'orders': cls._attach_items(orders),
+            'total': total,
+            'next_cursor': next_cursor
+        }
+    
+    @classmethod
+    def get_statistics(cls, start_date=None, end_date=None):
+        """按订单类型和状态汇总订单数量与金额，可按下单日期区间（含两端）筛选
+        
+        单条 GROUP BY 查询，由覆盖索引 idx_orders_type_status_date 支持，不加载订单项。
+        """
+        conditions, params = ['1=1'], []
+        if start_date:
+            conditions.append('order_date >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append('order_date <= ?')
+            params.append(end_date)
+        
+        query = f'''
+            SELECT order_type, status, COUNT(*) AS order_count,
+                   COALESCE(SUM(total_amount), 0) AS total_amount
+            FROM orders
+            WHERE {' AND '.join(conditions)}
+            GROUP BY order_type, status
+        '''
+        
+        stats = {
+            'total_orders': 0,
+            'by_type': {'purchase': 0, 'sales': 0},
+            'by_status': {'pending': 0, 'completed': 0, 'cancelled': 0},
+            'amounts': {'total': 0.0, 'purchase': 0.0, 'sales': 0.0}
+        }
+        for row in cls.execute_query(query, params):
+            order_type, status = row['order_type'], row['status']
+            count, amount = row['order_count'], float(row['total_amount'])
+            
+            stats['total_orders'] += count
+            stats['by_type'][order_type] = stats['by_type'].get(order_type, 0) + count
+            stats['by_status'][status] = stats['by_status'].get(status, 0) + count
+            stats['amounts']['total'] += amount
+            stats['amounts'][order_type] = stats['amounts'].get(order_type, 0.0) + amount
+        
+        return stats
+    
+    @classmethod
+    def _build_list_filters(cls, order_type=None, status=None):
+        """订单列表的筛选条件"""
+        conditions, params = ['1=1'], []
         
         if order_type:
-            query += ' AND order_type = ?'
+            conditions.append('o.order_type = ?')
             params.append(order_type)
         
         if status:
-            query += ' AND status = ?'
+            conditions.append('o.status = ?')
             params.append(status)
         
-        query += ' ORDER BY order_date DESC, created_at DESC'
-        
-        rows = cls.execute_query(query, params)
-        orders = serialize_rows(rows)
-        
-        # 为每个订单获取订单项
+        return ' AND '.join(conditions), params
+    
+    @classmethod
+    def _attach_items(cls, orders):
+        """用一次 IN 查询加载这些订单的订单项，并挂到各订单的 items 上"""
+        items_by_order = OrderItem.get_by_order_ids([order['id'] for order in orders])
         for order in orders:
-            order['items'] = OrderItem.get_by_order_id(order['id'])
-            
-            # 处理箱子信息，确保前端能正确显示
-            for item in order['items']:
-                # 小箱信息
-                if item.get('small_box_length') is not None:
-                    item['smallBox'] = {
-                        'length': item['small_box_length'],
-                        'width': item['small_box_width'],
-                        'height': item['small_box_height'],
-                        'weight': item['small_box_weight']
-                    }
-                
-                # 大箱信息
-                if item.get('large_box_length') is not None:
-                    item['largeBox'] = {
-                        'units_per_box': item['large_box_units_per_box'],
-                        'length': item['large_box_length'],
-                        'width': item['large_box_width'],
-                        'height': item['large_box_height'],
-                        'weight': item['large_box_weight']
-                    }
-        
+            order['items'] = cls._format_items(items_by_order.get(order['id'], []))
         return orders
     
+    @staticmethod
+    def _format_items(items):
+        """处理箱子信息，确保前端能正确显示"""
+        for item in items:
+            # 小箱信息
+            if item.get('small_box_length') is not None:
+                item['smallBox'] = {
+                    'length': item['small_box_length'],
+                    'width': item['small_box_width'],
+                    'height': item['small_box_height'],
+                    'weight': item['small_box_weight']
+                }
+            
+            # 大箱信息
+            if item.get('large_box_length') is not None:
+                item['largeBox'] = {
+                    'units_per_box': item['large_box_units_per_box'],
+                    'length': item['large_box_length'],
+                    'width': item['large_box_width'],
+                    'height': item['large_box_height'],
+                    'weight': item['large_box_weight']
+                }
+        return items
+    
     @classmethod
     def create(cls, order_type, customer_supplier, order_date, total_amount=0, shipping_cost=0, notes=None, items=None, order_number=None, seller_name=None, seller_address=None, seller_phone=None, seller_taxNo=None, seller_note=None, status='pending'):
         """创建订单
@@ -124,80 +187,81 @@ class Order(BaseModel):
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         '''
         
-        # 使用数据库连接上下文管理器确保事务正确处理
-        from utils.database import get_db_connection
-        with get_db_connection() as conn:
-            try:
-                # 插入订单，将Decimal类型转换为float以避免sqlite3绑定错误
-                cursor = conn.execute(query, (
-                    order_number, 
-                    order_type, 
-                    customer_supplier, 
-                    order_date, 
-                    float(total_amount) if total_amount is not None else 0, 
-                    float(shipping_cost) if shipping_cost is not None else 0, 
-                    notes, 
-                    seller_name, 
-                    seller_address, 
-                    seller_phone, 
-                    seller_taxNo, 
-                    seller_note, 
-                    status
-                ))
-                conn.commit()
-                order_id = cursor.lastrowid
-                
-                # 如果有订单项，则创建订单项
-                if items:
-                    for item in items:
-                        # 计算总价
-                        quantity = float(item.get('quantity', 1))
-                        unit_price = float(item.get('unit_price', 0))
-                        total_price = quantity * unit_price
-
-                        # 如果传入的 unit 为空字符串或 None，则尝试使用产品表中的单位作为回退
-                        unit_val = item.get('unit')
-                        if not unit_val:
-                            try:
-                                prod = Product.get_by_id(item.get('product_id')) if item.get('product_id') else None
-                                unit_val = prod.get('unit') if prod and prod.get('unit') else '个'
-                            except Exception:
-                                unit_val = '个'
+        # 订单和订单项在同一个工作单元内写入，只提交一次
+        with db_manager.transaction() as conn:
+            # 插入订单，将Decimal类型转换为float以避免sqlite3绑定错误
+            cursor = conn.execute(query, (
+                order_number, 
+                order_type, 
+                customer_supplier, 
+                order_date, 
+                float(total_amount) if total_amount is not None else 0, 
+                float(shipping_cost) if shipping_cost is not None else 0, 
+                notes, 
+                seller_name, 
+                seller_address, 
+                seller_phone, 
+                seller_taxNo, 
+                seller_note, 
+                status
+            ))
+            order_id = cursor.lastrowid
+            
+            # 如果有订单项，则创建订单项
+            if items:
+                cls._insert_items(conn, order_id, items)
+            
+            # 记录刚创建订单的订单项单位，便于调试
+            created_order = cls.get_by_id(order_id)
+        
+        try:
+            logger.info("新建订单(ID=%s)项单位: %s", order_id, [it.get('unit') for it in created_order.get('items', [])])
+        except Exception:
+            logger.debug("无法记录新建订单的项单位")
+        
+        return created_order
+    
+    @classmethod
+    def _insert_items(cls, conn, order_id, items):
+        """在当前工作单元内写入订单项"""
+        item_query = '''
+            INSERT INTO order_items 
+            (order_id, product_id, description, quantity, unit_price, total_price, unit, units_per_box, packaging, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        '''
+        changed = []
+        for item in items:
+            # 计算总价
+            quantity = float(item.get('quantity', 1))
+            unit_price = float(item.get('unit_price', 0))
+            total_price = quantity * unit_price
 
-                        item_query = '''
-                            INSERT INTO order_items 
-                            (order_id, product_id, description, quantity, unit_price, total_price, unit, units_per_box, packaging, notes)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        '''
-                        conn.execute(item_query, (
-                            order_id,
-                            item.get('product_id'),
-                            item.get('description', ''),  # 确保description字段有默认值
-                            quantity,
-                            unit_price,
-                            total_price,
-                            unit_val,
-                            item.get('units_per_box', 1),
-                            item.get('packaging'),
-                            item.get('notes', '')
-                        ))
-                
-                # 提交事务
-                conn.commit()
-                
-                # 记录刚创建订单的订单项单位，便于调试
-                created_order = cls.get_by_id(order_id)
+            # 如果传入的 unit 为空字符串或 None，则尝试使用产品表中的单位作为回退
+            unit_val = item.get('unit')
+            if not unit_val:
                 try:
-                    logger.info("新建订单(ID=%s)项单位: %s", order_id, [it.get('unit') for it in created_order.get('items', [])])
+                    prod = Product.get_by_id(item.get('product_id')) if item.get('product_id') else None
+                    unit_val = prod.get('unit') if prod and prod.get('unit') else '个'
                 except Exception:
-                    logger.debug("无法记录新建订单的项单位")
+                    unit_val = '个'
 
-                return created_order
-                
-            except Exception as e:
-                # 回滚事务
-                conn.rollback()
-                raise e
+            conn.execute(item_query, (
+                order_id,
+                item.get('product_id'),
+                item.get('description', ''),  # 确保description字段有默认值
+                quantity,
+                unit_price,
+                total_price,
+                unit_val,
+                item.get('units_per_box', 1),
+                item.get('packaging'),
+                item.get('notes', '')
+            ))
+            if uom_registry.packaging_changed(item.get('product_id'), unit_val, item.get('units_per_box', 1)):
+                changed.append(item['product_id'])
+        
+        # 只有装箱数据与已加载的包装换算不同的订单项才失效包装换算和展开BOM
+        OrderItem.invalidate_packaging(changed)
     
     @classmethod
     def update(cls, order_id, **kwargs):
@@ -212,65 +276,27 @@ class Order(BaseModel):
         '''
         values = list(kwargs.values()) + [order_id]
         
-        from utils.database import get_db_connection
-        with get_db_connection() as conn:
-            try:
-                # 更新订单主表
+        with db_manager.transaction() as conn:
+            # 更新订单主表
+            if kwargs:
                 conn.execute(query, values)
-                
-                # 如果提供了订单项数据，则更新订单项
-                if items is not None:
-                    # 先删除现有的订单项
-                    conn.execute('DELETE FROM order_items WHERE order_id = ?', (order_id,))
-                    
-                    # 插入新的订单项
-                    for item in items:
-                        # 计算总价
-                        quantity = float(item.get('quantity', 1))
-                        unit_price = float(item.get('unit_price', 0))
-                        total_price = quantity * unit_price
-
-                        # 如果传入的 unit 为空字符串或 None，则尝试使用产品表中的单位作为回退
-                        unit_val = item.get('unit')
-                        if not unit_val:
-                            try:
-                                prod = Product.get_by_id(item.get('product_id')) if item.get('product_id') else None
-                                unit_val = prod.get('unit') if prod and prod.get('unit') else '个'
-                            except Exception:
-                                unit_val = '个'
-
-                        item_query = '''
-                            INSERT INTO order_items 
-                            (order_id, product_id, description, quantity, unit_price, total_price, unit, units_per_box, packaging, notes)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        '''
-                        conn.execute(item_query, (
-                            order_id,
-                            item.get('product_id'),
-                            item.get('description', ''),
-                            quantity,
-                            unit_price,
-                            total_price,
-                            unit_val,
-                            item.get('units_per_box', 1),
-                            item.get('packaging'),
-                            item.get('notes', '')
-                        ))
-                
-                conn.commit()
-
-                # 记录更新后订单的订单项单位，便于调试
-                updated = cls.get_by_id(order_id)
-                try:
-                    logger.info("更新订单(ID=%s)后项单位: %s", order_id, [it.get('unit') for it in updated.get('items', [])])
-                except Exception:
-                    logger.debug("无法记录更新订单的项单位")
+            
+            # 如果提供了订单项数据，则更新订单项
+            if items is not None:
+                # 先删除现有的订单项，再插入新的订单项；删除带装箱数据的订单项也会改变包装换算
+                OrderItem.invalidate_packaging(OrderItem.get_packaged_product_ids(order_id))
+                conn.execute('DELETE FROM order_items WHERE order_id = ?', (order_id,))
+                cls._insert_items(conn, order_id, items)
+            
+            updated = cls.get_by_id(order_id)
+        
+        # 记录更新后订单的订单项单位，便于调试
+        try:
+            logger.info("更新订单(ID=%s)后项单位: %s", order_id, [it.get('unit') for it in updated.get('items', [])])
+        except Exception:
+            logger.debug("无法记录更新订单的项单位")
 
-                return updated
-                
-            except Exception as e:
-                conn.rollback()
-                raise e
+        return updated
     
     @classmethod
     def get_by_id(cls, order_id):
@@ -290,33 +316,15 @@ class Order(BaseModel):
         """
         query = 'SELECT * FROM orders WHERE id = ?'
         rows = cls.execute_query(query, (order_id,))
-        order = serialize_rows(rows)[0] if rows else None
+        order = rows[0] if rows else None
         
         # 如果订单存在，加载其订单项并格式化包装信息
         if order:
             # 获取该订单的所有订单项（即产品信息）
             order['items'] = OrderItem.get_by_order_id(order_id)
             
-            # 遍历每个订单项，构建前端友好的箱子信息结构
-            for item in order['items']:
-                # 小箱信息（如果存在）
-                if item.get('small_box_length') is not None:
-                    item['smallBox'] = {
-                        'length': item['small_box_length'],
-                        'width': item['small_box_width'],
-                        'height': item['small_box_height'],
-                        'weight': item['small_box_weight']
-                    }
-                
-                # 大箱信息（如果存在）
-                if item.get('large_box_length') is not None:
-                    item['largeBox'] = {
-                        'units_per_box': item['large_box_units_per_box'],
-                        'length': item['large_box_length'],
-                        'width': item['large_box_width'],
-                        'height': item['large_box_height'],
-                        'weight': item['large_box_weight']
-                    }
+            # 构建前端友好的箱子信息结构
+            cls._format_items(order['items'])
         
         return order
     
@@ -328,71 +336,38 @@ class Order(BaseModel):
         if not existing:
             raise ValueError('订单不存在')
         
-        from utils.database import get_db_connection
-        from models.transaction import Transaction
-        from models.product import Product
-        
-        with get_db_connection() as conn:
-            try:
-                # 获取订单项
-                order_items = OrderItem.get_by_order_id(order_id)
-                
-                # 恢复库存并删除相关交易记录
-                for item in order_items:
-                    product_id = item.get('product_id')
-                    quantity = float(item.get('quantity', 0))
-                    
-                    if product_id and quantity > 0:
-                        # 恢复库存（采购订单增加库存，销售订单减少库存）
-                        if existing['order_type'] == 'purchase':
-                            # 采购订单删除时，如果是已完成状态，则减少库存（原先是增加库存）
-                            if existing['status'] == 'completed':
-                                Product.update_stock(product_id, -quantity)
-                        elif existing['order_type'] == 'sales':
-                            # 销售订单删除时，如果是已完成状态，则增加库存（原先是减少库存）
-                            if existing['status'] == 'completed':
-                                Product.update_stock(product_id, quantity)
-                        
-                        # 删除相关的交易记录 - 修改这里以确保删除所有相关交易
-                        order_number = existing.get('order_number', '')
-                        conn.execute(
-                            'DELETE FROM transactions WHERE reference_no = ?',
-                            (order_number,)
-                        )
-                
-                # 删除订单项
-                OrderItem.delete_by_order_id(order_id)
-                
-                # 删除订单
-                query = 'DELETE FROM orders WHERE id = ?'
-                cursor = conn.execute(query, (order_id,))
-                conn.commit()
-                return cursor.rowcount
-            except Exception as e:
-                conn.rollback()
-                raise e
-
-    def delete(self, *args, **kwargs):
-        # 删除相关交易记录
-        Transaction.objects.filter(order=self).delete()
-        
-        # 如果订单已完成，则恢复库存数量
-        if self.status == 'completed':
-            for item in self.items.all():
-                product = item.product
-                # 修复：已完成的订单删除时应增加库存，而不是减少
-                product.quantity += item.quantity
-                product.save()
+        # 库存回滚、交易记录和订单删除在同一个工作单元内完成
+        with db_manager.transaction() as conn:
+            # 获取订单项
+            order_items = OrderItem.get_by_order_id(order_id)
+            order_number = existing.get('order_number', '')
+            
+            # 恢复库存并删除相关交易记录
+            for item in order_items:
+                product_id = item.get('product_id')
+                quantity = float(item.get('quantity', 0))
                 
-                # 创建反向交易记录，记录库存的恢复
-                Transaction.objects.create(
-                    product=product,
-                    transaction_type='incoming',  # 修复：增加库存的交易类型应为incoming
-                    quantity=item.quantity,
-                    description=f'Reverted from cancelled order {self.order_number}',
-                    user=self.created_by,
-                    order=self,
-                    date=self.updated_at
+                if product_id and quantity > 0:
+                    # 恢复库存（采购订单增加库存，销售订单减少库存）
+                    if existing['order_type'] == 'purchase':
+                        # 采购订单删除时，如果是已完成状态，则减少库存（原先是增加库存）
+                        if existing['status'] == 'completed':
+                            Product.update_stock(product_id, -quantity)
+                    elif existing['order_type'] == 'sales':
+                        # 销售订单删除时，如果是已完成状态，则增加库存（原先是减少库存）
+                        if existing['status'] == 'completed':
+                            Product.update_stock(product_id, quantity)
+            
+            # 删除相关的交易记录
+            if order_items:
+                conn.execute(
+                    'DELETE FROM transactions WHERE reference_no = ?',
+                    (order_number,)
                 )
-        
-        super().delete(*args, **kwargs)
+            
+            # 删除订单项
+            OrderItem.delete_by_order_id(order_id)
+            
+            # 删除订单
+            cursor = conn.execute('DELETE FROM orders WHERE id = ?', (order_id,))
+            return cursor.rowcount
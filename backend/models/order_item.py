@@ -1,9 +1,13 @@
 from models.base import BaseModel
-from utils.database import serialize_rows
+from models.product import Product
+from utils.database import db_manager
+from utils.uom import uom_registry
 
 class OrderItem(BaseModel):
     """订单项模型"""
     
+    TABLE_NAME = 'order_items'
+    
     @classmethod
     def create_table(cls):
         """创建订单项表"""
@@ -35,60 +39,6 @@ class OrderItem(BaseModel):
             )
         '''
         cls.execute_query(query)
-        
-        # 确保旧数据库在表存在的情况下也能添加新的列（向后兼容）
-        try:
-            cols = [r[1] for r in cls.execute_query("PRAGMA table_info(order_items)")]
-            if 'total_price' not in cols:
-                alter_sql = 'ALTER TABLE order_items ADD COLUMN total_price DECIMAL(10,2) NOT NULL DEFAULT 0'
-                try:
-                    cls.execute_query(alter_sql)
-                except Exception:
-                    # 如果失败（例如并发或权限问题），忽略以保持兼容性
-                    pass
-                    
-            # 添加notes字段（向后兼容）
-            if 'notes' not in cols:
-                alter_sql = 'ALTER TABLE order_items ADD COLUMN notes TEXT'
-                try:
-                    cls.execute_query(alter_sql)
-                except Exception:
-                    # 如果失败（例如并发或权限问题），忽略以保持兼容性
-                    pass
-                    
-            # 添加单位字段（向后兼容）
-            if 'unit' not in cols:
-                alter_sql = "ALTER TABLE order_items ADD COLUMN unit TEXT DEFAULT '个'"
-                try:
-                    cls.execute_query(alter_sql)
-                except Exception:
-                    # 如果失败（例如并发或权限问题），忽略以保持兼容性
-                    pass
-                    
-            # 添加箱子信息字段（向后兼容）
-            box_fields = {
-                'small_box_length': 'DECIMAL(10,2)',
-                'small_box_width': 'DECIMAL(10,2)',
-                'small_box_height': 'DECIMAL(10,2)',
-                'small_box_weight': 'DECIMAL(10,2)',
-                'large_box_units_per_box': 'INTEGER',
-                'large_box_length': 'DECIMAL(10,2)',
-                'large_box_width': 'DECIMAL(10,2)',
-                'large_box_height': 'DECIMAL(10,2)',
-                'large_box_weight': 'DECIMAL(10,2)'
-            }
-            
-            for field, typ in box_fields.items():
-                if field not in cols:
-                    alter_sql = f'ALTER TABLE order_items ADD COLUMN {field} {typ}'
-                    try:
-                        cls.execute_query(alter_sql)
-                    except Exception:
-                        # 如果失败（例如并发或权限问题），忽略以保持兼容性
-                        pass
-        except Exception:
-            # 如果无法查询表结构（例如表不存在），忽略，这种情况会在下一次创建时被覆盖
-            pass
     
     @classmethod
     def create(cls, order_id, product_id, description, quantity, unit_price, total_price=None, unit='个', units_per_box=1, packaging=None, notes=None, 
@@ -111,17 +61,37 @@ class OrderItem(BaseModel):
              large_box_units_per_box, large_box_length, large_box_width, large_box_height, large_box_weight)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         '''
-        cls.execute_update(query, (order_id, product_id, description, quantity, unit_price, total_price, unit, units_per_box, packaging, notes,
-                                   small_box_length, small_box_width, small_box_height, small_box_weight,
-                                   large_box_units_per_box, large_box_length, large_box_width, large_box_height, large_box_weight))
-        return cls.get_by_id(cls.get_last_insert_id())
+        item_id = cls.insert_returning(query, (order_id, product_id, description, quantity, unit_price, total_price, unit, units_per_box, packaging, notes,
+                                               small_box_length, small_box_width, small_box_height, small_box_weight,
+                                               large_box_units_per_box, large_box_length, large_box_width, large_box_height, large_box_weight))
+        if uom_registry.packaging_changed(product_id, unit, units_per_box, large_box_units_per_box):
+            cls.invalidate_packaging([product_id])
+        return item_id
+
+    @staticmethod
+    def invalidate_packaging(product_ids):
+        """装箱数据变化：提交后重新加载包装换算，并失效使用这些产品的展开BOM"""
+        product_ids = list(dict.fromkeys(product_ids))
+        if product_ids:
+            db_manager.after_commit(uom_registry.invalidate_packaging)
+            Product.invalidate_bom_cache(product_ids)
+
+    @classmethod
+    def get_packaged_product_ids(cls, order_id):
+        """订单中带装箱数据的订单项的产品ID（删除这些订单项可能改变产品的包装换算）"""
+        query = '''
+            SELECT DISTINCT product_id FROM order_items
+            WHERE order_id = ? AND product_id IS NOT NULL
+              AND (units_per_box > 1 OR large_box_units_per_box > 0)
+        '''
+        return [row['product_id'] for row in cls.execute_query(query, (order_id,))]
     
     @classmethod
     def get_by_id(cls, item_id):
         """根据ID获取订单项"""
         query = 'SELECT * FROM order_items WHERE id = ?'
         rows = cls.execute_query(query, (item_id,))
-        return serialize_rows(rows)[0] if rows else None
+        return rows[0] if rows else None
     
     @classmethod
     def get_by_order_id(cls, order_id):
@@ -136,18 +106,36 @@ class OrderItem(BaseModel):
             ORDER BY oi.id
         '''
         rows = cls.execute_query(query, (order_id,))
-        return serialize_rows(rows)
+        return rows
+    
+    @classmethod
+    def get_by_order_ids(cls, order_ids, chunk_size=500):
+        """批量获取多个订单的订单项，返回 {order_id: [订单项, ...]}
+        
+        每 chunk_size 个订单一次 IN 查询，避免超过 SQLite 的参数个数上限。
+        """
+        grouped = {order_id: [] for order_id in order_ids}
+        ids = list(grouped)
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            placeholders = ','.join(['?'] * len(chunk))
+            query = f'''
+                SELECT oi.*, p.name as product_name, p.sku as product_sku,
+                       COALESCE(oi.unit, p.unit, '个') as unit
+                FROM order_items oi
+                LEFT JOIN products p ON oi.product_id = p.id
+                WHERE oi.order_id IN ({placeholders})
+                ORDER BY oi.order_id, oi.id
+            '''
+            for row in cls.execute_query(query, tuple(chunk)):
+                grouped[row['order_id']].append(row)
+        return grouped
     
     @classmethod
     def delete_by_order_id(cls, order_id):
         """根据订单ID删除所有订单项"""
-        from utils.database import get_db_connection
-        with get_db_connection() as conn:
-            try:
-                query = 'DELETE FROM order_items WHERE order_id = ?'
-                cursor = conn.execute(query, (order_id,))
-                conn.commit()
-                return cursor.rowcount
-            except Exception as e:
-                conn.rollback()
-                raise e
+        packaged = cls.get_packaged_product_ids(order_id)
+        query = 'DELETE FROM order_items WHERE order_id = ?'
+        deleted = cls.execute_update(query, (order_id,))
+        cls.invalidate_packaging(packaged)
+        return deleted
@@ -0,0 +1,77 @@
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from models.base import BaseModel
+from utils.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+class PlannedOrder(BaseModel):
+    """MRP 计划订单
+
+    每次 MRP 运行整体替换上一次的结果（再生式 MRP）：有BOM的产品为计划生产订单，
+    其余为计划采购订单。due_date 为时间段的开始日期。
+    """
+
+    TABLE_NAME = 'planned_orders'
+
+    INSERT_COLUMNS = ('run_at', 'product_id', 'order_type', 'level', 'due_date',
+                      'gross_requirement', 'scheduled_receipt', 'quantity')
+
+    @classmethod
+    def create_table(cls):
+        """创建计划订单表"""
+        statements = [
+            '''
+            CREATE TABLE IF NOT EXISTS planned_orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_at TIMESTAMP NOT NULL,
+                product_id INTEGER NOT NULL,
+                order_type TEXT NOT NULL,
+                level INTEGER NOT NULL DEFAULT 0,
+                due_date DATE NOT NULL,
+                gross_requirement REAL NOT NULL DEFAULT 0,
+                scheduled_receipt REAL NOT NULL DEFAULT 0,
+                quantity REAL NOT NULL,
+                FOREIGN KEY (product_id) REFERENCES products (id)
+            )
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_planned_orders_type_date
+            ON planned_orders (order_type, due_date)
+            '''
+        ]
+        for statement in statements:
+            cls.execute_query(statement)
+
+    @classmethod
+    def replace_all(cls, rows: Sequence[Tuple]) -> int:
+        """用本次 MRP 运行的结果替换全部计划订单（同一事务内），返回写入行数"""
+        placeholders = ', '.join('?' * len(cls.INSERT_COLUMNS))
+        with db_manager.transaction() as conn:
+            conn.execute('DELETE FROM planned_orders')
+            conn.executemany(
+                f'INSERT INTO planned_orders ({", ".join(cls.INSERT_COLUMNS)}) VALUES ({placeholders})',
+                rows
+            )
+        logger.info("MRP 计划订单已更新: %s 行", len(rows))
+        return len(rows)
+
+    @classmethod
+    def get_all(cls, order_type: Optional[str] = None,
+                product_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取计划订单，按到期日期和层级排序"""
+        query = '''
+            SELECT po.*, p.name AS product_name, p.sku AS product_sku, p.unit AS unit
+            FROM planned_orders po
+            LEFT JOIN products p ON p.id = po.product_id
+            WHERE 1=1
+        '''
+        params = []
+        if order_type:
+            query += ' AND po.order_type = ?'
+            params.append(order_type)
+        if product_id:
+            query += ' AND po.product_id = ?'
+            params.append(int(product_id))
+        query += ' ORDER BY po.due_date, po.level, po.product_id'
+        return cls.execute_query(query, tuple(params))
@@ -1,10 +1,12 @@
 """优化后的产品模型"""
 import logging
-from typing import List, Dict, Any, Optional, Union
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Union
 from models.base import BaseModel
-from utils.database import serialize_rows
-from utils.error_handler import ValidationError, NotFoundError
+from utils.database import SUPPORTS_RETURNING, db_manager, serialize_rows
+from utils.error_handler import ValidationError, NotFoundError, DatabaseError
 from utils.validators import ProductValidator
+from utils.pagination import keyset_condition, keyset_order, split_page
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +14,24 @@ class Product(BaseModel):
     """优化后的产品模型"""
     
     TABLE_NAME = 'products'
+    # 全文索引（utils/migrations.py 第 4 版创建），trigram 分词要求关键词至少 3 个字符
+    FTS_TABLE = 'products_fts'
+    FTS_MIN_KEYWORD_LENGTH = 3
+    # bm25 列权重，顺序与 products_fts 的列一致: name, sku, description
+    FTS_WEIGHTS = (10.0, 5.0, 1.0)
+    SEARCH_COLUMNS = ('name', 'sku', 'description')
+    # 游标分页的排序键，与 idx_products_name (name, rowid) 一致
+    PAGE_KEYS = ('p.name', 'p.id')
+    # 库存预警条件，与部分索引 idx_products_stock_alert 的 WHERE 子句逐字一致，
+    # 查询中原样使用该条件才能命中索引，读取预警只扫描处于预警状态的产品
+    STOCK_ALERT_CONDITION = 'quantity <= 0 OR (min_stock > 0 AND quantity <= min_stock)'
+    # 出现在BOM项中的产品字段，修改后需要失效展开BOM缓存
+    BOM_FIELDS = frozenset(('name', 'sku', 'price', 'quantity', 'unit'))
+    _fts_available: Dict[str, bool] = {}
+    INSERT_RETURNING = '''
+        *, (SELECT name FROM categories WHERE id = products.category_id) AS category_name,
+        (SELECT parent_id FROM categories WHERE id = products.category_id) AS category_parent_id
+    '''
     
     @classmethod
     def create_table(cls):
@@ -38,7 +58,6 @@ class Product(BaseModel):
         
         # 创建索引
         indexes = [
-            'CREATE INDEX IF NOT EXISTS idx_products_sku ON products (sku)',
             'CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id)',
             'CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)'
         ]
@@ -58,59 +77,27 @@ class Product(BaseModel):
         per_page: int = 50
     ) -> Dict[str, Any]:
         """获取所有产品（支持分页）"""
-        query_parts = [
-            '''
-            SELECT p.*, c.name as category_name, c.parent_id as category_parent_id
-            FROM products p 
-            LEFT JOIN categories c ON p.category_id = c.id 
-            WHERE 1=1
-            '''
-        ]
-        params = []
-        
-        if search:
-            query_parts.append(' AND (p.name LIKE ? OR p.sku LIKE ?)')
-            params.extend([f'%{search}%', f'%{search}%'])
-        
-        if category_id:
-            if isinstance(category_id, (list, tuple)):
-                placeholders = ','.join(['?'] * len(category_id))
-                query_parts.append(f' AND p.category_id IN ({placeholders})')
-                params.extend([int(x) if x is not None else None for x in category_id])
-            else:
-                query_parts.append(' AND p.category_id = ?')
-                params.append(int(category_id))
+        join, where, params = cls._build_list_filters(search, category_id)
         
         # 计数查询
-        count_query_parts = ['SELECT COUNT(*) as total FROM products p WHERE 1=1']
-        count_params = []
-        
-        if search:
-            count_query_parts.append(' AND (p.name LIKE ? OR p.sku LIKE ?)')
-            count_params.extend([f'%{search}%', f'%{search}%'])
-        
-        if category_id:
-            if isinstance(category_id, (list, tuple)):
-                placeholders = ','.join(['?'] * len(category_id))
-                count_query_parts.append(f' AND p.category_id IN ({placeholders})')
-                count_params.extend([int(x) if x is not None else None for x in category_id])
-            else:
-                count_query_parts.append(' AND p.category_id = ?')
-                count_params.append(int(category_id))
-        
-        count_query = ' '.join(count_query_parts)
-        total_result = cls.execute_query(count_query, tuple(count_params))
+        count_query = f'SELECT COUNT(*) as total FROM products p{join} WHERE {where}'
+        total_result = cls.execute_query(count_query, tuple(params))
         total = total_result[0]['total'] if total_result else 0
         
         # 数据查询
-        query_parts.append(' ORDER BY p.name')
+        query = f'''
+            SELECT p.*, c.name as category_name, c.parent_id as category_parent_id
+            FROM products p{join}
+            LEFT JOIN categories c ON p.category_id = c.id
+            WHERE {where}
+            ORDER BY p.name, p.id
+        '''
         
         # 分页
         if page > 0 and per_page > 0:
             offset = (page - 1) * per_page
-            query_parts.append(f' LIMIT {per_page} OFFSET {offset}')
+            query += f' LIMIT {per_page} OFFSET {offset}'
         
-        query = ' '.join(query_parts)
         products = cls.execute_query(query, tuple(params))
         
         return {
@@ -123,6 +110,69 @@ class Product(BaseModel):
             }
         }
     
+    @classmethod
+    def get_page(
+        cls,
+        search: Optional[str] = None,
+        category_id: Optional[Union[int, List[int]]] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_total: bool = False
+    ) -> Dict[str, Any]:
+        """按 (name, id) 游标分页获取产品，深翻页不需要 OFFSET
+        
+        include_total 为 False 时不执行 COUNT(*)，返回的 total 为 None。
+        """
+        join, where, params = cls._build_list_filters(search, category_id)
+        
+        total = None
+        if include_total:
+            total_result = cls.execute_query(
+                f'SELECT COUNT(*) as total FROM products p{join} WHERE {where}', tuple(params)
+            )
+            total = total_result[0]['total'] if total_result else 0
+        
+        keyset, keyset_params = keyset_condition(cls.PAGE_KEYS, cursor)
+        if keyset:
+            where += f' AND {keyset}'
+        query = f'''
+            SELECT p.*, c.name as category_name, c.parent_id as category_parent_id
+            FROM products p{join}
+            LEFT JOIN categories c ON p.category_id = c.id
+            WHERE {where}
+            ORDER BY {keyset_order(cls.PAGE_KEYS)}
+            LIMIT ?
+        '''
+        rows = cls.execute_query(query, tuple(params + keyset_params + [limit + 1]))
+        products, next_cursor = split_page(rows, limit, ('name', 'id'))
+        
+        return {'products': products, 'next_cursor': next_cursor, 'total': total}
+    
+    @classmethod
+    def _build_list_filters(
+        cls,
+        search: Optional[str] = None,
+        category_id: Optional[Union[int, List[int]]] = None
+    ) -> Tuple[str, str, List[Any]]:
+        """产品列表的筛选条件，返回 (JOIN 片段, WHERE 条件, 参数)"""
+        join, conditions, params = '', ['1=1'], []
+        
+        if search:
+            join, search_where, search_params, _, _ = cls.build_search(search, columns=('name', 'sku'))
+            conditions.append(search_where)
+            params.extend(search_params)
+        
+        if category_id:
+            if isinstance(category_id, (list, tuple)):
+                placeholders = ','.join(['?'] * len(category_id))
+                conditions.append(f'p.category_id IN ({placeholders})')
+                params.extend([int(x) if x is not None else None for x in category_id])
+            else:
+                conditions.append('p.category_id = ?')
+                params.append(int(category_id))
+        
+        return join, ' AND '.join(conditions), params
+    
     @classmethod
     def get_by_id(cls, product_id: int) -> Optional[Dict[str, Any]]:
         """根据ID获取产品"""
@@ -192,27 +242,65 @@ class Product(BaseModel):
         logger.info("产品创建成功: ID=%s", product['id'])
         return product
     
+    @classmethod
+    def validate_bulk_row(cls, row: Dict[str, Any]) -> Dict[str, Any]:
+        """批量创建时的单行校验，与 create 使用同一验证器"""
+        return ProductValidator.validate_create_data(row)
+    
+    @classmethod
+    def prepare_bulk_rows(cls, rows: List[Dict[str, Any]]) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+        """批量校验，并用一次 IN 查询（按批）排除已存在及批内重复的SKU"""
+        valid, errors = super().prepare_bulk_rows(rows)
+        
+        existing = cls.get_existing_skus([data['sku'] for _, data in valid])
+        seen = set()
+        unique = []
+        for index, data in valid:
+            sku = data['sku']
+            if sku in existing or sku in seen:
+                errors.append(cls._bulk_error(index, ValidationError('SKU已存在', field='sku')))
+                continue
+            seen.add(sku)
+            unique.append((index, data))
+        return unique, errors
+    
+    @classmethod
+    def get_existing_skus(cls, skus: List[str], chunk_size: int = 500) -> set:
+        """返回给定SKU中已存在于数据库的部分"""
+        existing = set()
+        skus = list(set(skus))
+        for start in range(0, len(skus), chunk_size):
+            chunk = skus[start:start + chunk_size]
+            query = f'SELECT sku FROM products WHERE sku IN ({", ".join("?" * len(chunk))})'
+            existing.update(row['sku'] for row in cls.execute_query(query, tuple(chunk)))
+        return existing
+    
     @classmethod
     def update(cls, product_id: int, **kwargs) -> Dict[str, Any]:
         """更新产品"""
         logger.info("更新产品: ID=%s, 数据=%s", product_id, kwargs)
         
-        # 检查产品是否存在
-        existing = cls.get_by_id(product_id)
-        if not existing:
-            raise NotFoundError('产品不存在')
-        
         # 数据验证
         validated_data = ProductValidator.validate_update_data(kwargs)
         
-        # 检查SKU是否重复（排除自己）
-        if 'sku' in validated_data and validated_data['sku'] != existing['sku']:
-            duplicate = cls.get_by_sku(validated_data['sku'])
-            if duplicate and duplicate['id'] != product_id:
-                raise ValidationError('SKU已存在', field='sku')
-        
-        # 更新产品
-        product = super().update(product_id, **validated_data)
+        # 读取旧值和更新在同一个工作单元内，预警状态变化据此判断
+        with db_manager.transaction():
+            # 检查产品是否存在
+            existing = cls.get_by_id(product_id)
+            if not existing:
+                raise NotFoundError('产品不存在')
+            
+            # 检查SKU是否重复（排除自己）
+            if 'sku' in validated_data and validated_data['sku'] != existing['sku']:
+                duplicate = cls.get_by_sku(validated_data['sku'])
+                if duplicate and duplicate['id'] != product_id:
+                    raise ValidationError('SKU已存在', field='sku')
+            
+            # 更新产品
+            product = super().update(product_id, **validated_data)
+            cls.track_stock_alert(product, cls.stock_alert_status(existing['quantity'], existing['min_stock']))
+            if cls.BOM_FIELDS.intersection(validated_data):
+                cls.invalidate_bom_cache([product_id])
         
         logger.info("产品更新成功: ID=%s", product_id)
         return product
@@ -229,8 +317,7 @@ class Product(BaseModel):
         
         # 检查是否被BOM使用
         from models.bom import BOM
-        bom_usage = BOM.get_by_product_or_material(product_id)
-        if bom_usage:
+        if BOM.is_used(product_id):
             raise ValidationError('产品被BOM使用，无法删除')
         
         result = super().delete(product_id)
@@ -243,23 +330,134 @@ class Product(BaseModel):
         logger.debug("更新产品库存: ID=%s, 变化=%s", product_id, quantity_change)
         
         query = 'UPDATE products SET quantity = quantity + ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?'
+        params = (float(quantity_change), int(product_id))
         try:
-            result = cls.execute_update(query, (float(quantity_change), int(product_id)))
-            return result > 0
+            with db_manager.transaction():
+                if SUPPORTS_RETURNING:
+                    rows = cls.execute_query(f'{query} RETURNING id, name, sku, quantity, min_stock', params)
+                elif cls.execute_update(query, params) > 0:
+                    rows = cls.execute_query(
+                        'SELECT id, name, sku, quantity, min_stock FROM products WHERE id = ?', (int(product_id),)
+                    )
+                else:
+                    rows = []
+                if not rows:
+                    return False
+                
+                # 更新前的库存 = 更新后的库存 - 变化量
+                product = rows[0]
+                previous = cls.stock_alert_status(product['quantity'] - params[0], product['min_stock'])
+                cls.track_stock_alert(product, previous)
+                cls.invalidate_bom_cache([product['id']])
+                return True
         except Exception as e:
             logger.error("更新库存失败: ID=%s, 错误=%s", product_id, e)
             raise DatabaseError(f"更新库存失败: {str(e)}")
     
+    @staticmethod
+    def invalidate_bom_cache(product_ids: List[int]) -> None:
+        """物料信息变化提交后，失效使用这些物料的产品的展开BOM缓存"""
+        from services.bom_engine import bom_cache
+        bom_cache.on_materials_changed(product_ids)
+    
     @classmethod
     def get_low_stock_products(cls) -> List[Dict[str, Any]]:
         """获取低库存产品"""
-        query = '''
+        # 前一个条件使查询可以走部分索引 idx_products_stock_alert，不改变结果
+        query = f'''
             SELECT * FROM products 
-            WHERE min_stock IS NOT NULL AND quantity <= min_stock
+            WHERE ({cls.STOCK_ALERT_CONDITION})
+            AND min_stock IS NOT NULL AND quantity <= min_stock
             ORDER BY quantity ASC, name ASC
         '''
         return cls.execute_query(query)
     
+    @classmethod
+    def get_stock_alerts(cls) -> List[Dict[str, Any]]:
+        """获取全部处于预警状态（零库存或低于最低库存）的产品
+        
+        通过部分索引 idx_products_stock_alert 读取，耗时只与预警产品数量有关。
+        """
+        query = f'''
+            SELECT id, name, sku, quantity, min_stock,
+                   CASE WHEN quantity <= 0 THEN 'zero' ELSE 'low' END AS alert_status
+            FROM products
+            WHERE {cls.STOCK_ALERT_CONDITION}
+            ORDER BY quantity ASC, name ASC
+        '''
+        return cls.execute_query(query)
+    
+    @staticmethod
+    def stock_alert_status(quantity: Any, min_stock: Any) -> Optional[str]:
+        """库存预警状态: 'zero'、'low' 或 None，判断规则与 STOCK_ALERT_CONDITION 一致"""
+        if quantity is None:
+            return None
+        quantity = float(quantity)
+        if quantity <= 0:
+            return 'zero'
+        if min_stock is not None and float(min_stock) > 0 and quantity <= float(min_stock):
+            return 'low'
+        return None
+    
+    @classmethod
+    def track_stock_alert(cls, product: Dict[str, Any], previous_status: Optional[str]) -> Optional[str]:
+        """比较产品更新前后的预警状态，进入或改变预警状态时发布 LOW_STOCK_ALERT
+        
+        事件登记为提交后回调，事务回滚时不会发出；状态不变时不重复通知。
+        """
+        status = cls.stock_alert_status(product.get('quantity'), product.get('min_stock'))
+        if status is None or status == previous_status:
+            return status
+        
+        from core.events import event_bus, Event, EventType
+        event = Event(
+            event_type=EventType.LOW_STOCK_ALERT,
+            data={
+                'product_id': product['id'],
+                'product_name': product.get('name'),
+                'sku': product.get('sku'),
+                'current_stock': product.get('quantity'),
+                'min_stock': product.get('min_stock'),
+                'status': status,
+                'previous_status': previous_status
+            },
+            source='product'
+        )
+        db_manager.after_commit(lambda: event_bus.publish(event))
+        return status
+    
+    @classmethod
+    def get_dashboard_summary(cls, today: Optional[str] = None) -> Dict[str, Any]:
+        """仪表板汇总：全部产品的数量、库存总值、低库存数，以及今日出入库数量
+        
+        产品汇总和今日交易汇总（读交易日汇总表）合并为一条查询，一次往返，结果不受分页影响。
+        """
+        today = today or datetime.now().date().isoformat()
+        query = '''
+            SELECT p.total_products, p.total_inventory_value, p.low_stock_count,
+                   t.today_incoming, t.today_outgoing
+            FROM (
+                SELECT COUNT(*) AS total_products,
+                       COALESCE(SUM(quantity * price), 0) AS total_inventory_value,
+                       COALESCE(SUM(min_stock > 0 AND quantity <= min_stock), 0) AS low_stock_count
+                FROM products
+            ) p, (
+                SELECT COALESCE(SUM(CASE WHEN transaction_type = 'in' THEN quantity END), 0) AS today_incoming,
+                       COALESCE(SUM(CASE WHEN transaction_type = 'out' THEN quantity END), 0) AS today_outgoing
+                FROM transaction_daily_rollup
+                WHERE transaction_date = ?
+            ) t
+        '''
+        rows = cls.execute_query(query, (today,))
+        row = rows[0] if rows else {}
+        return {
+            'total_products': int(row.get('total_products') or 0),
+            'total_inventory_value': float(row.get('total_inventory_value') or 0),
+            'today_incoming': int(row.get('today_incoming') or 0),
+            'today_outgoing': int(row.get('today_outgoing') or 0),
+            'low_stock_count': int(row.get('low_stock_count') or 0)
+        }
+    
     @classmethod
     def get_zero_stock_products(cls) -> List[Dict[str, Any]]:
         """获取零库存产品"""
@@ -270,43 +468,82 @@ class Product(BaseModel):
         '''
         return cls.execute_query(query)
     
+    @classmethod
+    def fts_enabled(cls) -> bool:
+        """当前数据库是否有产品全文索引（SQLite 未编译 FTS5 时迁移会跳过建表）"""
+        db_path = str(db_manager.db_path)
+        if db_path not in cls._fts_available:
+            rows = cls.execute_query(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (cls.FTS_TABLE,)
+            )
+            cls._fts_available[db_path] = bool(rows)
+        return cls._fts_available[db_path]
+
+    @classmethod
+    def fts_match_expression(cls, keyword: str, columns: Tuple[str, ...] = SEARCH_COLUMNS) -> str:
+        """把用户输入转换为 FTS5 MATCH 表达式
+
+        关键词整体作为一个短语，在 trigram 分词下等价于子串匹配（同时覆盖前缀匹配）；
+        双引号转义后用户输入不会被当作 FTS5 查询语法解析。
+        """
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        if tuple(columns) == cls.SEARCH_COLUMNS:
+            return phrase
+        return '{' + ' '.join(columns) + '} : ' + phrase
+
+    @classmethod
+    def build_search(
+        cls,
+        keyword: str,
+        columns: Tuple[str, ...] = SEARCH_COLUMNS,
+        alias: str = 'p'
+    ) -> Tuple[str, str, List[Any], str, List[Any]]:
+        """生成产品关键词搜索的 SQL 片段
+
+        返回 (JOIN 片段, WHERE 条件, WHERE 参数, ORDER BY 片段, ORDER BY 参数)，
+        查询中 products 表的别名为 alias。关键词不少于 3 个字符且全文索引可用时
+        走 products_fts 并按 bm25 排序；否则回退到 LIKE，按命中 name/sku 排序。
+        """
+        keyword = keyword.strip()
+        if len(keyword) >= cls.FTS_MIN_KEYWORD_LENGTH and cls.fts_enabled():
+            weights = ', '.join(str(w) for w in cls.FTS_WEIGHTS)
+            return (
+                f' JOIN {cls.FTS_TABLE} ON {cls.FTS_TABLE}.rowid = {alias}.id',
+                f'{cls.FTS_TABLE} MATCH ?',
+                [cls.fts_match_expression(keyword, columns)],
+                f'bm25({cls.FTS_TABLE}, {weights})',
+                []
+            )
+
+        pattern = f'%{keyword}%'
+        rank_columns = [column for column in columns if column != 'description']
+        where = ' OR '.join(f'{alias}.{column} LIKE ?' for column in columns)
+        order = 'CASE ' + ' '.join(
+            f'WHEN {alias}.{column} LIKE ? THEN {rank}' for rank, column in enumerate(rank_columns, 1)
+        ) + f' ELSE {len(rank_columns) + 1} END'
+        return '', f'({where})', [pattern] * len(columns), order, [pattern] * len(rank_columns)
+
     @classmethod
     def search_products(cls, keyword: str, limit: int = 50) -> List[Dict[str, Any]]:
         """搜索产品"""
-        query = '''
-            SELECT * FROM products 
-            WHERE name LIKE ? OR sku LIKE ? OR description LIKE ?
-            ORDER BY 
-                CASE 
-                    WHEN name LIKE ? THEN 1
-                    WHEN sku LIKE ? THEN 2
-                    ELSE 3
-                END,
-                name ASC
+        join, where, params, order, order_params = cls.build_search(keyword)
+        query = f'''
+            SELECT p.* FROM products p{join}
+            WHERE {where}
+            ORDER BY {order}, p.name ASC
             LIMIT ?
         '''
-        search_pattern = f'%{keyword}%'
-        params = [search_pattern, search_pattern, search_pattern, search_pattern, search_pattern, limit]
-        
-        return cls.execute_query(query, tuple(params))
-    
+        return cls.execute_query(query, tuple(params + order_params + [limit]))
+
     @classmethod
     def search_non_composite_products(cls, keyword: str, limit: int = 50) -> List[Dict[str, Any]]:
         """搜索非复合产品（用于采购订单）"""
-        query = '''
-            SELECT * FROM products 
-            WHERE (name LIKE ? OR sku LIKE ? OR description LIKE ?)
-            AND is_composite = 0
-            ORDER BY 
-                CASE 
-                    WHEN name LIKE ? THEN 1
-                    WHEN sku LIKE ? THEN 2
-                    ELSE 3
-                END,
-                name ASC
+        join, where, params, order, order_params = cls.build_search(keyword)
+        query = f'''
+            SELECT p.* FROM products p{join}
+            WHERE {where}
+            AND p.is_composite = 0
+            ORDER BY {order}, p.name ASC
             LIMIT ?
         '''
-        search_pattern = f'%{keyword}%'
-        params = [search_pattern, search_pattern, search_pattern, search_pattern, search_pattern, limit]
-        
-        return cls.execute_query(query, tuple(params))
\ No newline at end of file
+        return cls.execute_query(query, tuple(params + order_params + [limit]))
\ No newline at end of file
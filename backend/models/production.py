@@ -1,9 +1,14 @@
 from models.base import BaseModel
-from utils.database import serialize_rows
 
 class ProductionPlan(BaseModel):
     """生产计划模型"""
     
+    TABLE_NAME = 'production_plans'
+    INSERT_RETURNING = '''
+        *, (SELECT name FROM products WHERE id = production_plans.product_id) AS product_name,
+        (SELECT sku FROM products WHERE id = production_plans.product_id) AS product_sku
+    '''
+    
     @classmethod
     def create_table(cls):
         """创建生产计划表"""
@@ -41,7 +46,7 @@ class ProductionPlan(BaseModel):
         query += ' ORDER BY pp.scheduled_date DESC, pp.created_at DESC'
         
         rows = cls.execute_query(query, params)
-        return serialize_rows(rows)
+        return rows
     
     @classmethod
     def create(cls, product_id, quantity, scheduled_date, notes=None):
@@ -50,8 +55,7 @@ class ProductionPlan(BaseModel):
             INSERT INTO production_plans (product_id, quantity, scheduled_date, notes)
             VALUES (?, ?, ?, ?)
         '''
-        cls.execute_update(query, (product_id, quantity, scheduled_date, notes))
-        return cls.get_by_id(cls.get_last_insert_id())
+        return cls.insert_returning(query, (product_id, quantity, scheduled_date, notes))
     
     @classmethod
     def get_by_id(cls, plan_id):
@@ -63,7 +67,7 @@ class ProductionPlan(BaseModel):
             WHERE pp.id = ?
         '''
         rows = cls.execute_query(query, (plan_id,))
-        return serialize_rows(rows)[0] if rows else None
+        return rows[0] if rows else None
     
     @classmethod
     def delete(cls, plan_id):
@@ -1,10 +1,25 @@
+import logging
 from models.base import BaseModel
-from utils.database import serialize_rows
+from typing import Any, Dict, List, Tuple
+from utils.database import db_manager
+from utils.error_handler import ValidationError
+from utils.validators import TransactionValidator
+from utils.pagination import keyset_condition, keyset_order, split_page
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 class Transaction(BaseModel):
     """交易记录模型"""
     
+    TABLE_NAME = 'transactions'
+    INSERT_RETURNING = '''
+        *, (SELECT name FROM products WHERE id = transactions.product_id) AS product_name,
+        (SELECT sku FROM products WHERE id = transactions.product_id) AS product_sku
+    '''
+    # 列表排序键（倒序），与 idx_transactions_date_created (transaction_date, created_at, rowid) 一致
+    PAGE_KEYS = ('t.transaction_date', 't.created_at', 't.id')
+    
     @classmethod
     def create_table(cls):
         """创建交易记录表"""
@@ -29,26 +44,64 @@ class Transaction(BaseModel):
     @classmethod
     def get_all(cls, product_id=None, transaction_type=None):
         """获取所有交易记录"""
-        query = '''
-            SELECT t.*, p.name as product_name, p.sku as product_sku
-            FROM transactions t
-            JOIN products p ON t.product_id = p.id
-            WHERE 1=1
-        '''
-        params = []
+        query, params = cls._build_list_query(product_id, transaction_type)
+        return cls.execute_query(query, params)
+    
+    @classmethod
+    def iter_all(cls, product_id=None, transaction_type=None):
+        """逐行返回交易记录的生成器，筛选条件与 get_all 相同"""
+        query, params = cls._build_list_query(product_id, transaction_type)
+        return cls.iter_query(query, params)
+    
+    @classmethod
+    def get_page(cls, product_id=None, transaction_type=None, limit=50, cursor=None, include_total=False):
+        """按 (transaction_date, created_at, id) 倒序游标分页获取交易记录
+        
+        include_total 为 False 时不执行 COUNT(*)，返回的 total 为 None。
+        """
+        total = None
+        if include_total:
+            where, params = cls._build_list_filters(product_id, transaction_type)
+            rows = cls.execute_query(f'SELECT COUNT(*) AS total FROM transactions t WHERE {where}', params)
+            total = rows[0]['total'] if rows else 0
+        
+        query, params = cls._build_list_query(product_id, transaction_type, cursor=cursor)
+        rows = cls.execute_query(query + ' LIMIT ?', params + (limit + 1,))
+        transactions, next_cursor = split_page(rows, limit, ('transaction_date', 'created_at', 'id'))
+        return {'transactions': transactions, 'next_cursor': next_cursor, 'total': total}
+    
+    @classmethod
+    def _build_list_filters(cls, product_id=None, transaction_type=None):
+        """交易记录列表的筛选条件"""
+        conditions, params = ['1=1'], []
         
         if product_id:
-            query += ' AND t.product_id = ?'
+            conditions.append('t.product_id = ?')
             params.append(product_id)
         
         if transaction_type:
-            query += ' AND t.transaction_type = ?'
+            conditions.append('t.transaction_type = ?')
             params.append(transaction_type)
         
-        query += ' ORDER BY t.transaction_date DESC, t.created_at DESC'
+        return ' AND '.join(conditions), tuple(params)
+    
+    @classmethod
+    def _build_list_query(cls, product_id=None, transaction_type=None, cursor=None):
+        """构建交易记录列表查询，cursor 为上一页最后一行的游标"""
+        where, params = cls._build_list_filters(product_id, transaction_type)
+        keyset, keyset_params = keyset_condition(cls.PAGE_KEYS, cursor, descending=True)
+        if keyset:
+            where += f' AND {keyset}'
+            params += tuple(keyset_params)
         
-        rows = cls.execute_query(query, params)
-        return serialize_rows(rows)
+        query = f'''
+            SELECT t.*, p.name as product_name, p.sku as product_sku
+            FROM transactions t
+            JOIN products p ON t.product_id = p.id
+            WHERE {where}
+            ORDER BY {keyset_order(cls.PAGE_KEYS, descending=True)}
+        '''
+        return query, params
     
     @classmethod
     def get_recent(cls, limit=10):
@@ -61,60 +114,126 @@ class Transaction(BaseModel):
             LIMIT ?
         '''
         rows = cls.execute_query(query, (limit,))
-        return serialize_rows(rows)
+        return rows
     
     @classmethod
     def create(cls, product_id, transaction_type, quantity, unit_price, transaction_date, 
                reference_no=None, customer_supplier=None, notes=None):
-        """创建交易记录"""
+        """创建交易记录
+        
+        交易插入、库存更新和加权平均成本更新在同一个工作单元内完成，只提交一次。
+        """
+        from models.product import Product
+        
         # 计算总金额
         total_value = float(quantity) * float(unit_price)
         
-        # 插入交易记录
         query = '''
             INSERT INTO transactions (product_id, transaction_type, quantity, unit_price, total_value, 
                                    reference_no, customer_supplier, transaction_date, notes)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         '''
-        cls.execute_update(query, (
-            int(product_id), transaction_type, float(quantity), float(unit_price), float(total_value),
-            reference_no, customer_supplier, transaction_date, notes
-        ))
         
-        # 更新产品库存
-        from models.product import Product
-        quantity_change = float(quantity) if transaction_type == 'in' else -float(quantity)
-
-        # 在入库时，按加权平均成本更新产品单价：
-        # new_price = (current_qty * current_price + added_qty * unit_price) / (current_qty + added_qty)
-        try:
+        with db_manager.transaction():
+            # 插入交易记录（RETURNING 直接取回新记录）
+            transaction = cls.insert_returning(query, (
+                int(product_id), transaction_type, float(quantity), float(unit_price), float(total_value),
+                reference_no, customer_supplier, transaction_date, notes
+            ))
+            
+            # 在入库时，按加权平均成本更新产品单价：
+            # new_price = (current_qty * current_price + added_qty * unit_price) / (current_qty + added_qty)
+            new_price = None
             if transaction_type == 'in':
-                prod = Product.get_by_id(product_id)
-                current_qty = float(prod.get('quantity', 0)) if prod else 0.0
-                current_price = float(prod.get('price', 0.0)) if prod else 0.0
-                added_qty = float(quantity)
-
-                new_qty = current_qty + added_qty
+                try:
+                    prod = Product.get_by_id(product_id)
+                    current_qty = float(prod.get('quantity', 0)) if prod else 0.0
+                    current_price = float(prod.get('price', 0.0)) if prod else 0.0
+                    added_qty = float(quantity)
+                    
+                    new_qty = current_qty + added_qty
+                    if new_qty > 0:
+                        new_price = (current_qty * current_price + added_qty * float(unit_price)) / new_qty
+                except Exception as e:
+                    # 计算失败时仅更新库存
+                    logger.warning("计算加权平均成本失败: 产品ID=%s, 错误=%s", product_id, e)
+            
+            # 更新产品库存
+            quantity_change = float(quantity) if transaction_type == 'in' else -float(quantity)
+            Product.update_stock(product_id, quantity_change)
+            
+            if new_price is not None:
+                try:
+                    Product.update(product_id, price=new_price)
+                except Exception as e:
+                    # 如果更新价格失败，仍然继续（不应阻塞交易创建）
+                    logger.warning("更新加权平均成本失败: 产品ID=%s, 错误=%s", product_id, e)
+            
+            return transaction
+    
+    @classmethod
+    def validate_bulk_row(cls, row: Dict[str, Any]) -> Dict[str, Any]:
+        """批量创建时的单行校验"""
+        return TransactionValidator.validate_create_data(row)
+    
+    @classmethod
+    def prepare_bulk_rows(cls, rows: List[Dict[str, Any]]) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+        """批量校验，并按批查询排除引用不存在产品的行"""
+        valid, errors = super().prepare_bulk_rows(rows)
+        
+        product_ids = list({data['product_id'] for _, data in valid})
+        known = set()
+        for start in range(0, len(product_ids), 500):
+            chunk = product_ids[start:start + 500]
+            query = f'SELECT id FROM products WHERE id IN ({", ".join("?" * len(chunk))})'
+            known.update(row['id'] for row in cls.execute_query(query, tuple(chunk)))
+        
+        kept = []
+        for index, data in valid:
+            if data['product_id'] in known:
+                kept.append((index, data))
+            else:
+                errors.append(cls._bulk_error(index, ValidationError('产品不存在', field='product_id')))
+        return kept, errors
+    
+    @classmethod
+    def after_bulk_insert(cls, conn, created: List[Tuple[int, Dict[str, Any]]]) -> None:
+        """按产品汇总库存变化和加权平均成本，每个产品只更新一次
+        
+        按插入顺序逐笔应用，结果与逐条调用 create 一致。
+        """
+        from models.product import Product
+        
+        product_ids = list({data['product_id'] for _, data in created})
+        state, products = {}, {}
+        for start in range(0, len(product_ids), 500):
+            chunk = product_ids[start:start + 500]
+            query = f'SELECT id, name, sku, quantity, price, min_stock FROM products WHERE id IN ({", ".join("?" * len(chunk))})'
+            for row in conn.execute(query, tuple(chunk)):
+                state[row['id']] = [float(row['quantity'] or 0), float(row['price'] or 0)]
+                products[row['id']] = dict(row)
+        
+        for _, data in created:
+            current = state[data['product_id']]
+            quantity = data['quantity']
+            if data['transaction_type'] == 'in':
+                new_qty = current[0] + quantity
                 if new_qty > 0:
-                    new_total_value = current_qty * current_price + added_qty * float(unit_price)
-                    new_price = new_total_value / new_qty
-                    # 先更新库存，再更新价格以保持数据一致性
-                    Product.update_stock(product_id, quantity_change)
-                    try:
-                        Product.update(product_id, price=new_price)
-                    except Exception:
-                        # 如果更新价格失败，仍然继续（不应阻塞交易创建）
-                        pass
-                    return cls.get_by_id(cls.get_last_insert_id())
-
-        except Exception:
-            # 在任何错误情况下回退到仅更新库存的行为
-            pass
-
-        # 默认行为：仅更新库存
-        Product.update_stock(product_id, quantity_change)
+                    current[1] = (current[0] * current[1] + quantity * data['unit_price']) / new_qty
+                current[0] = new_qty
+            else:
+                current[0] -= quantity
         
-        return cls.get_by_id(cls.get_last_insert_id())
+        conn.executemany(
+            'UPDATE products SET quantity = ?, price = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+            [(quantity, price, product_id) for product_id, (quantity, price) in state.items()]
+        )
+        
+        for product_id, (quantity, _) in state.items():
+            product = products[product_id]
+            previous = Product.stock_alert_status(product['quantity'], product['min_stock'])
+            Product.track_stock_alert(dict(product, quantity=quantity), previous)
+        Product.invalidate_bom_cache(list(state))
     
     @classmethod
     def get_by_id(cls, transaction_id):
@@ -126,27 +245,13 @@ class Transaction(BaseModel):
             WHERE t.id = ?
         '''
         rows = cls.execute_query(query, (transaction_id,))
-        return serialize_rows(rows)[0] if rows else None
+        return rows[0] if rows else None
     
     @classmethod
     def get_today_stats(cls):
-        """获取今日交易统计"""
-        today = datetime.now().date().isoformat()
-        
-        query_in = '''
-            SELECT COALESCE(SUM(quantity), 0) as total 
-            FROM transactions 
-            WHERE transaction_type = 'in' AND transaction_date = ?
-        '''
-        result_in = cls.execute_query(query_in, (today,))
-        today_incoming = int(result_in[0][0]) if result_in and len(result_in) > 0 else 0
-        
-        query_out = '''
-            SELECT COALESCE(SUM(quantity), 0) as total 
-            FROM transactions 
-            WHERE transaction_type = 'out' AND transaction_date = ?
-        '''
-        result_out = cls.execute_query(query_out, (today,))
-        today_outgoing = int(result_out[0][0]) if result_out and len(result_out) > 0 else 0
+        """获取今日交易统计，返回 (今日入库数量, 今日出库数量)"""
+        from models.transaction_rollup import TransactionRollup
         
-        return today_incoming, today_outgoing
+        # 读取交易日汇总表，不扫描交易明细
+        totals = TransactionRollup.get_date_totals(datetime.now().date().isoformat())
+        return int(totals['incoming_quantity']), int(totals['outgoing_quantity'])
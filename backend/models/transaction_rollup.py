@@ -0,0 +1,192 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from models.base import BaseModel
+from utils.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+class TransactionRollup(BaseModel):
+    """按 日期 × 产品 × 交易类型 汇总的交易日统计
+
+    由 transactions 表上的触发器在同一语句内维护（新增、删除、修改交易记录都会同步），
+    今日/区间统计只读汇总表，不扫描交易明细。汇总与明细不一致时可用 rebuild() 重建。
+    """
+
+    TABLE_NAME = 'transaction_daily_rollup'
+
+    # 汇总列：入库/出库数量、金额和笔数
+    TOTALS_COLUMNS = '''
+        COALESCE(SUM(CASE WHEN r.transaction_type = 'in' THEN r.quantity END), 0) AS incoming_quantity,
+        COALESCE(SUM(CASE WHEN r.transaction_type = 'out' THEN r.quantity END), 0) AS outgoing_quantity,
+        COALESCE(SUM(CASE WHEN r.transaction_type = 'in' THEN r.total_value END), 0) AS incoming_value,
+        COALESCE(SUM(CASE WHEN r.transaction_type = 'out' THEN r.total_value END), 0) AS outgoing_value,
+        COALESCE(SUM(r.transaction_count), 0) AS transaction_count
+    '''
+
+    @classmethod
+    def create_table(cls):
+        """创建交易日汇总表、索引和同步触发器"""
+        statements = [
+            '''
+            CREATE TABLE IF NOT EXISTS transaction_daily_rollup (
+                transaction_date DATE NOT NULL,
+                product_id INTEGER NOT NULL,
+                transaction_type TEXT NOT NULL,
+                quantity REAL NOT NULL DEFAULT 0,
+                total_value REAL NOT NULL DEFAULT 0,
+                transaction_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (transaction_date, product_id, transaction_type)
+            ) WITHOUT ROWID
+            ''',
+            # 按产品查询汇总
+            '''
+            CREATE INDEX IF NOT EXISTS idx_transaction_rollup_product
+            ON transaction_daily_rollup (product_id, transaction_date)
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS transactions_rollup_ai AFTER INSERT ON transactions BEGIN
+                INSERT INTO transaction_daily_rollup
+                    (transaction_date, product_id, transaction_type, quantity, total_value, transaction_count)
+                VALUES (new.transaction_date, new.product_id, new.transaction_type, new.quantity, new.total_value, 1)
+                ON CONFLICT (transaction_date, product_id, transaction_type) DO UPDATE SET
+                    quantity = quantity + excluded.quantity,
+                    total_value = total_value + excluded.total_value,
+                    transaction_count = transaction_count + 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS transactions_rollup_ad AFTER DELETE ON transactions BEGIN
+                UPDATE transaction_daily_rollup SET
+                    quantity = quantity - old.quantity,
+                    total_value = total_value - old.total_value,
+                    transaction_count = transaction_count - 1
+                WHERE transaction_date = old.transaction_date
+                  AND product_id = old.product_id
+                  AND transaction_type = old.transaction_type;
+                DELETE FROM transaction_daily_rollup
+                WHERE transaction_date = old.transaction_date
+                  AND product_id = old.product_id
+                  AND transaction_type = old.transaction_type
+                  AND transaction_count <= 0;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS transactions_rollup_au
+            AFTER UPDATE OF transaction_date, product_id, transaction_type, quantity, total_value ON transactions
+            BEGIN
+                UPDATE transaction_daily_rollup SET
+                    quantity = quantity - old.quantity,
+                    total_value = total_value - old.total_value,
+                    transaction_count = transaction_count - 1
+                WHERE transaction_date = old.transaction_date
+                  AND product_id = old.product_id
+                  AND transaction_type = old.transaction_type;
+                DELETE FROM transaction_daily_rollup
+                WHERE transaction_date = old.transaction_date
+                  AND product_id = old.product_id
+                  AND transaction_type = old.transaction_type
+                  AND transaction_count <= 0;
+                INSERT INTO transaction_daily_rollup
+                    (transaction_date, product_id, transaction_type, quantity, total_value, transaction_count)
+                VALUES (new.transaction_date, new.product_id, new.transaction_type, new.quantity, new.total_value, 1)
+                ON CONFLICT (transaction_date, product_id, transaction_type) DO UPDATE SET
+                    quantity = quantity + excluded.quantity,
+                    total_value = total_value + excluded.total_value,
+                    transaction_count = transaction_count + 1;
+            END
+            '''
+        ]
+        for statement in statements:
+            cls.execute_query(statement)
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """从交易明细重建汇总表（回填或修复），返回汇总行数"""
+        with db_manager.transaction() as conn:
+            conn.execute('DELETE FROM transaction_daily_rollup')
+            conn.execute('''
+                INSERT INTO transaction_daily_rollup
+                    (transaction_date, product_id, transaction_type, quantity, total_value, transaction_count)
+                SELECT transaction_date, product_id, transaction_type,
+                       SUM(quantity), SUM(total_value), COUNT(*)
+                FROM transactions
+                GROUP BY transaction_date, product_id, transaction_type
+            ''')
+            count = conn.execute('SELECT COUNT(*) FROM transaction_daily_rollup').fetchone()[0]
+        logger.info("交易日汇总重建完成: %s 行", count)
+        return count
+
+    @classmethod
+    def _build_filters(cls, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       product_id: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """日期区间（含两端）和产品筛选条件"""
+        conditions, params = ['1=1'], []
+        if start_date:
+            conditions.append('r.transaction_date >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append('r.transaction_date <= ?')
+            params.append(end_date)
+        if product_id:
+            conditions.append('r.product_id = ?')
+            params.append(int(product_id))
+        return ' AND '.join(conditions), params
+
+    @classmethod
+    def get_daily_totals(cls, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                         product_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按天汇总出入库数量和金额"""
+        where, params = cls._build_filters(start_date, end_date, product_id)
+        query = f'''
+            SELECT r.transaction_date AS date, {cls.TOTALS_COLUMNS}
+            FROM transaction_daily_rollup r
+            WHERE {where}
+            GROUP BY r.transaction_date
+            ORDER BY r.transaction_date
+        '''
+        return cls.execute_query(query, tuple(params))
+
+    @classmethod
+    def get_weekly_totals(cls, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                          product_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按周（周一为一周的开始）汇总出入库数量和金额"""
+        where, params = cls._build_filters(start_date, end_date, product_id)
+        query = f'''
+            SELECT date(r.transaction_date, 'weekday 0', '-6 days') AS week_start, {cls.TOTALS_COLUMNS}
+            FROM transaction_daily_rollup r
+            WHERE {where}
+            GROUP BY week_start
+            ORDER BY week_start
+        '''
+        return cls.execute_query(query, tuple(params))
+
+    @classmethod
+    def get_product_totals(cls, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                           limit: int = 100) -> List[Dict[str, Any]]:
+        """按产品汇总出入库数量和金额，按出入库总量倒序"""
+        where, params = cls._build_filters(start_date, end_date)
+        query = f'''
+            SELECT r.product_id, p.name AS product_name, p.sku AS product_sku, {cls.TOTALS_COLUMNS}
+            FROM transaction_daily_rollup r
+            LEFT JOIN products p ON p.id = r.product_id
+            WHERE {where}
+            GROUP BY r.product_id
+            ORDER BY SUM(r.quantity) DESC, r.product_id
+            LIMIT ?
+        '''
+        return cls.execute_query(query, tuple(params) + (limit,))
+
+    @classmethod
+    def get_date_totals(cls, date: str) -> Dict[str, Any]:
+        """单日出入库汇总（今日统计等）"""
+        rows = cls.get_daily_totals(start_date=date, end_date=date)
+        if rows:
+            return rows[0]
+        return {
+            'date': date,
+            'incoming_quantity': 0,
+            'outgoing_quantity': 0,
+            'incoming_value': 0,
+            'outgoing_value': 0,
+            'transaction_count': 0
+        }
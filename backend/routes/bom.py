@@ -4,6 +4,7 @@ import logging
 from models.bom import BOM
 from models.product import Product
 from services.inventory_service import InventoryService
+from services.bom_engine import bom_cache
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +56,7 @@ def get_bom():
             # 获取所有产品的BOM信息
             products_data = Product.get_all()
             products = products_data.get('products', []) if isinstance(products_data, dict) else products_data
+            # 各产品的直接/展开BOM都取自BOM缓存（整表一次加载，变化时按反查关系失效）
             result = []
             for product in products:
                 try:
@@ -64,11 +66,12 @@ def get_bom():
                         continue
                         
                     if expand:
-                        bom_items = BOM.get_by_product_with_components(product_id)
+                        bom_items = bom_cache.explode(product_id)
+                        total_cost = bom_cache.rolled_up_cost(product_id)
                     else:
-                        bom_items = BOM.get_by_product(product_id)
-                    # 计算总成本（基于物料项的小计）
-                    total_cost = sum(float(item.get('item_cost', 0)) for item in bom_items)
+                        bom_items = bom_cache.direct(product_id)
+                        # 计算总成本（基于物料项的小计）
+                        total_cost = sum(float(item.get('item_cost', 0)) for item in bom_items)
                     
                     # 格式化产品信息
                     formatted_product = {
@@ -108,6 +111,50 @@ def get_bom():
         logger.error("获取BOM列表时出错: %s", str(e), exc_info=True)
         return jsonify({'error': '获取BOM列表失败', 'message': str(e)}), 500
 
+@bom_bp.route('/bom/where-used/<int:material_id>', methods=['GET'])
+def get_where_used(material_id):
+    """反查物料被哪些产品使用（含间接使用），及每个上级产品单位用量中的累计数量"""
+    try:
+        material = Product.get_by_id(material_id)
+        if not material:
+            return jsonify({'error': '产品不存在'}), 404
+        
+        # 在缓存的BOM图上一次遍历求出所有上级产品
+        items = bom_cache.implode(material_id)
+        
+        return jsonify({
+            'material_id': material_id,
+            'material_name': material.get('name', ''),
+            'material_sku': material.get('sku', ''),
+            'material_unit': material.get('unit', '个'),
+            'items': items,
+            'top_level_products': [item for item in items if item['is_top_level']]
+        })
+    except Exception as e:
+        logger.error("反查物料使用情况时出错 (物料ID: %s): %s", material_id, str(e), exc_info=True)
+        return jsonify({'error': '反查物料使用情况失败', 'message': str(e)}), 500
+
+@bom_bp.route('/bom/buildable', methods=['GET'])
+def get_buildable():
+    """每个组合产品用当前库存最多可生产的数量及限制物料
+
+    allocation=independent（默认）时各产品独占库存；allocation=shared 时产品共用库存，
+    按 priority（逗号分隔的产品ID）优先分配，其余按名称顺序分配。
+    """
+    try:
+        allocation = request.args.get('allocation', 'independent')
+        try:
+            priority = [int(value) for value in request.args.get('priority', '').split(',') if value.strip()]
+        except ValueError:
+            return jsonify({'error': 'priority 必须为逗号分隔的产品ID'}), 400
+        items = InventoryService.calculate_buildable(allocation=allocation, priority=priority)
+        return jsonify({'allocation': allocation, 'items': items})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error("计算可生产数量时出错: %s", str(e), exc_info=True)
+        return jsonify({'error': '计算可生产数量失败', 'message': str(e)}), 500
+
 @bom_bp.route('/bom', methods=['POST'])
 def create_bom_item():
     """创建BOM项"""
@@ -137,6 +184,9 @@ def create_bom_item():
         )
         
         return jsonify(bom_item)
+    except ValueError as e:
+        logger.warning('ValueError in create_bom_item: %s', e)
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.exception('Error in create_bom_item: %s', e)
         return jsonify({'error': str(e)}), 500
@@ -194,8 +244,7 @@ def delete_product_bom(product_id):
     try:
         logger.debug('delete_product_bom called for product_id: %s', product_id)
         # 删除产品相关的所有BOM项
-        query = 'DELETE FROM bom WHERE product_id = ?'
-        result = BOM.execute_update(query, (product_id,))
+        result = BOM.delete_by_product(product_id)
         return jsonify({'message': '产品BOM删除成功', 'deleted_count': result})
     except Exception as e:
         logger.exception('Error in delete_product_bom: %s', e)
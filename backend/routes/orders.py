@@ -30,21 +30,35 @@ def get_orders():
     if status and status not in ['pending', 'completed', 'cancelled']:
         return APIResponse.error("订单状态无效")
     
-    # 获取订单数据
-    orders = Order.get_all(
+    # 带 cursor 参数（首页传空值）时使用游标分页，默认不统计总数
+    if 'cursor' in request.args:
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        result = Order.get_page(
+            order_type=order_type,
+            status=status,
+            per_page=per_page,
+            cursor=request.args.get('cursor') or None,
+            include_total=include_total
+        )
+        return APIResponse.paginated(
+            data=result['orders'],
+            total=result['total'],
+            per_page=per_page,
+            next_cursor=result['next_cursor'],
+            message="获取订单列表成功"
+        )
+    
+    # 分页在 SQL 中完成，只加载本页订单的订单项
+    result = Order.get_page(
         order_type=order_type,
-        status=status
+        status=status,
+        page=page,
+        per_page=per_page
     )
     
-    # 手动分页（因为原方法不支持分页）
-    total = len(orders)
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    paginated_orders = orders[start_idx:end_idx]
-    
     return APIResponse.paginated(
-        data=paginated_orders,
-        total=total,
+        data=result['orders'],
+        total=result['total'],
         page=page,
         per_page=per_page,
         message="获取订单列表成功"
@@ -186,34 +200,28 @@ def cancel_order(order_id):
 @handle_api_errors
 def get_order_stats():
     """获取订单统计"""
-    logger.debug("获取订单统计请求")
-    
-    # 获取所有订单
-    all_orders = Order.get_all()
-    
-    # 计算统计信息
-    total_orders = len(all_orders)
-    purchase_orders = [o for o in all_orders if o['order_type'] == 'purchase']
-    sales_orders = [o for o in all_orders if o['order_type'] == 'sales']
+    logger.debug("获取订单统计请求: %s", dict(request.args))
     
-    pending_orders = [o for o in all_orders if o['status'] == 'pending']
-    completed_orders = [o for o in all_orders if o['status'] == 'completed']
-    cancelled_orders = [o for o in all_orders if o['status'] == 'cancelled']
+    start_date = request.args.get('start_date', '').strip() or None
+    end_date = request.args.get('end_date', '').strip() or None
+    if start_date:
+        start_date = DataValidator.validate_date(start_date, 'start_date')
+    if end_date:
+        end_date = DataValidator.validate_date(end_date, 'end_date')
     
-    total_amount = sum(float(o.get('total_amount', 0)) for o in all_orders)
-    purchase_amount = sum(float(o.get('total_amount', 0)) for o in purchase_orders)
-    sales_amount = sum(float(o.get('total_amount', 0)) for o in sales_orders)
+    # 数据库端 GROUP BY 汇总，不加载订单明细
+    summary = OrderService.get_order_statistics(start_date=start_date, end_date=end_date)
     
     stats = {
-        'total_orders': total_orders,
-        'purchase_orders': len(purchase_orders),
-        'sales_orders': len(sales_orders),
-        'pending_orders': len(pending_orders),
-        'completed_orders': len(completed_orders),
-        'cancelled_orders': len(cancelled_orders),
-        'total_amount': float(total_amount),
-        'purchase_amount': float(purchase_amount),
-        'sales_amount': float(sales_amount)
+        'total_orders': summary['total_orders'],
+        'purchase_orders': summary['by_type'].get('purchase', 0),
+        'sales_orders': summary['by_type'].get('sales', 0),
+        'pending_orders': summary['by_status'].get('pending', 0),
+        'completed_orders': summary['by_status'].get('completed', 0),
+        'cancelled_orders': summary['by_status'].get('cancelled', 0),
+        'total_amount': summary['amounts']['total'],
+        'purchase_amount': summary['amounts'].get('purchase', 0.0),
+        'sales_amount': summary['amounts'].get('sales', 0.0)
     }
     
     return APIResponse.success(
@@ -4,7 +4,7 @@ import logging
 from models.product import Product
 from services.category_service import CategoryService
 from utils.api_response import APIResponse
-from utils.error_handler import handle_api_errors, validate_required_fields
+from utils.error_handler import ValidationError, handle_api_errors, validate_required_fields
 from utils.validators import DataValidator
 
 logger = logging.getLogger(__name__)
@@ -33,6 +33,24 @@ def get_products():
             # 回退为原始分类ID
             category_filter = DataValidator.validate_integer(category_id, 'category_id', min_value=1)
     
+    # 带 cursor 参数（首页传空值）时使用游标分页，不执行 OFFSET，默认也不统计总数
+    if 'cursor' in request.args:
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        result = Product.get_page(
+            search=search,
+            category_id=category_filter,
+            limit=per_page,
+            cursor=request.args.get('cursor') or None,
+            include_total=include_total
+        )
+        return APIResponse.paginated(
+            data=result['products'],
+            total=result['total'],
+            per_page=per_page,
+            next_cursor=result['next_cursor'],
+            message="获取产品列表成功"
+        )
+    
     # 获取产品数据
     result = Product.get_all(
         search=search,
@@ -86,6 +104,24 @@ def create_product():
         location=f"/api/products/{product['id']}"
     )
 
+@products_bp.route('/products/bulk', methods=['POST'])
+@handle_api_errors
+@validate_required_fields('products')
+def bulk_create_products():
+    """批量创建产品，逐行返回错误而不中断整批"""
+    data = request.get_json()
+    rows = data['products']
+    if not isinstance(rows, list):
+        raise ValidationError("字段 'products' 必须是数组", field='products')
+    
+    logger.info("批量创建产品请求: %s 行", len(rows))
+    result = Product.create_many(rows)
+    
+    return APIResponse.success(
+        data=result,
+        message=f"批量创建完成: 成功 {result['created']} 条, 失败 {result['failed']} 条"
+    )
+
 @products_bp.route('/products/<int:product_id>', methods=['GET'])
 @handle_api_errors
 def get_product(product_id):
@@ -189,24 +225,18 @@ def get_non_composite_products():
     
     # 排除成品分类（一级分类ID=2）下的所有产品
     if keyword:
-        # 使用JOIN排除成品分类
-        query = '''
-            SELECT p.* FROM products p
+        # 使用JOIN排除成品分类，关键词匹配走产品全文索引
+        join, where, params, order, order_params = Product.build_search(keyword)
+        query = f'''
+            SELECT p.* FROM products p{join}
             LEFT JOIN categories c ON p.category_id = c.id
-            WHERE (p.name LIKE ? OR p.sku LIKE ? OR p.description LIKE ?)
+            WHERE {where}
             AND (c.parent_id IS NULL OR c.parent_id != 2)
             AND (c.id IS NULL OR c.id != 2)
-            ORDER BY 
-                CASE 
-                    WHEN p.name LIKE ? THEN 1
-                    WHEN p.sku LIKE ? THEN 2
-                    ELSE 3
-                END,
-                p.name ASC
+            ORDER BY {order}, p.name ASC
             LIMIT ?
         '''
-        search_pattern = f'%{keyword}%'
-        params = [search_pattern, search_pattern, search_pattern, search_pattern, search_pattern, limit]
+        params = params + order_params + [limit]
         products = Product.execute_query(query, tuple(params))
     else:
         # 如果没有关键字，获取所有非成品分类的产品
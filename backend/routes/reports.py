@@ -4,26 +4,35 @@ from flask import Blueprint, request, jsonify, send_file
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 
-from models.bom import BOM
 from models.product import Product
+from services.bom_engine import bom_cache
+from services.inventory_service import InventoryService
+from services.mrp_service import MRPService
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
 reports_bp = Blueprint('reports', __name__)
 
+def _exploded_products():
+    """所有产品及其展开BOM：产品一次查询，展开BOM取自BOM缓存"""
+    products = Product.execute_query('SELECT id, sku, name, quantity FROM products ORDER BY name')
+    for product in products:
+        yield product, bom_cache.explode(product['id'])
+
+def _purchase_requirements():
+    """需要采购的产品（无BOM）的 MRP 净算结果：需求来自生产计划和待处理销售订单，
+    按库存和待处理采购订单逐时间段净算（可选 bucket：day/week，默认按周）"""
+    bucket = request.args.get('bucket') or 'week'
+    return [item for item in MRPService.requirements(bucket=bucket) if item['order_type'] == 'purchase']
+
 @reports_bp.route('/reports/bom/export', methods=['GET'])
 def export_bom_excel():
     """导出BOM数据为Excel格式"""
     try:
-        # 获取所有产品的BOM信息
-        products = Product.get_all()
         bom_data = []
         
-        for product in products:
-            # 获取展开的BOM
-            bom_items = BOM.get_by_product_with_components(product['id'])
-            
+        for product, bom_items in _exploded_products():
             # 只有当产品有BOM项时才添加到导出数据中
             if bom_items:
                 for item in bom_items:
@@ -103,70 +112,57 @@ def export_bom_excel():
 def get_material_requirements():
     """生成物料需求计划报表"""
     try:
-        # 获取所有产品的BOM信息
-        products = Product.get_all()
-        material_requirements = {}
+        result = []
+        
+        for item in _purchase_requirements():
+            result.append({
+                '物料SKU': item['sku'],
+                '物料名称': item['name'],
+                '单位': item['unit'],
+                '总需求数量': item['gross_requirement'],
+                '当前库存': item['on_hand'],
+                '预计入库': item['scheduled_receipt'],
+                '缺货数量': item['planned_quantity'],
+                '需求日期': item['first_due_date']
+            })
         
-        for product in products:
-            # 获取展开的BOM
-            bom_items = BOM.get_by_product_with_components(product['id'])
-            
-            # 统计物料需求
-            for item in bom_items:
-                material_id = item['material_id']
-                material_sku = item['material_sku']
-                material_name = item['material_name']
-                required_quantity = float(item['quantity_required'])
-                unit = item.get('unit', '个')
-                
-                if material_id not in material_requirements:
-                    material_requirements[material_id] = {
-                        '物料SKU': material_sku,
-                        '物料名称': material_name,
-                        '单位': unit,
-                        '总需求数量': 0,
-                        '当前库存': float(item.get('current_stock', 0)),
-                        '缺货数量': 0
-                    }
-                
-                material_requirements[material_id]['总需求数量'] += required_quantity
-                material_requirements[material_id]['缺货数量'] = max(
-                    material_requirements[material_id]['总需求数量'] - 
-                    material_requirements[material_id]['当前库存'], 
-                    0
-                )
-        
-        # 转换为列表并排序
-        result = list(material_requirements.values())
+        # 排序
         result.sort(key=lambda x: x['缺货数量'], reverse=True)
         
         return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error("生成物料需求计划报表时出错: %s", str(e), exc_info=True)
         return jsonify({'error': '生成物料需求计划报表失败'}), 500
 
 @reports_bp.route('/reports/cost-analysis', methods=['GET'])
 def get_cost_analysis():
-    """显示成本分析报表"""
+    """显示成本分析报表（可选 shipping_cost：每个产品的快递费用）"""
     try:
-        products = Product.get_all()
+        shipping_cost = request.args.get('shipping_cost', 0, type=float) or 0
+        # 全目录汇总成本由BOM稀疏矩阵一次求出
+        catalog_costs = InventoryService.calculate_catalog_cost_with_shipping(shipping_cost)
+        engine = bom_cache.engine()
+        products = Product.execute_query('SELECT id, sku, name, quantity FROM products ORDER BY name')
         cost_data = []
         
         for product in products:
-            # 获取展开的BOM
-            bom_items = BOM.get_by_product_with_components(product['id'])
-            
-            # 计算总成本
-            total_cost = sum(float(item.get('item_cost', 0)) for item in bom_items)
+            costs = catalog_costs.get(product['id'])
+            total_cost = costs['material_cost'] if costs else 0.0
             
             # 添加到成本分析数据
-            cost_data.append({
+            row = {
                 '产品SKU': product['sku'],
                 '产品名称': product['name'],
-                '物料数量': len(bom_items),
+                '物料数量': len(engine.explode(product['id'])),
                 '总成本': float(total_cost),
                 '单位成本': float(total_cost) if product.get('quantity', 0) > 0 else 0
-            })
+            }
+            if shipping_cost > 0:
+                row['快递费用'] = costs['shipping_cost'] if costs else 0.0
+                row['含快递总成本'] = costs['total_cost_with_shipping'] if costs else 0.0
+            cost_data.append(row)
         
         # 按总成本排序
         cost_data.sort(key=lambda x: x['总成本'], reverse=True)
@@ -180,57 +176,56 @@ def get_cost_analysis():
 def get_purchase_list():
     """生成采购清单报表"""
     try:
-        # 获取所有产品的BOM信息
-        products = Product.get_all()
-        material_requirements = {}
-        
-        for product in products:
-            # 获取展开的BOM
-            bom_items = BOM.get_by_product_with_components(product['id'])
-            
-            # 统计物料需求
-            for item in bom_items:
-                material_id = item['material_id']
-                material_sku = item['material_sku']
-                material_name = item['material_name']
-                required_quantity = float(item['quantity_required'])
-                unit = item.get('unit', '个')
-                current_stock = float(item.get('current_stock', 0))
-                material_price = float(item.get('material_price', 0))
-                
-                if material_id not in material_requirements:
-                    material_requirements[material_id] = {
-                        '物料SKU': material_sku,
-                        '物料名称': material_name,
-                        '单位': unit,
-                        '总需求数量': 0,
-                        '当前库存': current_stock,
-                        '采购单价': material_price,
-                        '缺货数量': 0,
-                        '采购金额': 0
-                    }
-                
-                material_requirements[material_id]['总需求数量'] += required_quantity
-                material_requirements[material_id]['缺货数量'] = max(
-                    material_requirements[material_id]['总需求数量'] - 
-                    material_requirements[material_id]['当前库存'], 
-                    0
-                )
-                material_requirements[material_id]['采购金额'] = (
-                    material_requirements[material_id]['缺货数量'] * 
-                    material_requirements[material_id]['采购单价']
-                )
-        
-        # 过滤出需要采购的物料（缺货数量 > 0）
-        purchase_list = [
-            item for item in material_requirements.values() 
-            if item['缺货数量'] > 0
-        ]
+        # 只列出净算后仍有缺口（有计划采购订单）的物料
+        purchase_list = []
+        for item in _purchase_requirements():
+            if item['planned_quantity'] <= 0:
+                continue
+            purchase_list.append({
+                '物料SKU': item['sku'],
+                '物料名称': item['name'],
+                '单位': item['unit'],
+                '总需求数量': item['gross_requirement'],
+                '当前库存': item['on_hand'],
+                '预计入库': item['scheduled_receipt'],
+                '采购单价': item['price'],
+                '缺货数量': item['planned_quantity'],
+                '采购金额': item['planned_quantity'] * item['price'],
+                '需求日期': item['first_due_date']
+            })
         
         # 按采购金额排序
         purchase_list.sort(key=lambda x: x['采购金额'], reverse=True)
         
         return jsonify(purchase_list)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error("生成采购清单报表时出错: %s", str(e), exc_info=True)
-        return jsonify({'error': '生成采购清单报表失败'}), 500
\ No newline at end of file
+        return jsonify({'error': '生成采购清单报表失败'}), 500
+
+@reports_bp.route('/reports/mrp/run', methods=['POST'])
+def run_mrp():
+    """执行 MRP 运行（可选 bucket：day/week，默认按周），返回运行摘要"""
+    try:
+        data = request.get_json(silent=True) or {}
+        bucket = data.get('bucket') or request.args.get('bucket') or 'week'
+        return jsonify(MRPService.run(bucket=bucket))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error("执行 MRP 运行时出错: %s", str(e), exc_info=True)
+        return jsonify({'error': '执行 MRP 运行失败'}), 500
+
+@reports_bp.route('/reports/mrp/planned-orders', methods=['GET'])
+def get_planned_orders():
+    """获取最近一次 MRP 运行的计划订单（可按 order_type、product_id 筛选）"""
+    try:
+        planned_orders = MRPService.get_planned_orders(
+            order_type=request.args.get('order_type'),
+            product_id=request.args.get('product_id', type=int)
+        )
+        return jsonify(planned_orders)
+    except Exception as e:
+        logger.error("获取 MRP 计划订单时出错: %s", str(e), exc_info=True)
+        return jsonify({'error': '获取 MRP 计划订单失败'}), 500
@@ -1,28 +1,49 @@
 from flask import Blueprint, request, jsonify
 import logging
 from models.transaction import Transaction
+from models.transaction_rollup import TransactionRollup
+from utils.api_response import APIResponse
+from utils.error_handler import handle_api_errors
+from utils.validators import DataValidator
 
 logger = logging.getLogger(__name__)
 
 transactions_bp = Blueprint('transactions', __name__)
 
 @transactions_bp.route('/transactions', methods=['GET'])
+@handle_api_errors
 def get_transactions():
     """获取交易记录"""
-    try:
-        logger.debug('get_transactions called with args: %s', dict(request.args))
-        product_id = request.args.get('product_id')
-        transaction_type = request.args.get('type')
+    logger.debug('get_transactions called with args: %s', dict(request.args))
+    product_id = request.args.get('product_id')
+    transaction_type = request.args.get('type')
 
-        transactions = Transaction.get_all(
+    # 传入 limit 或 cursor 时按游标分页返回，否则保持原来的完整列表
+    if 'limit' in request.args or 'cursor' in request.args:
+        limit = DataValidator.validate_integer(request.args.get('limit', 50), 'limit', min_value=1, max_value=500)
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        result = Transaction.get_page(
             product_id=product_id if product_id else None,
-            transaction_type=transaction_type if transaction_type else None
+            transaction_type=transaction_type if transaction_type else None,
+            limit=limit,
+            cursor=request.args.get('cursor') or None,
+            include_total=include_total
+        )
+        return APIResponse.paginated(
+            data=result['transactions'],
+            total=result['total'],
+            per_page=limit,
+            next_cursor=result['next_cursor'],
+            message="获取交易记录成功"
         )
 
-        return jsonify(transactions)
-    except Exception as e:
-        logger.exception('Error in get_transactions: %s', e)
-        return jsonify({'error': str(e)}), 500
+    transactions = Transaction.iter_all(
+        product_id=product_id if product_id else None,
+        transaction_type=transaction_type if transaction_type else None
+    )
+
+    # 大列表直接流式输出，避免先构建完整列表再整体序列化
+    return APIResponse.stream_list(transactions)
 
 @transactions_bp.route('/transactions/recent', methods=['GET'])
 def get_recent_transactions():
@@ -63,4 +84,41 @@ def create_transaction():
         return jsonify(transaction), 201
     except Exception as e:
         logger.exception('Error in create_transaction: %s', e)
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+def _stats_date_range():
+    """读取并校验统计接口的 start_date / end_date 参数"""
+    start_date = request.args.get('start_date', '').strip() or None
+    end_date = request.args.get('end_date', '').strip() or None
+    if start_date:
+        start_date = DataValidator.validate_date(start_date, 'start_date')
+    if end_date:
+        end_date = DataValidator.validate_date(end_date, 'end_date')
+    return start_date, end_date
+
+@transactions_bp.route('/transactions/stats/daily', methods=['GET'])
+@handle_api_errors
+def get_daily_transaction_stats():
+    """按天汇总出入库（读取交易日汇总表）"""
+    start_date, end_date = _stats_date_range()
+    product_id = request.args.get('product_id', type=int)
+    rows = TransactionRollup.get_daily_totals(start_date, end_date, product_id)
+    return APIResponse.success(data=rows, message="获取每日交易统计成功")
+
+@transactions_bp.route('/transactions/stats/weekly', methods=['GET'])
+@handle_api_errors
+def get_weekly_transaction_stats():
+    """按周汇总出入库（读取交易日汇总表）"""
+    start_date, end_date = _stats_date_range()
+    product_id = request.args.get('product_id', type=int)
+    rows = TransactionRollup.get_weekly_totals(start_date, end_date, product_id)
+    return APIResponse.success(data=rows, message="获取每周交易统计成功")
+
+@transactions_bp.route('/transactions/stats/products', methods=['GET'])
+@handle_api_errors
+def get_product_transaction_stats():
+    """按产品汇总出入库（读取交易日汇总表）"""
+    start_date, end_date = _stats_date_range()
+    limit = DataValidator.validate_integer(request.args.get('limit', 100), 'limit', min_value=1, max_value=1000)
+    rows = TransactionRollup.get_product_totals(start_date, end_date, limit)
+    return APIResponse.success(data=rows, message="获取产品交易统计成功")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""对比 /api/orders 列表的旧实现与 SQL 分页 + 批量加载订单项
+
+在临时数据库中写入指定数量的订单（每单若干订单项）后，分别测量:
+    - 旧实现: 查询全部订单，逐单调用 OrderItem.get_by_order_id，再在 Python 中切片
+    - Order.get_page 第 1 页与较深页（LIMIT/OFFSET，含 COUNT）
+    - Order.get_page 游标翻页（不统计总数）
+
+用法:
+    python scripts/bench_orders_list.py --orders 50000 --items 3 --rounds 5
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from logging_config import setup_logging
+setup_logging(debug=False, log_to_file=False)
+logging.getLogger().setLevel(logging.WARNING)
+
+from config import config
+from utils.database import db_manager, init_database
+
+logger = logging.getLogger(__name__)
+
+def seed_orders(orders: int, items_per_order: int, products: int):
+    """写入产品、订单和订单项"""
+    rng = random.Random(42)
+    db_manager.execute_many(
+        'INSERT INTO products (sku, name, quantity, price) VALUES (?, ?, ?, ?)',
+        [(f'BENCH-{i:06d}', f'产品 {i:06d}', 1000, 10.0) for i in range(products)]
+    )
+    db_manager.execute_many(
+        '''INSERT INTO orders (order_number, order_type, customer_supplier, order_date, total_amount, status)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        [
+            (f'ORD-{i:07d}', rng.choice(['purchase', 'sales']), f'客户 {i % 500}',
+             f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}', 100.0,
+             rng.choice(['pending', 'completed', 'cancelled']))
+            for i in range(orders)
+        ]
+    )
+    db_manager.execute_many(
+        '''INSERT INTO order_items (order_id, product_id, description, quantity, unit_price, total_price)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        [
+            (order_id, rng.randint(1, products), '', 2, 10.0, 20.0)
+            for order_id in range(1, orders + 1)
+            for _ in range(items_per_order)
+        ]
+    )
+
+def legacy_list(page: int, per_page: int):
+    """旧实现: 加载全部订单并逐单查询订单项，然后在 Python 中分页"""
+    from models.order import Order
+    from models.order_item import OrderItem
+
+    orders = Order.execute_query('SELECT * FROM orders WHERE 1=1 ORDER BY order_date DESC, created_at DESC')
+    for order in orders:
+        order['items'] = OrderItem.get_by_order_id(order['id'])
+    start = (page - 1) * per_page
+    return len(orders), orders[start:start + per_page]
+
+def measure(func, rounds: int) -> float:
+    """返回每次调用的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) * 1000 / rounds
+
+def main():
+    parser = argparse.ArgumentParser(description='订单列表基准测试（旧实现 vs SQL 分页）')
+    parser.add_argument('--orders', type=int, default=50000, help='预置订单数量')
+    parser.add_argument('--items', type=int, default=3, help='每个订单的订单项数量')
+    parser.add_argument('--products', type=int, default=2000, help='预置产品数量')
+    parser.add_argument('--per-page', type=int, default=20, help='每页订单数')
+    parser.add_argument('--rounds', type=int, default=5, help='每个场景的调用次数')
+    parser.add_argument('--legacy-rounds', type=int, default=1, help='旧实现的调用次数（单次耗时较长）')
+    args = parser.parse_args()
+
+    from models.order import Order
+
+    work_dir = tempfile.mkdtemp(prefix='orders_list_')
+    original = config.DATABASE_PATH
+    try:
+        config.DATABASE_PATH = os.path.join(work_dir, 'bench_orders.db')
+        db_manager.reset()
+        init_database()
+
+        start = time.perf_counter()
+        seed_orders(args.orders, args.items, args.products)
+        seed_elapsed = time.perf_counter() - start
+
+        deep_page = max(1, args.orders // args.per_page // 2)
+        cursor_pages = 50
+
+        def cursor_walk():
+            cursor = None
+            for _ in range(cursor_pages):
+                result = Order.get_page(per_page=args.per_page, cursor=cursor, include_total=False)
+                cursor = result['next_cursor']
+                if cursor is None:
+                    break
+
+        results = [
+            ('legacy page 1', measure(lambda: legacy_list(1, args.per_page), args.legacy_rounds)),
+            ('get_page page 1', measure(lambda: Order.get_page(page=1, per_page=args.per_page), args.rounds)),
+            (f'get_page page {deep_page}',
+             measure(lambda: Order.get_page(page=deep_page, per_page=args.per_page), args.rounds)),
+            (f'cursor {cursor_pages} pages',
+             measure(cursor_walk, args.rounds) / cursor_pages),
+        ]
+    finally:
+        config.DATABASE_PATH = original
+        db_manager.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"orders={args.orders}  items/order={args.items}  seed={seed_elapsed:.1f}s")
+    print(f"{'scenario':<24}{'ms/page':>12}")
+    for name, elapsed_ms in results:
+        print(f"{name:<24}{elapsed_ms:>12.2f}")
+
+if __name__ == '__main__':
+    main()
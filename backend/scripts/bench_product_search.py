@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""对比产品搜索的 LIKE 全表扫描与 products_fts 全文索引
+
+在临时数据库中写入指定数量的产品后，分别测量:
+    - 原先的 LIKE '%kw%' 查询（按 name/sku 命中排序）
+    - Product.search_products（关键词不少于 3 个字符时走 FTS5 + bm25）
+
+用法:
+    python scripts/bench_product_search.py --products 100000 --rounds 20
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from logging_config import setup_logging
+setup_logging(debug=False, log_to_file=False)
+logging.getLogger().setLevel(logging.WARNING)
+
+from config import config
+from utils.database import db_manager, init_database
+
+logger = logging.getLogger(__name__)
+
+MATERIALS = ['不锈钢', '铝合金', '黄铜', '碳钢', '尼龙', '硅胶', '亚克力', '镀锌']
+PARTS = ['螺丝', '螺母', '垫片', '支架', '轴承', '弹簧', '外壳', '面板', '线束', '卡扣']
+SPECS = ['M3', 'M4', 'M5', 'M6', '10mm', '20mm', '50mm', '大号', '小号']
+
+LIKE_QUERY = '''
+    SELECT * FROM products
+    WHERE name LIKE ? OR sku LIKE ? OR description LIKE ?
+    ORDER BY
+        CASE
+            WHEN name LIKE ? THEN 1
+            WHEN sku LIKE ? THEN 2
+            ELSE 3
+        END,
+        name ASC
+    LIMIT ?
+'''
+
+def seed_products(count: int):
+    """写入随机产品，products_fts 由触发器同步"""
+    rng = random.Random(42)
+    rows = []
+    for i in range(count):
+        material, part, spec = rng.choice(MATERIALS), rng.choice(PARTS), rng.choice(SPECS)
+        rows.append((
+            f'{part[:1]}-{i:07d}',
+            f'{material}{part} {spec}',
+            f'{material}材质，规格 {spec}，批次 {rng.randint(1, 999):03d}',
+            100,
+            1.0
+        ))
+    db_manager.execute_many(
+        'INSERT INTO products (sku, name, description, quantity, price) VALUES (?, ?, ?, ?, ?)',
+        rows
+    )
+
+def measure(func, keywords, rounds: int) -> float:
+    """返回每次查询的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for keyword in keywords:
+            func(keyword)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / (rounds * len(keywords))
+
+def main():
+    parser = argparse.ArgumentParser(description='产品搜索基准测试（LIKE vs FTS5）')
+    parser.add_argument('--products', type=int, default=100000, help='预置产品数量')
+    parser.add_argument('--rounds', type=int, default=20, help='每个关键词的查询轮数')
+    parser.add_argument('--limit', type=int, default=50, help='每次搜索返回的最大条数')
+    parser.add_argument('--keywords', nargs='*',
+                        default=['不锈钢', '铝合金支架', '螺丝 M4', '0012345', '批次 123', '不存在的产品'],
+                        help='搜索关键词（不少于 3 个字符时走全文索引）')
+    args = parser.parse_args()
+
+    from models.product import Product
+
+    work_dir = tempfile.mkdtemp(prefix='product_search_')
+    original = config.DATABASE_PATH
+    try:
+        config.DATABASE_PATH = os.path.join(work_dir, 'bench_search.db')
+        db_manager.reset()
+        init_database()
+
+        start = time.perf_counter()
+        seed_products(args.products)
+        seed_elapsed = time.perf_counter() - start
+        fts_enabled = Product.fts_enabled()
+
+        def like_search(keyword):
+            pattern = f'%{keyword}%'
+            return db_manager.fetch_dicts(LIKE_QUERY, (pattern,) * 5 + (args.limit,))
+
+        def fts_search(keyword):
+            return Product.search_products(keyword, args.limit)
+
+        # 预热页缓存，避免第一组测量包含磁盘读取
+        measure(like_search, args.keywords, 1)
+        measure(fts_search, args.keywords, 1)
+
+        results = []
+        for keyword in args.keywords:
+            results.append((
+                keyword,
+                len(fts_search(keyword)),
+                measure(like_search, [keyword], args.rounds),
+                measure(fts_search, [keyword], args.rounds),
+            ))
+    finally:
+        config.DATABASE_PATH = original
+        db_manager.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"products={args.products}  seed={seed_elapsed:.1f}s  fts={'on' if fts_enabled else 'off'}")
+    print(f"{'keyword':<16}{'rows':>6}{'LIKE ms':>12}{'FTS ms':>12}{'speedup':>10}")
+    for keyword, rows, like_ms, fts_ms in results:
+        speedup = like_ms / fts_ms if fts_ms else 0.0
+        print(f"{keyword:<16}{rows:>6}{like_ms:>12.2f}{fts_ms:>12.2f}{speedup:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
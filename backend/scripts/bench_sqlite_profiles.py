@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""对比不同 SQLite 性能配置（config.SQLITE_PROFILES）下的读写吞吐
+
+每个配置使用独立的临时数据库，测量:
+    - Transaction.create 每秒可创建的交易记录数（写路径，每次一个提交）
+    - Product.get_all 每秒可执行的分页查询次数（读路径）
+
+用法:
+    python scripts/bench_sqlite_profiles.py --transactions 500 --products 5000 --reads 200
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from logging_config import setup_logging
+setup_logging(debug=False, log_to_file=False)
+logging.getLogger().setLevel(logging.WARNING)
+
+from config import config
+from utils.database import db_manager, init_database
+
+logger = logging.getLogger(__name__)
+
+def run_profile(profile: str, work_dir: str, transactions: int, products: int, reads: int) -> dict:
+    """在临时数据库上测量单个性能配置"""
+    from models.product import Product
+    from models.transaction import Transaction
+
+    config.DATABASE_PATH = os.path.join(work_dir, f'bench_{profile}.db')
+    config.SQLITE_PROFILE = profile
+    db_manager.reset()
+    init_database()
+
+    db_manager.execute_many(
+        'INSERT INTO products (sku, name, quantity, price) VALUES (?, ?, ?, ?)',
+        [(f'BENCH-{i:06d}', f'产品 {i:06d}', 1000, 10.0) for i in range(products)]
+    )
+
+    start = time.perf_counter()
+    for i in range(transactions):
+        Transaction.create(
+            product_id=(i % products) + 1,
+            transaction_type='in' if i % 2 else 'out',
+            quantity=1,
+            unit_price=10.0,
+            transaction_date='2026-01-01'
+        )
+    write_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(reads):
+        Product.get_all(page=(i % 20) + 1, per_page=50)
+    read_elapsed = time.perf_counter() - start
+
+    return {
+        'profile': profile,
+        'transaction_create_per_sec': transactions / write_elapsed if write_elapsed else 0.0,
+        'product_get_all_per_sec': reads / read_elapsed if read_elapsed else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite 性能配置基准测试')
+    parser.add_argument('--profiles', nargs='*', default=list(config.SQLITE_PROFILES),
+                        help='要测试的性能配置名称')
+    parser.add_argument('--transactions', type=int, default=500, help='Transaction.create 调用次数')
+    parser.add_argument('--products', type=int, default=5000, help='预置产品数量')
+    parser.add_argument('--reads', type=int, default=200, help='Product.get_all 调用次数')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='sqlite_profiles_')
+    original = (config.DATABASE_PATH, config.SQLITE_PROFILE)
+    try:
+        results = [
+            run_profile(profile, work_dir, args.transactions, args.products, args.reads)
+            for profile in args.profiles
+        ]
+    finally:
+        config.DATABASE_PATH, config.SQLITE_PROFILE = original
+        db_manager.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'profile':<12}{'Transaction.create/s':>24}{'Product.get_all/s':>22}")
+    for result in results:
+        print(f"{result['profile']:<12}"
+              f"{result['transaction_create_per_sec']:>24.1f}"
+              f"{result['product_get_all_per_sec']:>22.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""对比 BOM 行单价换算的旧实现与计量单位注册表
+
+随机生成指定数量的 BOM 行（物料单价、物料单位、BOM 单位），分别测量:
+    - 旧实现: 逐行调用 convert_unit_price，每次调用都新建换算字典
+    - uom_registry.convert_price 逐行换算（按单位ID查预计算矩阵）
+    - uom_registry.convert_prices 批量换算（一次取出整批系数）
+
+用法:
+    python scripts/bench_uom.py --lines 100000 --rounds 5
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from logging_config import setup_logging
+setup_logging(debug=False, log_to_file=False)
+logging.getLogger().setLevel(logging.WARNING)
+
+from utils.uom import UnitRegistry
+
+UNITS = ['个', '件', '套', 'kg', 'g', 'mg', 'l', 'ml', 'm³', 'KG', 'L', '包']
+
+def legacy_convert_unit_price(base_price, base_unit, target_unit):
+    """旧实现（BOM.convert_unit_price）"""
+    if not base_price:
+        return 0.0
+    if base_unit == target_unit:
+        return float(base_price)
+    unit_conversions = {
+        'kg': 1000, 'g': 1, 'mg': 0.001,
+        'l': 1000, 'ml': 1, 'm³': 1000000,
+        '个': 1, '件': 1, '套': 1, '箱': 1, '包': 1
+    }
+    base_factor = unit_conversions.get(base_unit.lower(), 1)
+    target_factor = unit_conversions.get(target_unit.lower(), 1)
+    if base_unit.lower() not in unit_conversions or target_unit.lower() not in unit_conversions:
+        return float(base_price)
+    return (float(base_price) / base_factor) * target_factor
+
+def make_lines(count: int):
+    """随机 BOM 行：(单价, 物料单位, BOM 单位)"""
+    rng = random.Random(42)
+    return [(round(rng.uniform(0.1, 100), 2), rng.choice(UNITS), rng.choice(UNITS)) for _ in range(count)]
+
+def measure(func, rounds: int) -> float:
+    """返回每次调用的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) * 1000 / rounds
+
+def main():
+    parser = argparse.ArgumentParser(description='单位换算基准测试（旧实现 vs 计量单位注册表）')
+    parser.add_argument('--lines', type=int, default=100000, help='BOM 行数量')
+    parser.add_argument('--rounds', type=int, default=5, help='每个场景的调用次数')
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    prices = [line[0] for line in lines]
+    from_units = [line[1] for line in lines]
+    to_units = [line[2] for line in lines]
+    # 基准测试不依赖数据库，不加载产品包装换算
+    registry = UnitRegistry()
+    registry._packaging = {}
+
+    results = [
+        ('legacy per call',
+         measure(lambda: [legacy_convert_unit_price(*line) for line in lines], args.rounds)),
+        ('registry per call',
+         measure(lambda: [registry.convert_price(*line) for line in lines], args.rounds)),
+        ('registry batch',
+         measure(lambda: registry.convert_prices(prices, from_units, to_units), args.rounds)),
+    ]
+
+    print(f"lines={args.lines}  rounds={args.rounds}")
+    print(f"{'scenario':<24}{'ms/batch':>12}{'us/line':>12}")
+    for name, elapsed_ms in results:
+        print(f"{name:<24}{elapsed_ms:>12.2f}{elapsed_ms * 1000 / args.lines:>12.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""从交易明细重建交易日汇总表 transaction_daily_rollup
+
+汇总表平时由 transactions 上的触发器维护；在直接导入数据库、
+手工修复数据或怀疑汇总不一致时运行本脚本重新回填。
+
+用法:
+    python scripts/rebuild_transaction_rollup.py
+"""
+import os
+import sys
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+# 初始化日志（确保后续模块导入中使用的日志可用）
+from logging_config import setup_logging
+setup_logging(debug=False)
+
+from utils.database import init_database
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """重建交易日汇总"""
+    try:
+        # 确保汇总表和触发器已由迁移创建
+        init_database()
+
+        from models.transaction_rollup import TransactionRollup
+        count = TransactionRollup.rebuild()
+        logger.info("重建完成，共 %s 行汇总", count)
+    except Exception as e:
+        logger.exception("重建交易日汇总失败: %s", e)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,609 @@
+"""BOM展开引擎
+
+一次查询加载整张 bom 表及物料信息，在内存中按拓扑顺序（子件先于父件）
+自底向上计算每个产品的展开BOM，并对结果做记忆化：
+全部产品的展开只需一次查询加线性计算，避免逐级递归查询子BOM。
+
+bom_cache 在进程内缓存展开BOM和汇总成本，BOM结构或物料信息变化时
+沿反查（where-used）关系只失效受影响的产品。
+
+全目录的成本汇总和物料需求由 BOMMatrix 以稀疏矩阵-向量乘计算，不逐个产品合并字典。
+"""
+import logging
+import threading
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from models.bom import BOM
+from utils.database import db_manager
+from utils.uom import uom_registry
+
+logger = logging.getLogger(__name__)
+
+class BOMEngine:
+    """整表BOM图：直接BOM、拓扑顺序和记忆化的展开BOM"""
+
+    LOAD_QUERY = '''
+        SELECT b.*,
+               p.name as product_name,
+               p.sku as product_sku,
+               m.name as material_name,
+               m.sku as material_sku,
+               m.price as material_price,
+               m.quantity as current_stock,
+               m.unit as material_unit
+        FROM bom b
+        JOIN products p ON b.product_id = p.id
+        JOIN products m ON b.material_id = m.id
+        ORDER BY b.product_id, m.name
+    '''
+
+    def __init__(self, rows: Iterable[Dict[str, Any]],
+                 flattened: Optional[Dict[int, List[Dict[str, Any]]]] = None):
+        # 产品ID -> 直接BOM项（与 BOM.get_by_product 的结果一致）
+        self.children: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        # 物料ID -> 直接使用它的产品ID
+        self.parents: Dict[int, Set[int]] = defaultdict(set)
+        rows = list(rows)
+        # 物料ID -> 每物料库存单位的单价（prepare_items 会把BOM项单价换算为BOM单位）
+        self.stock_prices: Dict[int, float] = {
+            row['material_id']: float(row.get('material_price') or 0) for row in rows
+        }
+        for row in BOM.prepare_items(rows):
+            self.children[row['product_id']].append(row)
+            self.parents[row['material_id']].add(row['product_id'])
+        self.children = dict(self.children)
+        self.parents = dict(self.parents)
+        # 产品ID -> 直接BOM项的用量从BOM单位换算为物料库存单位（与 children 一一对应）
+        self.stock_quantities = self._stock_quantities()
+
+        self.order, self.cyclic = self._topological_order()
+        self.position = {product_id: i for i, product_id in enumerate(self.order)}
+        if self.cyclic:
+            logger.warning("BOM存在循环引用，涉及产品: %s", sorted(self.cyclic))
+
+        self._matrix: Optional['BOMMatrix'] = None
+        self._flattened_arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+        # 产品ID -> 单位产品的展开BOM；flattened 为仍然有效的已有结果，只计算其余产品
+        self.flattened: Dict[int, List[Dict[str, Any]]] = dict(flattened or {})
+        self.computed = 0
+        for product_id in self.order:
+            if product_id not in self.flattened:
+                self.flattened[product_id] = self._flatten(product_id, self.flattened.__getitem__)
+                self.computed += 1
+
+    @classmethod
+    def load(cls) -> 'BOMEngine':
+        """一次查询加载整张BOM表"""
+        return cls(BOM.execute_query(cls.LOAD_QUERY))
+
+    def matrix(self) -> 'BOMMatrix':
+        """BOM的稀疏矩阵表示（首次使用时构建）"""
+        if self._matrix is None:
+            self._matrix = BOMMatrix(self)
+        return self._matrix
+
+    def flattened_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """所有有BOM的产品的展开BOM（坐标格式，按产品ID排序，首次使用时构建）
+
+        返回 (产品ID, 底层物料ID, 每件产品的物料用量)，用量为物料库存单位。
+        """
+        if self._flattened_arrays is None:
+            items = [
+                item
+                for product_id in sorted(self.children)
+                for item in (self.flattened.get(product_id) or self.explode(product_id))
+            ]
+            self._flattened_arrays = (
+                np.fromiter((item['product_id'] for item in items), dtype=np.int64, count=len(items)),
+                np.fromiter((item['material_id'] for item in items), dtype=np.int64, count=len(items)),
+                np.fromiter((item['quantity_required'] for item in items), dtype=float, count=len(items))
+            )
+        return self._flattened_arrays
+
+    def contains(self, product_id: int) -> bool:
+        """产品是否出现在BOM中（作为产品或物料）"""
+        return product_id in self.children or product_id in self.parents
+
+    def where_used(self, product_ids: Iterable[int]) -> Set[int]:
+        """直接或间接使用这些产品/物料的所有上级产品"""
+        return set(self._where_used_levels(product_ids))
+
+    def _where_used_levels(self, product_ids: Iterable[int]) -> Dict[int, int]:
+        """沿反查关系广度优先遍历：上级产品 -> 最短层级（直接使用为 1）"""
+        levels: Dict[int, int] = {}
+        queue = deque((product_id, 0) for product_id in product_ids)
+        while queue:
+            product_id, level = queue.popleft()
+            for parent_id in self.parents.get(product_id, ()):
+                if parent_id not in levels:
+                    levels[parent_id] = level + 1
+                    queue.append((parent_id, level + 1))
+        return levels
+
+    def implode(self, material_id: int) -> List[Dict[str, Any]]:
+        """反查物料的所有上级产品，及每个上级产品单位用量中该物料的累计数量
+
+        上级产品按拓扑顺序（子件在前）处理，每个产品的累计用量由其直接BOM项
+        一次求出，整体只遍历一遍上级产品的BOM项。累计用量按物料库存单位计，
+        BOM项用量先从BOM单位换算。处于或依赖循环引用的上级产品累计用量无法确定，
+        quantity 为 None。
+        """
+        levels = self._where_used_levels([material_id])
+        totals: Dict[int, float] = {material_id: 1.0}
+        for product_id in sorted((p for p in levels if p in self.position), key=self.position.__getitem__):
+            totals[product_id] = sum(
+                quantity * totals[item['material_id']]
+                for item, quantity in zip(self.children[product_id], self.stock_quantities[product_id])
+                if item['material_id'] in totals
+            )
+
+        result = []
+        for product_id, level in levels.items():
+            first_item = self.children[product_id][0]
+            result.append({
+                'product_id': product_id,
+                'product_name': first_item['product_name'],
+                'product_sku': first_item['product_sku'],
+                'level': level,
+                'quantity': totals.get(product_id),
+                'is_top_level': product_id not in self.parents
+            })
+        result.sort(key=lambda item: (item['level'], item['product_name'] or '', item['product_id']))
+        return result
+
+    def direct(self, product_id: int) -> List[Dict[str, Any]]:
+        """产品的直接BOM项（副本）"""
+        return [dict(item) for item in self.children.get(product_id, [])]
+
+    def explode(self, product_id: int) -> List[Dict[str, Any]]:
+        """产品的展开BOM：子BOM逐级乘以用量后合并到最底层物料（副本）
+
+        用量、单价和单位均为物料库存单位，不同BOM单位的同一物料可以直接合并。
+        """
+        if product_id not in self.children:
+            return []
+        if product_id not in self.flattened:
+            # 循环引用中的产品：沿引用路径展开，遇到回路时该分支不计入（与原递归实现一致）
+            self.flattened[product_id] = self._flatten_path(product_id, frozenset())
+        return [dict(item, product_id=product_id) for item in self.flattened[product_id]]
+
+    def explode_all(self) -> Dict[int, List[Dict[str, Any]]]:
+        """所有有BOM的产品的展开BOM"""
+        return {product_id: self.explode(product_id) for product_id in self.children}
+
+    def _topological_order(self):
+        """Kahn 算法：返回子件在前的产品顺序，以及无法排序（处于或依赖循环）的产品"""
+        pending = {}
+        dependents = defaultdict(list)
+        for product_id, items in self.children.items():
+            sub_boms = {item['material_id'] for item in items if item['material_id'] in self.children}
+            pending[product_id] = len(sub_boms)
+            for material_id in sub_boms:
+                dependents[material_id].append(product_id)
+
+        queue = deque(product_id for product_id, count in pending.items() if count == 0)
+        order = []
+        while queue:
+            product_id = queue.popleft()
+            order.append(product_id)
+            for parent_id in dependents[product_id]:
+                pending[parent_id] -= 1
+                if pending[parent_id] == 0:
+                    queue.append(parent_id)
+
+        cyclic = set(self.children) - set(order)
+        return order, cyclic
+
+    def _stock_quantities(self) -> Dict[int, List[float]]:
+        """所有直接BOM项的用量成批换算为物料库存单位（不可换算时保持原值）"""
+        items = [item for product_items in self.children.values() for item in product_items]
+        quantities = uom_registry.convert_quantities(
+            [float(item['quantity_required']) for item in items],
+            [item['unit'] for item in items],
+            [item.get('material_unit') for item in items],
+            [item['material_id'] for item in items]
+        ).tolist()
+        result, start = {}, 0
+        for product_id, product_items in self.children.items():
+            result[product_id] = quantities[start:start + len(product_items)]
+            start += len(product_items)
+        return result
+
+    def _flatten(self, product_id: int,
+                 resolve: Callable[[int], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """合并产品的直接BOM；有子BOM的物料用 resolve 取其展开结果并乘以用量（库存单位）"""
+        merged: Dict[int, Dict[str, Any]] = {}
+        for item, quantity in zip(self.children[product_id], self.stock_quantities[product_id]):
+            if item['material_id'] in self.children:
+                for sub_item in resolve(item['material_id']):
+                    self._merge(merged, product_id, sub_item, quantity * float(sub_item['quantity_required']))
+            else:
+                self._merge(merged, product_id, item, quantity)
+        return list(merged.values())
+
+    def _flatten_path(self, product_id: int, path: frozenset) -> List[Dict[str, Any]]:
+        """沿引用路径展开（仅用于循环引用中的产品）"""
+        if product_id in path:
+            return []
+        path = path | {product_id}
+
+        def resolve(material_id):
+            if material_id in self.cyclic:
+                return self._flatten_path(material_id, path)
+            return self.flattened[material_id]
+
+        return self._flatten(product_id, resolve)
+
+    def _merge(self, merged: Dict[int, Dict[str, Any]], product_id: int,
+               item: Dict[str, Any], quantity: float):
+        """按物料合并数量（库存单位），小计按合并后的数量重新计算"""
+        key = item['material_id']
+        if key in merged:
+            entry = merged[key]
+            entry['quantity_required'] += quantity
+            entry['item_cost'] = entry['quantity_required'] * entry['material_price']
+            return
+        merged[key] = self.stock_item(product_id, item, quantity)
+
+    def stock_item(self, product_id: int, item: Dict[str, Any], quantity: float) -> Dict[str, Any]:
+        """按物料库存单位表示的展开BOM项（数量为库存单位，单价为每库存单位）"""
+        material_price = self.stock_prices.get(item['material_id'], 0.0)
+        material_unit = item.get('material_unit') or '个'
+        return {
+            'id': item.get('id', 0),
+            'product_id': product_id,
+            'material_id': item['material_id'],
+            'material_name': item['material_name'],
+            'material_sku': item['material_sku'],
+            'quantity_required': quantity,
+            'material_price': material_price,
+            'item_cost': quantity * material_price,
+            'material_unit': material_unit,
+            'unit': material_unit,
+            'current_stock': item.get('current_stock', 0)
+        }
+
+
+class BOMMatrix:
+    """BOM的稀疏矩阵表示（坐标格式，行为产品、列为物料）
+
+    A[p, m] 为产品 p 对有子BOM的物料 m 的用量，L[p, m] 为对底层物料 m 的用量（均为物料库存单位），
+    b[p] 为 p 直接使用的底层物料成本。
+    汇总成本 c 满足 c = A·c + b，底层物料需求为 Lᵀ·x，其中 x = d + Aᵀ·x 为
+    各产品的总需求。无环BOM的 A 是幂零矩阵，重复稀疏矩阵-向量乘至多 BOM层数 次即收敛。
+    循环引用中的产品不进入矩阵，沿用 BOMEngine 的逐路径展开。
+    """
+
+    def __init__(self, engine: BOMEngine):
+        self.engine = engine
+        ids = sorted(set(engine.children) | set(engine.parents))
+        self.ids = np.array(ids, dtype=np.int64)
+        self.index = {product_id: i for i, product_id in enumerate(ids)}
+        # 底层物料ID -> 库存单位表示的物料信息（名称、单位、库存、单价）
+        self.materials: Dict[int, Dict[str, Any]] = {}
+
+        sub_rows, sub_cols, sub_quantity = [], [], []
+        leaf_rows, leaf_cols, leaf_quantity, leaf_cost = [], [], [], []
+        for product_id in engine.order:
+            row = self.index[product_id]
+            for item, quantity in zip(engine.children[product_id], engine.stock_quantities[product_id]):
+                material_id = item['material_id']
+                if material_id in engine.children:
+                    sub_rows.append(row)
+                    sub_cols.append(self.index[material_id])
+                    sub_quantity.append(quantity)
+                else:
+                    leaf_rows.append(row)
+                    leaf_cols.append(self.index[material_id])
+                    leaf_quantity.append(quantity)
+                    leaf_cost.append(quantity * engine.stock_prices[material_id])
+                    if material_id not in self.materials:
+                        self.materials[material_id] = engine.stock_item(product_id, item, quantity)
+
+        self.sub_rows = np.array(sub_rows, dtype=np.int64)
+        self.sub_cols = np.array(sub_cols, dtype=np.int64)
+        self.sub_quantity = np.array(sub_quantity, dtype=float)
+        self.leaf_rows = np.array(leaf_rows, dtype=np.int64)
+        self.leaf_cols = np.array(leaf_cols, dtype=np.int64)
+        self.leaf_quantity = np.array(leaf_quantity, dtype=float)
+        self.leaf_cost = np.array(leaf_cost, dtype=float)
+
+    def _solve(self, base: np.ndarray, step: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """迭代 v = base + step(v)，直到不再变化（无环时至多 BOM层数+1 次）"""
+        values = base
+        for _ in range(len(self.engine.order) + 1):
+            updated = base + step(values)
+            if np.array_equal(updated, values):
+                break
+            values = updated
+        return values
+
+    def rolled_up_costs(self) -> Dict[int, float]:
+        """所有有BOM的产品的单位汇总成本"""
+        size = len(self.ids)
+        base = np.bincount(self.leaf_rows, weights=self.leaf_cost, minlength=size)
+        costs = self._solve(base, lambda c: np.bincount(
+            self.sub_rows, weights=self.sub_quantity * c[self.sub_cols], minlength=size))
+
+        result = {product_id: float(costs[self.index[product_id]]) for product_id in self.engine.order}
+        for product_id in self.engine.cyclic:
+            result[product_id] = sum(float(item['item_cost']) for item in self.engine.explode(product_id))
+        return result
+
+    def requirements(self, demand: Dict[int, float]) -> Dict[int, float]:
+        """按产品需求数量计算底层物料的总需求"""
+        size = len(self.ids)
+        base = np.zeros(size)
+        result: Dict[int, float] = defaultdict(float)
+        for product_id, quantity in demand.items():
+            if product_id in self.engine.cyclic:
+                for item in self.engine.explode(product_id):
+                    result[item['material_id']] += float(quantity) * float(item['quantity_required'])
+                    self.materials.setdefault(item['material_id'], item)
+            elif product_id in self.engine.children:
+                base[self.index[product_id]] += float(quantity)
+
+        totals = self._solve(base, lambda x: np.bincount(
+            self.sub_cols, weights=self.sub_quantity * x[self.sub_rows], minlength=size))
+        leaf = np.bincount(self.leaf_cols, weights=self.leaf_quantity * totals[self.leaf_rows], minlength=size)
+        for i in np.flatnonzero(leaf):
+            result[int(self.ids[i])] += float(leaf[i])
+        return dict(result)
+
+    def catalog_requirements(self) -> Dict[int, float]:
+        """每个有BOM的产品各生产一件时的底层物料总需求"""
+        return self.requirements({product_id: 1 for product_id in self.engine.children})
+
+
+class ReachabilityIndex:
+    """BOM结构的内存邻接表（产品 → 物料），用于写入BOM项前的循环检查
+
+    BOM项增删提交后增量维护，检查时不扫描 bom 表。bom.id 为 AUTOINCREMENT，
+    sqlite_sequence 中的序号随每次插入递增：序号与已应用的新增一致时邻接表没有漏掉新增；
+    不一致（首次使用、其他进程或绕过模型的写入）时重新加载。外部删除只会让邻接表多出边，
+    因此找到循环路径时再逐条核对路径上的BOM项，有边已不存在则重新加载后重查。
+    """
+
+    SEQUENCE_QUERY = "SELECT seq FROM sqlite_sequence WHERE name = 'bom'"
+    EDGE_QUERY = 'SELECT 1 FROM bom WHERE product_id = ? AND material_id = ?'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._edges: Optional[Dict[int, Set[int]]] = None
+        # 邻接表已包含的最大BOM项序号；None 表示未知，下次检查重新加载
+        self._sequence: Optional[int] = None
+        self._stats = {'checks': 0, 'loads': 0}
+
+    def find_cycle(self, product_id: int, material_id: int) -> Optional[List[int]]:
+        """新增 产品 → 物料 后形成的循环路径（从产品出发回到产品），不形成循环时返回 None
+
+        应在写入BOM项的同一个写事务内调用，序号和邻接表与即将写入时的数据一致。
+        """
+        sequence = self._current_sequence()
+        with self._lock:
+            self._stats['checks'] += 1
+            if self._edges is None or self._sequence != sequence:
+                self._load(sequence)
+            path = self._find_path(material_id, product_id)
+            if path and not self._path_exists(path):
+                self._load(sequence)
+                path = self._find_path(material_id, product_id)
+        return [product_id] + path if path else None
+
+    @classmethod
+    def _current_sequence(cls) -> int:
+        """bom 表的 AUTOINCREMENT 序号（从未插入过时为 0）"""
+        rows = BOM.execute_query(cls.SEQUENCE_QUERY)
+        return rows[0]['seq'] if rows else 0
+
+    def _load(self, sequence: int):
+        """从数据库重新加载邻接表（调用方持有锁）"""
+        self._edges = defaultdict(set)
+        for edge in BOM.execute_query('SELECT product_id, material_id FROM bom'):
+            self._edges[edge['product_id']].add(edge['material_id'])
+        self._sequence = sequence
+        self._stats['loads'] += 1
+
+    def _path_exists(self, path: List[int]) -> bool:
+        """路径上的每条BOM项仍在数据库中（按唯一约束逐条查找）"""
+        return all(BOM.execute_query(self.EDGE_QUERY, edge) for edge in zip(path, path[1:]))
+
+    def _find_path(self, start: int, target: int) -> Optional[List[int]]:
+        """从 start 沿BOM项到 target 的一条路径（深度优先，O(V+E)），不可达时返回 None"""
+        previous = {start: None}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            if node == target:
+                path = [node]
+                while previous[path[-1]] is not None:
+                    path.append(previous[path[-1]])
+                return path[::-1]
+            for material_id in self._edges.get(node, ()):
+                if material_id not in previous:
+                    previous[material_id] = node
+                    stack.append(material_id)
+        return None
+
+    def edge_added(self, product_id: int, material_id: int, bom_id: int):
+        """BOM项新增已提交"""
+        with self._lock:
+            if self._edges is None:
+                return
+            self._edges[product_id].add(material_id)
+            if self._sequence is None:
+                # 序号已未知，下次检查会重新加载
+                return
+            if bom_id == self._sequence + 1:
+                self._sequence = bom_id
+            elif bom_id > self._sequence:
+                # 中间有未经本索引的新增，下次检查重新加载
+                self._sequence = None
+
+    def edges_removed(self, product_id: int, material_ids: Optional[Iterable[int]] = None):
+        """BOM项删除已提交；material_ids 为 None 表示删除该产品的全部BOM项"""
+        with self._lock:
+            if self._edges is None:
+                return
+            targets = self._edges.get(product_id, set())
+            if material_ids is None:
+                targets.clear()
+            else:
+                targets.difference_update(material_ids)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['edges'] = sum(len(targets) for targets in self._edges.values()) if self._edges else 0
+        return stats
+
+
+class BOMCache:
+    """展开BOM和汇总成本的进程内缓存
+
+    保留最近一次加载的BOM图。BOM项增删改时失效该产品及其所有上级产品；
+    物料的名称、单价、库存等变化时失效使用它的上级产品。失效后整表重新加载
+    （一次查询），但只重算被失效的产品，其余产品沿用已有的展开结果。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine: Optional[BOMEngine] = None
+        self._stale = True
+        # 失效计数：加载期间发生过失效的结果不写回缓存
+        self._generation = 0
+        # 仍然有效的展开结果，重新加载时作为种子，不修改正在使用的BOM图
+        self._seed: Dict[int, List[Dict[str, Any]]] = {}
+        self._costs: Dict[int, float] = {}
+        self._warm: Set[int] = set()
+        self._stats = {'hits': 0, 'misses': 0, 'loads': 0, 'recomputed': 0, 'invalidated': 0}
+
+    def engine(self) -> BOMEngine:
+        """当前有效的BOM图，失效后重新加载"""
+        with self._lock:
+            if self._engine is not None and not self._stale:
+                return self._engine
+            generation = self._generation
+            seed = dict(self._seed)
+
+        engine = BOMEngine(BOM.execute_query(BOMEngine.LOAD_QUERY), seed)
+        with self._lock:
+            self._stats['loads'] += 1
+            self._stats['recomputed'] += engine.computed
+            if generation == self._generation:
+                self._engine = engine
+                self._seed = dict(engine.flattened)
+                self._stale = False
+        return engine
+
+    def direct(self, product_id: int) -> List[Dict[str, Any]]:
+        """产品的直接BOM项"""
+        return self.engine().direct(product_id)
+
+    def matrix(self) -> BOMMatrix:
+        """当前BOM图的稀疏矩阵表示"""
+        return self.engine().matrix()
+
+    def implode(self, material_id: int) -> List[Dict[str, Any]]:
+        """物料的所有上级产品及累计用量"""
+        return self.engine().implode(material_id)
+
+    def explode(self, product_id: int) -> List[Dict[str, Any]]:
+        """产品的展开BOM"""
+        engine = self.engine()
+        self._record(product_id)
+        return engine.explode(product_id)
+
+    def rolled_up_cost(self, product_id: int) -> float:
+        """产品展开BOM的总成本"""
+        engine = self.engine()
+        self._record(product_id)
+        with self._lock:
+            cost = self._costs.get(product_id)
+        if cost is None:
+            cost = sum(float(item.get('item_cost', 0)) for item in engine.explode(product_id))
+            with self._lock:
+                if engine is self._engine:
+                    self._costs[product_id] = cost
+        return cost
+
+    def _record(self, product_id: int):
+        """记录命中：上次失效或重算之后已经读取过即为命中"""
+        with self._lock:
+            if product_id in self._warm:
+                self._stats['hits'] += 1
+            else:
+                self._stats['misses'] += 1
+                self._warm.add(product_id)
+
+    def invalidate_bom(self, product_ids: Iterable[int]):
+        """BOM项变化：失效这些产品及其所有上级产品"""
+        product_ids = set(product_ids)
+        with self._lock:
+            if self._engine is not None:
+                self._evict(product_ids | self._engine.where_used(product_ids))
+            self._mark_stale()
+
+    def invalidate_materials(self, material_ids: Iterable[int]):
+        """物料信息变化：失效使用这些物料的上级产品；物料不在BOM中时不做任何事
+
+        尚未加载整表BOM时也标记过期，正在进行的首次加载不会安装按旧数据构建的结果。
+        """
+        with self._lock:
+            if self._engine is None:
+                self._mark_stale()
+                return
+            material_ids = [material_id for material_id in material_ids if self._engine.contains(material_id)]
+            if not material_ids:
+                return
+            self._evict(self._engine.where_used(material_ids))
+            self._mark_stale()
+
+    def on_bom_changed(self, product_ids: Iterable[int]):
+        """在当前工作单元提交后失效（不在工作单元内则立即失效）"""
+        product_ids = list(product_ids)
+        db_manager.after_commit(lambda: self.invalidate_bom(product_ids))
+
+    def on_materials_changed(self, material_ids: Iterable[int]):
+        """在当前工作单元提交后失效（不在工作单元内则立即失效）"""
+        material_ids = list(material_ids)
+        db_manager.after_commit(lambda: self.invalidate_materials(material_ids))
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._engine = None
+            self._seed = {}
+            self._costs.clear()
+            self._warm.clear()
+            self._mark_stale()
+
+    def _evict(self, product_ids: Set[int]):
+        for product_id in product_ids:
+            self._seed.pop(product_id, None)
+            self._costs.pop(product_id, None)
+            self._warm.discard(product_id)
+        self._stats['invalidated'] += len(product_ids)
+
+    def _mark_stale(self):
+        self._stale = True
+        self._generation += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+            stats['entries'] = len(self._seed)
+            stats['stale'] = self._stale
+        return stats
+
+# 全局BOM缓存和循环检查索引实例
+bom_cache = BOMCache()
+reachability_index = ReachabilityIndex()
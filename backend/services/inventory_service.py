@@ -2,6 +2,7 @@ from models.product import Product
 from models.transaction import Transaction
 from datetime import datetime
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -12,63 +13,8 @@ class InventoryService:
     def get_dashboard_stats():
         """获取仪表板统计"""
         try:
-            # 基本统计
-            products_data = Product.get_all()
-            # 兼容不同的返回格式
-            if isinstance(products_data, dict) and 'products' in products_data:
-                products = products_data['products']
-            else:
-                products = products_data
-                
-            total_products = len(products) if products else 0
-            
-            # 安全计算库存总值
-            total_inventory_value = 0
-            if products:
-                for product in products:
-                    try:
-                        quantity = float(product.get('quantity', 0) or 0)
-                        price = float(product.get('price', 0) or 0)
-                        total_inventory_value += quantity * price
-                    except (ValueError, TypeError) as e:
-                        logger.warning("计算产品库存价值时出错 (产品ID: %s): %s", product.get('id'), e)
-                        continue
-            
-            # 今日交易统计
-            today_incoming = 0
-            today_outgoing = 0
-            try:
-                incoming, outgoing = Transaction.get_today_stats()
-                today_incoming = incoming or 0
-                today_outgoing = outgoing or 0
-            except Exception as e:
-                logger.warning("获取今日交易统计时出错: %s", e)
-            
-            # 低库存产品
-            low_stock_count = 0
-            try:
-                if products:
-                    low_stock_products = []
-                    for p in products:
-                        try:
-                            min_stock = float(p.get('min_stock', 0) or 0)
-                            quantity = float(p.get('quantity', 0) or 0)
-                            if min_stock > 0 and quantity <= min_stock:
-                                low_stock_products.append(p)
-                        except (ValueError, TypeError) as e:
-                            logger.warning("检查产品库存时出错 (产品ID: %s): %s", p.get('id'), e)
-                            continue
-                    low_stock_count = len(low_stock_products)
-            except Exception as e:
-                logger.warning("计算低库存产品数量时出错: %s", e)
-            
-            return {
-                'total_products': total_products,
-                'total_inventory_value': float(total_inventory_value),
-                'today_incoming': today_incoming,
-                'today_outgoing': today_outgoing,
-                'low_stock_count': low_stock_count
-            }
+            # 产品汇总与今日交易汇总由一条聚合查询完成，覆盖全部产品而不是第一页
+            return Product.get_dashboard_summary()
         except Exception as e:
             logger.exception("获取仪表板统计时发生未预期的错误: %s", e)
             # 返回默认值以避免前端崩溃
@@ -84,49 +30,20 @@ class InventoryService:
     def get_stock_alerts():
         """获取库存预警"""
         try:
-            products_data = Product.get_all()
-            # 兼容不同的返回格式
-            if isinstance(products_data, dict) and 'products' in products_data:
-                products = products_data['products']
-            else:
-                products = products_data
-                
-            alerts = []
-            
-            if not products:
-                return alerts
-                
-            for product in products:
-                try:
-                    # 确保产品有必需的字段
-                    quantity = float(product.get('quantity', 0) or 0)
-                    min_stock = float(product.get('min_stock', 0) or 0)
-                    name = product.get('name', '未知产品')
-                    sku = product.get('sku', '')
-                    
-                    if quantity == 0:
-                        status = 'zero'
-                        message = '库存为零'
-                    elif min_stock > 0 and quantity <= min_stock:
-                        status = 'low'
-                        message = '库存偏低'
-                    else:
-                        continue
-                    
-                    alerts.append({
-                        'id': product.get('id', 0) or 0,
-                        'product_name': name,
-                        'sku': sku,
-                        'current_quantity': quantity,
-                        'min_stock': min_stock,
-                        'status': status,
-                        'message': message
-                    })
-                except (ValueError, TypeError) as e:
-                    logger.warning("处理产品预警信息时出错 (产品ID: %s): %s", product.get('id'), e)
-                    continue
-                
-            return alerts
+            # 预警集合由部分索引维护，不再逐个扫描产品（也不受分页限制）
+            messages = {'zero': '库存为零', 'low': '库存偏低'}
+            return [
+                {
+                    'id': product['id'],
+                    'product_name': product.get('name', '未知产品'),
+                    'sku': product.get('sku', ''),
+                    'current_quantity': float(product.get('quantity') or 0),
+                    'min_stock': float(product.get('min_stock') or 0),
+                    'status': product['alert_status'],
+                    'message': messages[product['alert_status']]
+                }
+                for product in Product.get_stock_alerts()
+            ]
         except Exception as e:
             logger.exception("获取库存预警时发生未预期的错误: %s", e)
             # 返回空列表以避免前端崩溃
@@ -201,4 +118,117 @@ class InventoryService:
                 updated_bom_items.append(item)
                 continue
             
-        return updated_bom_items
\ No newline at end of file
+        return updated_bom_items
+    
+    @staticmethod
+    def calculate_catalog_cost_with_shipping(shipping_cost=0):
+        """计算全目录产品的BOM成本（含快递费用）
+        
+        各产品的单位汇总成本由BOM稀疏矩阵一次求出。与 calculate_material_cost_with_shipping
+        一致，快递费用按物料成本比例分摊，物料成本为正的产品合计多出 shipping_cost。
+        
+        Args:
+            shipping_cost: 每个产品的快递费用
+            
+        Returns:
+            {产品ID: {'material_cost', 'shipping_cost', 'total_cost_with_shipping'}}
+        """
+        from services.bom_engine import bom_cache
+        
+        costs = bom_cache.matrix().rolled_up_costs()
+        product_ids = list(costs)
+        material_costs = np.fromiter(costs.values(), dtype=float, count=len(costs))
+        shipping_costs = np.where(material_costs > 0, float(shipping_cost or 0), 0.0)
+        totals = material_costs + shipping_costs
+        
+        return {
+            product_id: {
+                'material_cost': float(material_costs[i]),
+                'shipping_cost': float(shipping_costs[i]),
+                'total_cost_with_shipping': float(totals[i])
+            }
+            for i, product_id in enumerate(product_ids)
+        }
+    
+    BUILDABLE_ALLOCATIONS = ('independent', 'shared')
+    
+    @staticmethod
+    def calculate_buildable(allocation='independent', priority=None):
+        """计算每个组合产品用当前库存最多可生产的数量及限制物料
+        
+        在展开BOM的坐标数组上一次完成：每条展开项的可生产数量为 物料库存 / 每件用量，
+        按产品取最小值即为该产品的可生产数量，取到最小值的物料为限制物料。
+        
+        Args:
+            allocation: independent 时各产品各自独占全部库存；shared 时产品共用库存，
+                按 priority 中的产品顺序（其余按名称）依次分配，先分配的产品消耗的物料
+                不再计入后面的产品
+            priority: 共用库存时优先分配的产品ID列表
+            
+        Returns:
+            组合产品列表（按名称排序），含 buildable_quantity 和限制物料信息
+        """
+        from services.bom_engine import bom_cache
+        
+        if allocation not in InventoryService.BUILDABLE_ALLOCATIONS:
+            raise ValueError(f'allocation 必须为 {"/".join(InventoryService.BUILDABLE_ALLOCATIONS)} 之一')
+        
+        products = Product.execute_query(
+            'SELECT id, sku, name, unit, quantity, is_composite FROM products ORDER BY id'
+        )
+        ids = np.fromiter((product['id'] for product in products), dtype=np.int64, count=len(products))
+        stock = np.fromiter((max(float(product['quantity'] or 0), 0) for product in products),
+                            dtype=float, count=len(products))
+        
+        product_ids, material_ids, quantities = bom_cache.engine().flattened_arrays()
+        used = quantities > 0
+        product_ids, quantities = product_ids[used], quantities[used]
+        materials = np.searchsorted(ids, material_ids[used])
+        # 展开项按产品ID排序，每个产品的展开项是连续的一段
+        segments, starts = np.unique(product_ids, return_index=True)
+        ends = np.append(starts[1:], len(product_ids))
+        segment_of = {int(product_id): i for i, product_id in enumerate(segments)}
+        
+        composites = sorted((product for product in products if product['is_composite']),
+                            key=lambda product: (product['name'] or '', product['id']))
+        buildable = np.zeros(len(segments))
+        limiting = np.full(len(segments), -1, dtype=np.int64)
+        
+        if allocation == 'independent':
+            # 浮点误差不应让整数倍的库存少算一件
+            capacity = np.floor(stock[materials] / quantities + 1e-9)
+            order = np.lexsort((capacity, product_ids))
+            first = order[starts]
+            buildable = capacity[first]
+            limiting = materials[first]
+        else:
+            remaining = stock.copy()
+            candidates = [product['id'] for product in composites if product['id'] in segment_of]
+            candidate_ids = set(candidates)
+            sequence = [product_id for product_id in (priority or []) if product_id in candidate_ids]
+            for product_id in dict.fromkeys(sequence + candidates):
+                i = segment_of[product_id]
+                rows = materials[starts[i]:ends[i]]
+                needs = quantities[starts[i]:ends[i]]
+                capacity = np.floor(remaining[rows] / needs + 1e-9)
+                j = int(np.argmin(capacity))
+                buildable[i], limiting[i] = capacity[j], rows[j]
+                remaining[rows] = np.maximum(remaining[rows] - capacity[j] * needs, 0)
+        
+        result = []
+        for product in composites:
+            i = segment_of.get(product['id'])
+            material = products[limiting[i]] if i is not None else None
+            result.append({
+                'product_id': product['id'],
+                'product_sku': product['sku'],
+                'product_name': product['name'],
+                'unit': product['unit'],
+                'current_stock': float(product['quantity'] or 0),
+                'buildable_quantity': float(buildable[i]) if i is not None else 0.0,
+                'limiting_material_id': material['id'] if material else None,
+                'limiting_material_sku': material['sku'] if material else None,
+                'limiting_material_name': material['name'] if material else None,
+                'limiting_material_stock': float(material['quantity'] or 0) if material else None
+            })
+        return result
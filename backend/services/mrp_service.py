@@ -0,0 +1,249 @@
+"""分时段物料需求计划（MRP）
+
+毛需求来自待处理的销售订单；未完成的生产计划视为已下达的生产订单：
+剩余数量既是该产品的预计入库，也按BOM向下产生物料的相关需求。
+库存和待处理采购订单的订单项作为可用量，按时间段（天或周）逐段净算。
+
+产品按低层码（在BOM图中出现的最深层级）逐层处理：同一层的产品以 numpy
+整批逐时间段净算（按批对批），本层的计划生产订单和生产计划再沿BOM边一次性
+展开为下一层的毛需求。每个产品只净算一次，整个运行为若干次数组运算。
+
+物料需求和采购清单报表取同一净算结果（requirements），不写入计划订单表。
+"""
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from models.planned_order import PlannedOrder
+from models.product import Product
+from services.bom_engine import bom_cache
+from utils.uom import uom_registry
+
+logger = logging.getLogger(__name__)
+
+class MRPService:
+    """MRP 运行：读取需求和可用量，逐层净算并写入计划订单表"""
+
+    BUCKETS = ('day', 'week')
+
+    # 未完成的生产计划
+    OPEN_PLAN_STATUSES = ('pending', 'in_progress')
+
+    PLAN_QUERY = '''
+        SELECT product_id, scheduled_date AS due_date,
+               quantity - COALESCE(produced_quantity, 0) AS quantity
+        FROM production_plans
+        WHERE status IN (?, ?) AND quantity > COALESCE(produced_quantity, 0)
+    '''
+
+    # 待处理的销售订单（需求）和采购订单（预计入库），数量按订单项单位记录
+    ORDER_ITEMS_QUERY = '''
+        SELECT o.order_type, o.order_date AS due_date, oi.product_id, oi.quantity,
+               oi.unit, p.unit AS product_unit
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id
+        JOIN products p ON p.id = oi.product_id
+        WHERE o.order_type IN ('sales', 'purchase') AND o.status = 'pending'
+          AND oi.quantity > 0
+    '''
+
+    @staticmethod
+    def bucket_start(value: Any, bucket: str) -> Optional[date]:
+        """日期所在时间段的开始日期（周以周一开始）；无法解析返回 None"""
+        try:
+            day = date.fromisoformat(str(value)[:10])
+        except (TypeError, ValueError):
+            return None
+        if bucket == 'week':
+            day -= timedelta(days=day.weekday())
+        return day
+
+    @classmethod
+    def run(cls, bucket: str = 'week', today: Optional[date] = None) -> Dict[str, Any]:
+        """执行一次 MRP 运行，用结果替换计划订单表，返回运行摘要"""
+        started = time.perf_counter()
+        plan = cls.plan(bucket, today)
+        products, levels, planned = plan['products'], plan['levels'], plan['planned']
+        gross, receipts = plan['gross'], plan['receipts']
+
+        run_at_text = plan['run_at'].isoformat(sep=' ', timespec='seconds')
+        due_dates = [day.isoformat() for day in plan['days']]
+        rows = []
+        for i, j in zip(*np.nonzero(planned)):
+            product_id = products[i]['id']
+            rows.append((
+                run_at_text, product_id,
+                'production' if product_id in plan['engine'].children else 'purchase',
+                max(int(levels[i]), 0), due_dates[j],
+                float(gross[i, j]), float(receipts[i, j]), float(planned[i, j])
+            ))
+        PlannedOrder.replace_all(rows)
+
+        summary = {
+            'run_at': run_at_text,
+            'bucket': bucket,
+            'buckets': len(plan['days']),
+            'demand_records': plan['demand_records'],
+            'planned_orders': len(rows),
+            'production_orders': sum(1 for row in rows if row[2] == 'production'),
+            'purchase_orders': sum(1 for row in rows if row[2] == 'purchase'),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+        logger.info("MRP 运行完成: %s", summary)
+        return summary
+
+    @classmethod
+    def requirements(cls, bucket: str = 'week', today: Optional[date] = None) -> List[Dict[str, Any]]:
+        """按当前需求和可用量净算（不写入计划订单表），返回每个有需求的产品的汇总
+
+        gross_requirement 为各时间段毛需求（含BOM相关需求）之和，scheduled_receipt 为预计入库之和，
+        planned_quantity 为计划订单数量之和（即净缺口），first_due_date 为最早一个计划订单的时间段。
+        数量均为产品库存单位。
+        """
+        plan = cls.plan(bucket, today)
+        gross, receipts, planned = plan['gross'], plan['receipts'], plan['planned']
+        due_dates = [day.isoformat() for day in plan['days']]
+        result = []
+        for i in np.flatnonzero(gross.any(axis=1) | planned.any(axis=1)):
+            product = plan['products'][i]
+            shortages = np.flatnonzero(planned[i])
+            result.append({
+                'product_id': product['id'],
+                'sku': product['sku'],
+                'name': product['name'],
+                'unit': product['unit'] or '个',
+                'price': float(product['price'] or 0),
+                'order_type': 'production' if product['id'] in plan['engine'].children else 'purchase',
+                'level': max(int(plan['levels'][i]), 0),
+                'on_hand': float(product['quantity'] or 0),
+                'gross_requirement': float(gross[i].sum()),
+                'scheduled_receipt': float(receipts[i].sum()),
+                'planned_quantity': float(planned[i].sum()),
+                'first_due_date': due_dates[shortages[0]] if len(shortages) else None
+            })
+        return result
+
+    @classmethod
+    def plan(cls, bucket: str = 'week', today: Optional[date] = None) -> Dict[str, Any]:
+        """逐层净算，返回各产品 × 时间段的毛需求、预计入库和计划订单数量（不写入数据库）
+
+        早于当前时间段的需求和入库（逾期）计入当前时间段。
+        """
+        if bucket not in cls.BUCKETS:
+            raise ValueError(f'时间段必须为 {"/".join(cls.BUCKETS)} 之一')
+        run_at = datetime.now()
+        current = cls.bucket_start((today or run_at.date()).isoformat(), bucket)
+
+        engine = bom_cache.engine()
+        products = Product.execute_query('SELECT id, sku, name, unit, price, quantity FROM products ORDER BY id')
+        index = {product['id']: i for i, product in enumerate(products)}
+        on_hand = np.array([float(product['quantity'] or 0) for product in products])
+
+        # 需求和入库记录：(产品下标, 时间段开始日期, 数量, 类型)，同一日期只解析一次
+        starts = {}
+
+        def bucket_of(due):
+            if due not in starts:
+                starts[due] = max(cls.bucket_start(due, bucket) or current, current)
+            return starts[due]
+
+        records = []
+        for plan in Product.execute_query(cls.PLAN_QUERY, cls.OPEN_PLAN_STATUSES):
+            if plan['product_id'] in index:
+                records.append((index[plan['product_id']], bucket_of(plan['due_date']),
+                                float(plan['quantity']), 'plan'))
+        for item in Product.execute_query(cls.ORDER_ITEMS_QUERY):
+            quantity = uom_registry.convert_quantity(
+                float(item['quantity']), item['unit'], item['product_unit'], item['product_id'])
+            records.append((index[item['product_id']], bucket_of(item['due_date']), quantity, item['order_type']))
+
+        days = sorted(set(starts.values()) | {current})
+        column = {day: j for j, day in enumerate(days)}
+        shape = (len(products), len(days))
+        gross, receipts, firm, planned = np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        for i, day, quantity, kind in records:
+            j = column[day]
+            if kind == 'sales':
+                gross[i, j] += quantity
+            elif kind == 'purchase':
+                receipts[i, j] += quantity
+            else:
+                receipts[i, j] += quantity
+                firm[i, j] += quantity
+
+        levels = cls._low_level_codes(engine, index)
+        parents, children, factors = cls._edges(engine, index)
+
+        def net(rows: np.ndarray):
+            """按批对批净算：逐个时间段更新整层产品的预计可用量，不足部分即本时间段的计划订单数量"""
+            available = on_hand[rows].copy()
+            for j in range(len(days)):
+                available += receipts[rows, j] - gross[rows, j]
+                planned[rows, j] = np.maximum(-available, 0)
+                np.maximum(available, 0, out=available)
+
+        # 循环引用中的产品不参与分层，净算后沿逐路径展开的BOM直接计入底层物料
+        cyclic = np.array(sorted(index[p] for p in engine.cyclic if p in index), dtype=np.int64)
+        if len(cyclic):
+            logger.warning("MRP: %s 个产品处于或依赖循环引用，直接展开到底层物料", len(cyclic))
+            net(cyclic)
+            for i in cyclic:
+                released = planned[i] + firm[i]
+                if not released.any():
+                    continue
+                for item in engine.explode(int(products[i]['id'])):
+                    gross[index[item['material_id']]] += released * float(item['quantity_required'])
+
+        for level in range(int(levels.max()) + 1 if len(levels) else 0):
+            rows = np.flatnonzero(levels == level)
+            net(rows)
+            edges = np.flatnonzero(levels[parents] == level)
+            if len(edges):
+                released = planned[parents[edges]] + firm[parents[edges]]
+                np.add.at(gross, children[edges], released * factors[edges, None])
+
+        return {
+            'run_at': run_at, 'engine': engine, 'products': products, 'days': days,
+            'levels': levels, 'gross': gross, 'receipts': receipts, 'planned': planned,
+            'demand_records': len(records)
+        }
+
+    @staticmethod
+    def _low_level_codes(engine, index: Dict[int, int]) -> np.ndarray:
+        """每个产品的低层码：顶层为 0，物料的层级为所有上级产品层级的最大值加一
+
+        循环引用中的产品为 -1（单独处理）。上级产品按拓扑逆序先于下级确定层级，
+        没有子BOM的物料的上级都在拓扑顺序中，最后确定。
+        """
+        levels = np.zeros(len(index), dtype=np.int64)
+        for product_id in engine.cyclic:
+            if product_id in index:
+                levels[index[product_id]] = -1
+        leaves = [product_id for product_id in engine.parents if product_id not in engine.children]
+        for product_id in list(reversed(engine.order)) + leaves:
+            parent_levels = [levels[index[parent_id]] for parent_id in engine.parents.get(product_id, ())
+                             if parent_id not in engine.cyclic]
+            if parent_levels:
+                levels[index[product_id]] = max(parent_levels) + 1
+        return levels
+
+    @staticmethod
+    def _edges(engine, index: Dict[int, int]):
+        """无环部分的BOM边：上级下标、物料下标、每件上级需要的物料数量（物料库存单位）"""
+        parents, children, factors = [], [], []
+        for product_id in engine.order:
+            for item, quantity in zip(engine.children[product_id], engine.stock_quantities[product_id]):
+                parents.append(index[product_id])
+                children.append(index[item['material_id']])
+                factors.append(quantity)
+        return (np.array(parents, dtype=np.int64), np.array(children, dtype=np.int64),
+                np.array(factors, dtype=float))
+
+    @staticmethod
+    def get_planned_orders(order_type: Optional[str] = None,
+                           product_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """最近一次 MRP 运行的计划订单"""
+        return PlannedOrder.get_all(order_type=order_type, product_id=product_id)
@@ -92,13 +92,15 @@ class OrderTransactionCreator:
             order_type = order.get('order_type')
             order_items = order.get('items', [])
             
-            if order_type == 'purchase':
-                return OrderTransactionCreator._create_purchase_transactions(order, order_items)
-            elif order_type == 'sales':
-                return OrderTransactionCreator._create_sales_transactions(order, order_items)
-            else:
-                logger.warning("未知的订单类型: %s", order_type)
-                return False
+            # 一个订单的所有交易记录和库存变动要么全部生效，要么全部回滚
+            with db_manager.transaction():
+                if order_type == 'purchase':
+                    return OrderTransactionCreator._create_purchase_transactions(order, order_items)
+                elif order_type == 'sales':
+                    return OrderTransactionCreator._create_sales_transactions(order, order_items)
+                else:
+                    logger.warning("未知的订单类型: %s", order_type)
+                    return False
                 
         except Exception as e:
             logger.error("创建订单交易记录失败: %s", e)
@@ -187,19 +189,16 @@ class OrderService:
         validated_data['total_amount'] = calculation['order_total']
         
         # 创建订单
-        with db_manager.get_connection() as conn:
-            try:
-                # 创建订单主记录
-                order = Order.create(**validated_data)
-                conn.commit()
-                
-                logger.info("订单创建成功: ID=%s, 订单号=%s", order['id'], order['order_number'])
-                return order
-                
-            except Exception as e:
-                conn.rollback()
-                logger.error("订单创建失败: %s", e)
-                raise DatabaseError(f"订单创建失败: {str(e)}")
+        try:
+            # 创建订单主记录（订单和订单项在同一个工作单元内提交）
+            order = Order.create(**validated_data)
+            
+            logger.info("订单创建成功: ID=%s, 订单号=%s", order['id'], order['order_number'])
+            return order
+            
+        except Exception as e:
+            logger.error("订单创建失败: %s", e)
+            raise DatabaseError(f"订单创建失败: {str(e)}")
     
     @staticmethod
     def update_order(order_id: int, update_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -228,10 +227,10 @@ class OrderService:
             validated_data['total_amount'] = calculation['order_total']
         
         # 更新订单
-        with db_manager.get_connection() as conn:
-            try:
+        try:
+            # 订单更新与状态变更产生的交易记录在同一个工作单元内提交
+            with db_manager.transaction():
                 updated_order = Order.update(order_id, **validated_data)
-                conn.commit()
                 
                 # 检查是否需要创建交易记录
                 new_status = validated_data.get('status')
@@ -239,14 +238,13 @@ class OrderService:
                     new_status == 'completed' and 
                     updated_order):
                     OrderTransactionCreator.create_from_order(updated_order)
-                
-                logger.info("订单更新成功: ID=%s", order_id)
-                return updated_order
-                
-            except Exception as e:
-                conn.rollback()
-                logger.error("订单更新失败: %s", e)
-                raise DatabaseError(f"订单更新失败: {str(e)}")
+            
+            logger.info("订单更新成功: ID=%s", order_id)
+            return updated_order
+            
+        except Exception as e:
+            logger.error("订单更新失败: %s", e)
+            raise DatabaseError(f"订单更新失败: {str(e)}")
     
     @staticmethod
     def _validate_order_data(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -305,44 +303,9 @@ class OrderService:
         return validated_data
     
     @staticmethod
-    def get_order_statistics() -> Dict[str, Any]:
-        """获取订单统计信息"""
-        all_orders = Order.get_all()
-        
-        stats = {
-            'total_orders': len(all_orders),
-            'by_type': {
-                'purchase': 0,
-                'sales': 0
-            },
-            'by_status': {
-                'pending': 0,
-                'completed': 0,
-                'cancelled': 0
-            },
-            'amounts': {
-                'total': 0.0,
-                'purchase': 0.0,
-                'sales': 0.0
-            }
-        }
-        
-        for order in all_orders:
-            order_type = order['order_type']
-            status = order['status']
-            amount = float(order.get('total_amount', 0))
-            
-            # 统计类型
-            stats['by_type'][order_type] = stats['by_type'].get(order_type, 0) + 1
-            
-            # 统计状态
-            stats['by_status'][status] = stats['by_status'].get(status, 0) + 1
-            
-            # 统计金额
-            stats['amounts']['total'] += amount
-            stats['amounts'][order_type] += amount
-        
-        return stats
+    def get_order_statistics(start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Any]:
+        """获取订单统计信息（可按下单日期区间筛选）"""
+        return Order.get_statistics(start_date=start_date, end_date=end_date)
     
     @staticmethod
     def export_orders_to_dict(orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -1,7 +1,8 @@
 """统一API响应格式"""
-from flask import jsonify
+import json
+from flask import jsonify, Response
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
 
 class APIResponse:
     """API响应工具类"""
@@ -48,12 +49,27 @@ class APIResponse:
     @staticmethod
     def paginated(
         data: List,
-        total: int,
-        page: int,
-        per_page: int,
-        message: str = "获取成功"
+        total: Optional[int],
+        page: Optional[int] = None,
+        per_page: int = 50,
+        message: str = "获取成功",
+        next_cursor: Optional[str] = None
     ) -> tuple:
-        """分页响应"""
+        """分页响应
+        
+        page 为 None 时表示游标分页：返回 next_cursor，total 可以为 None（未统计总数）。
+        """
+        if page is None:
+            pagination = {
+                'count': len(data),
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+            if total is not None:
+                pagination['total'] = total
+            return APIResponse.success(data, message, {'pagination': pagination})
+        
         total_pages = (total + per_page - 1) // per_page if per_page > 0 else 1
         
         meta = {
@@ -70,6 +86,35 @@ class APIResponse:
         
         return APIResponse.success(data, message, meta)
     
+    @staticmethod
+    def stream_list(rows: Iterable[Dict[str, Any]], batch_size: int = 500) -> Response:
+        """以 JSON 数组流式输出行，不在内存中构建完整列表
+        
+        每 batch_size 行序列化一次；先取出第一行再返回响应，
+        使查询错误仍能在发送响应头之前抛出。
+        """
+        iterator = iter(rows)
+        first = next(iterator, None)
+        
+        def generate() -> Iterator[str]:
+            if first is None:
+                yield '[]'
+                return
+            yield '['
+            separator = ''
+            batch = [first]
+            for row in iterator:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    yield separator + json.dumps(batch, ensure_ascii=False, default=str)[1:-1]
+                    separator = ','
+                    batch = []
+            if batch:
+                yield separator + json.dumps(batch, ensure_ascii=False, default=str)[1:-1]
+            yield ']'
+        
+        return Response(generate(), mimetype='application/json')
+    
     @staticmethod
     def error(
         message: str = "操作失败",
@@ -1,34 +1,414 @@
 """优化后的数据库工具"""
 import sqlite3
 import os
+import time
 import logging
+import functools
+import re
+from collections import deque
 from contextlib import contextmanager
-from typing import Iterator, List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional, Callable, Tuple
 from config import config
 import threading
-from queue import Queue, Empty
+from urllib.request import pathname2url
+from utils.error_handler import DatabaseError
+from utils.performance import QueryProfiler
 
 logger = logging.getLogger(__name__)
 
+# pooled: 读写共用一个连接池；single_writer: 单个串行写连接 + 只读连接池（需WAL）
+CONNECTION_MODES = ('pooled', 'single_writer')
+
+READ_STATEMENT_KEYWORDS = ('SELECT', 'EXPLAIN', 'VALUES')
+
+# WITH 语句的主体关键字：CTE 之后第一个不在括号内的 DML 关键字决定语句是否只读
+WITH_BODY_KEYWORDS = ('SELECT', 'VALUES', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+# 字符串、带引号的标识符和注释整体跳过，只关心括号和关键字
+_WITH_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?\*/|[()]|\w+", re.S)
+
+# 慢查询日志只为这些语句生成查询计划；DDL 在 EXPLAIN 编译时就可能失败（如索引已存在）
+EXPLAINABLE_KEYWORDS = ('SELECT', 'WITH', 'VALUES', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# INSERT ... RETURNING 自 SQLite 3.35.0 起可用，旧版本回退到 cursor.lastrowid
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# 允许通过性能配置设置的 PRAGMA 及其取值校验
+PROFILE_PRAGMAS = {
+    'busy_timeout': int,
+    'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+    'cache_size': int,
+    'mmap_size': int,
+    'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+    'wal_autocheckpoint': int,
+}
+
+def resolve_sqlite_profile(name: str) -> Dict[str, Any]:
+    """解析并校验 SQLite 性能配置"""
+    profiles = config.SQLITE_PROFILES
+    if name not in profiles:
+        raise ValueError(f"未知的SQLite性能配置: {name}，可选: {', '.join(profiles)}")
+    
+    pragmas = {}
+    for pragma, value in profiles[name].items():
+        rule = PROFILE_PRAGMAS.get(pragma)
+        if rule is None:
+            raise ValueError(f"性能配置 {name} 包含不支持的PRAGMA: {pragma}")
+        if rule is int:
+            value = int(value)
+        else:
+            value = str(value).upper()
+            if value not in rule:
+                raise ValueError(f"PRAGMA {pragma} 的取值无效: {value}")
+        pragmas[pragma] = value
+    return pragmas
+
+class PoolTimeoutError(DatabaseError):
+    """连接池获取连接超时"""
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.status_code = 503
+        self.error_code = 'POOL_TIMEOUT'
+
+class ConnectionPool:
+    """有界阻塞连接池
+    
+    常驻 min_size 个连接；并发超出时按需创建溢出连接，总数不超过 max_size，
+    溢出连接归还时直接关闭。连接耗尽时阻塞等待，超过 timeout 抛出 PoolTimeoutError。
+    """
+    
+    def __init__(
+        self,
+        factory: Callable[[], sqlite3.Connection],
+        min_size: int = 5,
+        max_size: int = 10,
+        timeout: float = 10.0,
+        health_check_interval: float = 60.0
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"连接池大小配置无效: min_size={min_size}, max_size={max_size}")
+        
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        
+        self._idle = deque()  # (连接, 最后归还时间)
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        
+        # 统计信息
+        self._checkouts = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._overflow_closed = 0
+        self._health_check_failures = 0
+        self._peak_in_use = 0
+        
+        for _ in range(min_size):
+            self._idle.append((factory(), time.monotonic()))
+            self._size += 1
+    
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """借出连接，连接耗尽时阻塞等待"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        conn = None
+        last_used = None
+        waited = False
+        
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise DatabaseError("连接池已关闭")
+                if self._idle:
+                    # 后进先出，优先复用最近使用过的连接
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"获取数据库连接超时 ({timeout}s)，连接池已满: max_size={self.max_size}"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+            
+            wait_time = time.monotonic() - start
+            self._checkouts += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            if waited:
+                self._waits += 1
+            self._total_wait += wait_time
+            self._max_wait = max(self._max_wait, wait_time)
+        
+        try:
+            if conn is None:
+                conn = self._factory()
+            elif time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+                with self._cond:
+                    self._health_check_failures += 1
+                logger.warning("连接健康检查失败，重建连接")
+                self._close_quietly(conn)
+                conn = self._factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        
+        return conn
+    
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        """归还连接；溢出连接和损坏的连接直接关闭"""
+        close = False
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed or len(self._idle) >= self.min_size:
+                close = True
+                self._size -= 1
+                if not discard and not self._closed:
+                    self._overflow_closed += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        
+        if close:
+            self._close_quietly(conn)
+    
+    def close(self):
+        """关闭连接池及所有空闲连接（借出中的连接归还时关闭）"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        
+        for conn, _ in idle:
+            self._close_quietly(conn)
+    
+    def stats(self) -> Dict[str, Any]:
+        """连接池统计信息"""
+        with self._cond:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': (self._total_wait / self._checkouts * 1000) if self._checkouts else 0.0,
+                'max_wait_ms': self._max_wait * 1000,
+                'overflow_closed': self._overflow_closed,
+                'health_check_failures': self._health_check_failures
+            }
+    
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        """检查连接是否可用"""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    @staticmethod
+    def _close_quietly(conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.debug("关闭数据库连接失败: %s", e)
+
+class WriteQueue:
+    """单写连接的串行写队列
+    
+    所有写操作按到达顺序（FIFO）依次独占同一个写连接，避免多个连接争抢
+    SQLite 写锁导致的 "database is locked"。
+    """
+    
+    def __init__(self, factory: Callable[[], sqlite3.Connection], timeout: float = 10.0):
+        self._factory = factory
+        self.timeout = timeout
+        self._conn = factory()
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._owner = None
+        self._owner_thread = None
+        
+        # 统计信息
+        self._writes = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._max_depth = 0
+        self._timeouts = 0
+    
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """排队获取写连接"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        ticket = threading.Event()
+        
+        with self._lock:
+            if self._owner is None and not self._waiters:
+                self._owner = ticket
+                self._record_checkout(start, waited=False)
+                return self._conn
+            self._waiters.append(ticket)
+            self._max_depth = max(self._max_depth, len(self._waiters))
+        
+        if not ticket.wait(timeout):
+            with self._lock:
+                # 超时的同时可能刚好轮到自己
+                if self._owner is not ticket:
+                    self._waiters.remove(ticket)
+                    self._timeouts += 1
+                    raise PoolTimeoutError(f"等待写连接超时 ({timeout}s)，写队列长度: {len(self._waiters)}")
+        
+        with self._lock:
+            self._record_checkout(start, waited=True)
+            return self._conn
+    
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self._conn
+    
+    def held_by_current_thread(self) -> bool:
+        """当前线程是否已持有写连接"""
+        return self._owner_thread == threading.get_ident()
+    
+    def release(self, discard: bool = False):
+        """释放写连接并唤醒队首等待者"""
+        with self._lock:
+            self._owner_thread = None
+            if discard:
+                ConnectionPool._close_quietly(self._conn)
+                try:
+                    self._conn = self._factory()
+                except Exception as e:
+                    logger.error("重建写连接失败: %s", e)
+            if self._waiters:
+                self._owner = self._waiters.popleft()
+                self._owner.set()
+            else:
+                self._owner = None
+    
+    def close(self):
+        """关闭写连接"""
+        with self._lock:
+            ConnectionPool._close_quietly(self._conn)
+    
+    def stats(self) -> Dict[str, Any]:
+        """写队列统计信息"""
+        with self._lock:
+            return {
+                'busy': self._owner is not None,
+                'queue_depth': len(self._waiters),
+                'max_queue_depth': self._max_depth,
+                'writes': self._writes,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': (self._total_wait / self._writes * 1000) if self._writes else 0.0,
+                'max_wait_ms': self._max_wait * 1000
+            }
+    
+    def _record_checkout(self, start: float, waited: bool):
+        self._owner_thread = threading.get_ident()
+        wait_time = time.monotonic() - start
+        self._writes += 1
+        if waited:
+            self._waits += 1
+        self._total_wait += wait_time
+        self._max_wait = max(self._max_wait, wait_time)
+
+def profiled(count_rows: Callable[[Any], int]):
+    """为 DatabaseManager 的执行方法记录耗时、行数和查询指纹"""
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, query: str, params=(), *args, **kwargs):
+            if self.profiler is None:
+                return method(self, query, params, *args, **kwargs)
+            
+            start = time.perf_counter()
+            rows = 0
+            try:
+                result = method(self, query, params, *args, **kwargs)
+                rows = count_rows(result)
+                return result
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                explain = None
+                if (query.lstrip().lstrip('(').split(None, 1) or [''])[0].upper() in EXPLAINABLE_KEYWORDS:
+                    explain = lambda: self.explain_query_plan(query, params)
+                self.profiler.record(query, elapsed_ms, rows, explain=explain)
+        return wrapper
+    return decorator
+
 class DatabaseManager:
     """数据库管理器"""
     
     _instance = None
     
     def __init__(self):
+        # 工作单元绑定的连接（按线程/请求隔离）
+        self._local = threading.local()
+        self._configure()
+    
+    def _configure(self):
+        """按当前配置初始化数据库路径、性能配置和连接池"""
         self.db_path = config.DATABASE_PATH
+        self.profile = config.SQLITE_PROFILE
+        self._pragmas = resolve_sqlite_profile(self.profile)
+        self.profiler = QueryProfiler(
+            threshold_ms=config.SLOW_QUERY_THRESHOLD_MS,
+            log_path=os.path.join(config.LOG_DIR, config.SLOW_QUERY_LOG_FILE),
+            max_fingerprints=config.QUERY_STATS_MAX_FINGERPRINTS,
+            max_bytes=config.LOG_MAX_BYTES,
+            backup_count=config.LOG_BACKUP_COUNT
+        ) if config.QUERY_PROFILING_ENABLED else None
         self._ensure_database_dir()
         # 初始化连接池
-        self._connection_pool = Queue()
-        self._pool_lock = threading.Lock()
-        self._pool_size = 5
         self._initialize_pool()
     
+    def reset(self):
+        """关闭现有连接并按当前配置重建（切换数据库文件或性能配置后调用）"""
+        self.close()
+        self._configure()
+    
     def _initialize_pool(self):
         """初始化连接池"""
-        for _ in range(self._pool_size):
-            conn = self._create_connection()
-            self._connection_pool.put(conn)
+        self.mode = config.DB_CONNECTION_MODE
+        if self.mode not in CONNECTION_MODES:
+            raise ValueError(f"不支持的数据库连接模式: {self.mode}")
+        
+        pool_options = dict(
+            min_size=config.DB_POOL_MIN_SIZE,
+            max_size=config.DB_POOL_MAX_SIZE,
+            timeout=config.DB_POOL_TIMEOUT,
+            health_check_interval=config.DB_POOL_HEALTH_CHECK_INTERVAL
+        )
+        
+        if self.mode == 'single_writer':
+            # 先创建写连接：负责创建数据库文件并切换到WAL模式，只读连接依赖于此
+            self._writer = WriteQueue(self._create_connection, timeout=config.DB_POOL_TIMEOUT)
+            self._pool = ConnectionPool(self._create_read_connection, **pool_options)
+        else:
+            self._writer = None
+            self._pool = ConnectionPool(self._create_connection, **pool_options)
     
     def _create_connection(self):
         """创建新的数据库连接"""
@@ -36,56 +416,299 @@ class DatabaseManager:
         conn.row_factory = sqlite3.Row
         conn.execute("PRAGMA foreign_keys = ON")  # 启用外键约束
         conn.execute("PRAGMA journal_mode = WAL")  # 启用WAL模式提高并发性能
+        self._apply_pragmas(conn)
+        return conn
+    
+    def _create_read_connection(self):
+        """创建只读数据库连接（mode=ro）"""
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        self._apply_pragmas(conn)
         return conn
     
+    def _apply_pragmas(self, conn: sqlite3.Connection):
+        """应用性能配置中的 PRAGMA"""
+        for pragma, value in self._pragmas.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+    
     def _ensure_database_dir(self):
         """确保数据库目录存在"""
         config.ensure_data_dir()
     
+    @staticmethod
+    def is_read_statement(query: str) -> bool:
+        """判断语句是否只读，只读语句可以走只读连接"""
+        parts = query.lstrip().lstrip('(').split(None, 1)
+        keyword = parts[0].upper() if parts else ''
+        if keyword == 'PRAGMA':
+            return '=' not in query
+        if keyword == 'WITH':
+            return DatabaseManager.with_body_keyword(query) in READ_STATEMENT_KEYWORDS
+        return keyword in READ_STATEMENT_KEYWORDS
+    
+    @staticmethod
+    def with_body_keyword(query: str) -> str:
+        """WITH 语句的主体关键字（SELECT/INSERT/UPDATE/...），无法识别时返回空字符串（按写语句处理）"""
+        depth = 0
+        for match in _WITH_TOKENS.finditer(query):
+            token = match.group(0)
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+            elif depth == 0 and token.upper() in WITH_BODY_KEYWORDS:
+                return token.upper()
+        return ''
+    
+    def current_transaction(self) -> Optional[sqlite3.Connection]:
+        """返回当前线程工作单元绑定的连接，不在工作单元内时返回 None"""
+        return getattr(self._local, 'conn', None)
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """工作单元
+        
+        在上下文内把一个可写连接绑定到当前线程，期间所有 execute_* 调用和
+        get_connection() 都使用该连接且不单独提交，退出时统一 COMMIT，
+        发生异常则整体回滚。嵌套调用会加入外层工作单元。
+        """
+        bound = self.current_transaction()
+        if bound is not None:
+            yield bound
+            return
+        
+        callbacks = []
+        with self.get_connection() as conn:
+            if not conn.in_transaction:
+                # 立即获取写锁，避免事务中途由读锁升级为写锁时失败
+                conn.execute("BEGIN IMMEDIATE")
+            self._local.conn = conn
+            self._local.after_commit = callbacks
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._local.conn = None
+                self._local.after_commit = None
+        
+        # 提交成功且已释放写连接后再执行回调；回滚时回调被丢弃
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error("提交后回调执行失败: %s", e)
+    
+    def after_commit(self, callback: Callable[[], None]):
+        """登记在当前工作单元提交后执行的回调（如发布事件）
+        
+        不在工作单元内时立即执行。
+        """
+        callbacks = getattr(self._local, 'after_commit', None)
+        if callbacks is None:
+            callback()
+        else:
+            callbacks.append(callback)
+    
     @contextmanager
     def get_connection(self) -> Iterator[sqlite3.Connection]:
-        """获取数据库连接（带连接池）"""
-        conn = None
+        """获取可写数据库连接（single_writer 模式下为串行写连接）"""
+        bound = self.current_transaction()
+        if bound is not None:
+            yield bound
+            return
+        
+        if self._writer is None:
+            with self._checkout(self._pool) as conn:
+                yield conn
+            return
+        
+        if self._writer.held_by_current_thread():
+            # 同一线程嵌套获取写连接时直接复用，由外层负责提交和清理
+            yield self._writer.connection
+            return
+        
+        conn = self._writer.acquire()
+        broken = False
         try:
-            # 尝试从连接池获取连接
-            try:
-                conn = self._connection_pool.get_nowait()
-            except Empty:
-                # 如果连接池为空，创建新连接
-                conn = self._create_connection()
-            
             yield conn
         except Exception as e:
-            if conn:
+            logger.error("数据库连接错误: %s", e)
+            raise
+        finally:
+            try:
                 conn.rollback()
+            except sqlite3.Error:
+                broken = True
+            self._writer.release(discard=broken)
+    
+    @contextmanager
+    def get_read_connection(self) -> Iterator[sqlite3.Connection]:
+        """获取只读查询用的数据库连接"""
+        bound = self.current_transaction()
+        if bound is not None:
+            # 工作单元内读取同一连接，保证能读到未提交的写入
+            yield bound
+            return
+        
+        with self._checkout(self._pool) as conn:
+            yield conn
+    
+    @contextmanager
+    def _checkout(self, pool: ConnectionPool) -> Iterator[sqlite3.Connection]:
+        """从连接池借出连接，用完后清理状态并归还"""
+        conn = pool.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception as e:
             logger.error("数据库连接错误: %s", e)
             raise
         finally:
-            if conn:
-                # 将连接返回到连接池
-                try:
-                    # 清理连接状态
-                    conn.rollback()
-                    self._connection_pool.put(conn)
-                except:
-                    # 如果返回连接池失败，关闭连接
-                    conn.close()
+            # 清理连接状态，无法回滚的连接不再放回连接池
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+            pool.release(conn, discard=broken)
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接池统计信息"""
+        return {
+            'mode': self.mode,
+            'profile': self.profile,
+            'pool': self._pool.stats(),
+            'writer': self._writer.stats() if self._writer else None
+        }
     
+    def close(self):
+        """关闭所有连接"""
+        self._pool.close()
+        if self._writer:
+            self._writer.close()
+    
+    def explain_query_plan(self, query: str, params=()) -> List[str]:
+        """返回查询计划（EXPLAIN QUERY PLAN 的 detail 列）"""
+        if isinstance(params, list):
+            # execute_many 的参数列表，取第一组参数生成计划
+            params = params[0] if params else ()
+        with self.get_read_connection() as conn:
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+        return [row['detail'] for row in rows]
+    
+    @profiled(len)
     def execute_query(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
         """执行查询语句"""
-        with self.get_connection() as conn:
-            cursor = conn.execute(query, params)
-            return cursor.fetchall()
+        with self._query_connection(query) as conn:
+            return conn.execute(query, params).fetchall()
     
+    @profiled(len)
+    def fetch_dicts(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """执行查询并直接返回字典列表
+        
+        以元组形式取行，每次查询只构建一次列名元组，再用 zip 生成字典，
+        跳过 sqlite3.Row 和逐行 dict(row) 的开销。
+        """
+        with self._query_connection(query) as conn:
+            cursor = self._tuple_cursor(conn)
+            cursor.execute(query, params)
+            columns = cursor_columns(cursor)
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    def iter_query(self, query: str, params: tuple = (), batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """以生成器形式逐行返回字典，按批次 fetchmany，适合流式输出大结果集
+        
+        生成器在耗尽或关闭前一直占用一个连接。
+        """
+        with self._query_connection(query) as conn:
+            cursor = self._tuple_cursor(conn)
+            cursor.execute(query, params)
+            columns = cursor_columns(cursor)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield dict(zip(columns, row))
+    
+    @staticmethod
+    def _tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+        """返回按元组取行的游标（不使用连接上的 sqlite3.Row 工厂）"""
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor
+    
+    @contextmanager
+    def _query_connection(self, query: str) -> Iterator[sqlite3.Connection]:
+        """为 execute_query 类语句选择连接
+        
+        工作单元内使用绑定连接；读语句使用只读连接；single_writer 模式下
+        DDL 等写语句交给写连接并在结束时提交。
+        """
+        bound = self.current_transaction()
+        if bound is not None:
+            yield bound
+        elif self._writer is None or self.is_read_statement(query):
+            with self.get_read_connection() as conn:
+                yield conn
+        else:
+            with self.get_connection() as conn:
+                yield conn
+                if conn.in_transaction:
+                    conn.commit()
+    
+    @profiled(lambda rowcount: max(rowcount, 0))
     def execute_update(self, query: str, params: tuple = ()) -> int:
         """执行更新语句"""
+        bound = self.current_transaction()
+        if bound is not None:
+            return bound.execute(query, params).rowcount
+        
         with self.get_connection() as conn:
             cursor = conn.execute(query, params)
             conn.commit()
             return cursor.rowcount
     
+    @profiled(lambda result: 1)
+    def execute_insert(self, query: str, params: tuple = (),
+                       returning: str = '*') -> Tuple[Optional[int], Optional[sqlite3.Row]]:
+        """执行单条 INSERT，返回 (新行ID, 新行数据)
+        
+        支持 RETURNING 时在同一条语句中取回新行；否则只返回 cursor.lastrowid，
+        新行数据为 None，由调用方自行回读。
+        """
+        if SUPPORTS_RETURNING and returning:
+            query = f'{query.rstrip().rstrip(";")} RETURNING {returning}'
+        
+        bound = self.current_transaction()
+        if bound is not None:
+            return self._run_insert(bound, query, params, returning)
+        
+        with self.get_connection() as conn:
+            result = self._run_insert(conn, query, params, returning)
+            conn.commit()
+            return result
+    
+    @staticmethod
+    def _run_insert(conn: sqlite3.Connection, query: str, params: tuple,
+                    returning: str) -> Tuple[Optional[int], Optional[sqlite3.Row]]:
+        """在指定连接上执行 INSERT"""
+        cursor = conn.execute(query, params)
+        row = cursor.fetchone() if SUPPORTS_RETURNING and returning else None
+        # 读完 RETURNING 结果，语句才算执行完毕
+        cursor.fetchall()
+        return cursor.lastrowid, row
+    
+    @profiled(lambda rowcount: max(rowcount, 0))
     def execute_many(self, query: str, params_list: List[tuple]) -> int:
         """执行批量操作"""
+        bound = self.current_transaction()
+        if bound is not None:
+            return bound.executemany(query, params_list).rowcount
+        
         with self.get_connection() as conn:
             cursor = conn.executemany(query, params_list)
             conn.commit()
@@ -99,25 +722,25 @@ def get_db_connection() -> Iterator[sqlite3.Connection]:
     """获取数据库连接（向后兼容）"""
     return db_manager.get_connection()
 
+def cursor_columns(cursor: sqlite3.Cursor) -> Tuple[str, ...]:
+    """返回游标结果集的列名元组（无结果集的语句返回空元组）"""
+    if cursor.description is None:
+        return ()
+    return tuple(column[0] for column in cursor.description)
+
 def serialize_row(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
-    """将数据库行转换为字典"""
-    if row is None:
-        return None
+    """将数据库行转换为字典，已是字典的行原样返回"""
+    if row is None or isinstance(row, dict):
+        return row
     return dict(row)
 
 def serialize_rows(rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
-    """将多行数据库记录转换为字典列表"""
-    return [serialize_row(row) for row in rows]
+    """将多行数据库记录转换为字典列表，已是字典的行不再复制"""
+    return [row if isinstance(row, dict) else dict(row) for row in rows]
 
 def init_database():
-    """初始化数据库"""
-    from models.category import Category
-    from models.product import Product
-    from models.bom import BOM
-    from models.transaction import Transaction
-    from models.order import Order
-    from models.order_item import OrderItem
-    from models.production import ProductionPlan
+    """初始化数据库：按 PRAGMA user_version 执行未应用的结构迁移"""
+    from utils.migrations import migrate
     
     # 确保数据目录存在
     config.ensure_data_dir()
@@ -125,26 +748,20 @@ def init_database():
     logger.info("开始初始化数据库...")
     logger.debug("数据库路径: %s", config.DATABASE_PATH)
     
-    # 创建所有表
-    tables = [
-        Category,
-        Product,
-        BOM,
-        Transaction,
-        Order,
-        OrderItem,
-        ProductionPlan
-    ]
-    
-    for table_class in tables:
-        try:
-            table_class.create_table()
-            logger.debug("创建表: %s", table_class.__name__)
-        except Exception as e:
-            logger.error("创建表 %s 失败: %s", table_class.__name__, e)
-            raise
+    try:
+        version = migrate()
+    except Exception as e:
+        logger.error("数据库迁移失败: %s", e)
+        raise
+    
+    # 统计信息过期时重新分析，保证规划器使用复合索引
+    try:
+        from utils.query_optimizer import IndexManager
+        IndexManager.optimize()
+    except Exception as e:
+        logger.warning("PRAGMA optimize 执行失败: %s", e)
     
-    logger.info("数据库初始化完成")
+    logger.info("数据库初始化完成，结构版本: %s", version)
 
 def get_last_insert_id(conn: sqlite3.Connection) -> Optional[int]:
     """获取最后插入的行ID"""
@@ -0,0 +1,340 @@
+"""数据库结构版本迁移
+
+迁移按版本号登记，当前结构版本保存在 SQLite 的 PRAGMA user_version 中。
+启动时只读取一次 user_version，版本已是最新则不做任何探测；否则按顺序
+执行未应用的迁移，每个迁移和版本号更新在同一个事务内提交。
+"""
+import sqlite3
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from utils.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Migration:
+    """一个结构迁移"""
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, description: str):
+    """登记迁移的装饰器，版本号必须严格递增"""
+    def decorator(func: Callable[[sqlite3.Connection], None]) -> Callable[[sqlite3.Connection], None]:
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"迁移版本号必须递增: {version} <= {MIGRATIONS[-1].version}")
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return decorator
+
+def latest_version() -> int:
+    """已登记迁移的最新版本号"""
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+def get_schema_version() -> int:
+    """读取数据库当前结构版本"""
+    rows = db_manager.execute_query('PRAGMA user_version')
+    return rows[0][0] if rows else 0
+
+def migrate(target: Optional[int] = None) -> int:
+    """把数据库迁移到目标版本（默认最新），返回迁移后的版本号"""
+    target = latest_version() if target is None else target
+    current = get_schema_version()
+    if current >= target:
+        logger.debug("数据库结构已是最新版本: %s", current)
+        return current
+
+    for item in MIGRATIONS:
+        if item.version <= current or item.version > target:
+            continue
+        with db_manager.transaction() as conn:
+            # 持有写锁后再确认一次，避免多个进程同时启动时重复执行
+            applied = conn.execute('PRAGMA user_version').fetchone()[0]
+            if applied >= item.version:
+                current = applied
+                continue
+            logger.info("执行数据库迁移 %s: %s", item.version, item.description)
+            item.apply(conn)
+            conn.execute(f'PRAGMA user_version = {int(item.version)}')
+        current = item.version
+
+    logger.info("数据库结构版本: %s", current)
+    return current
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]):
+    """为旧表补齐缺失的列（columns: 列名 -> 列定义）"""
+    existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+    for column, definition in columns.items():
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            logger.info("补齐列: %s.%s", table, column)
+
+@migration(1, '创建基础表结构')
+def _create_base_tables(conn: sqlite3.Connection):
+    from models.category import Category
+    from models.product import Product
+    from models.bom import BOM
+    from models.transaction import Transaction
+    from models.order import Order
+    from models.order_item import OrderItem
+    from models.production import ProductionPlan
+
+    for table_class in (Category, Product, BOM, Transaction, Order, OrderItem, ProductionPlan):
+        table_class.create_table()
+        logger.debug("创建表: %s", table_class.__name__)
+
+@migration(2, '为旧版本数据库补齐订单、订单项和BOM的新增列')
+def _backfill_legacy_columns(conn: sqlite3.Connection):
+    _add_missing_columns(conn, 'orders', {
+        'seller_name': 'TEXT',
+        'seller_address': 'TEXT',
+        'seller_phone': 'TEXT',
+        'seller_taxNo': 'TEXT',
+        'seller_note': 'TEXT',
+        'shipping_cost': 'DECIMAL(10,2) DEFAULT 0',
+        'status': "TEXT DEFAULT 'pending'",
+    })
+    _add_missing_columns(conn, 'order_items', {
+        'total_price': 'DECIMAL(10,2) NOT NULL DEFAULT 0',
+        'notes': 'TEXT',
+        'unit': "TEXT DEFAULT '个'",
+        'small_box_length': 'DECIMAL(10,2)',
+        'small_box_width': 'DECIMAL(10,2)',
+        'small_box_height': 'DECIMAL(10,2)',
+        'small_box_weight': 'DECIMAL(10,2)',
+        'large_box_units_per_box': 'INTEGER',
+        'large_box_length': 'DECIMAL(10,2)',
+        'large_box_width': 'DECIMAL(10,2)',
+        'large_box_height': 'DECIMAL(10,2)',
+        'large_box_weight': 'DECIMAL(10,2)',
+    })
+    _add_missing_columns(conn, 'bom', {
+        'unit': "TEXT DEFAULT '个'",
+    })
+
+# 迁移 3 的索引：与模型中的实际查询对应，筛选列在前，排序列在后，
+# 统计查询用到的列尽量包含在索引中以便只读索引完成查询。
+# 已应用的迁移不能改变，之后新增的索引由各自的迁移创建。
+QUERY_INDEXES_V3 = (
+    # Product.get_by_category / get_all(category_id=...)
+    'CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id)',
+    # Product.get_all 按名称排序分页
+    'CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)',
+    # Category.get_all_flat: ORDER BY level, name
+    'CREATE INDEX IF NOT EXISTS idx_categories_level_name ON categories (level, name)',
+    # Transaction.get_all / get_recent: ORDER BY transaction_date DESC, created_at DESC
+    'CREATE INDEX IF NOT EXISTS idx_transactions_date_created ON transactions (transaction_date, created_at)',
+    # Transaction.get_all(product_id=...) 及按产品的流水查询
+    'CREATE INDEX IF NOT EXISTS idx_transactions_product_date ON transactions (product_id, transaction_date, created_at)',
+    # 当日/区间出入库统计（覆盖索引，不回表）
+    'CREATE INDEX IF NOT EXISTS idx_transactions_date_type_qty ON transactions (transaction_date, transaction_type, quantity)',
+    # Order.delete: DELETE FROM transactions WHERE reference_no = ?
+    'CREATE INDEX IF NOT EXISTS idx_transactions_reference ON transactions (reference_no)',
+    # Order.get_all: ORDER BY order_date DESC, created_at DESC，可按类型或状态筛选
+    'CREATE INDEX IF NOT EXISTS idx_orders_date_created ON orders (order_date, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_orders_type_date ON orders (order_type, order_date, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_orders_status_date ON orders (status, order_date, created_at)',
+    # OrderItem.get_by_order_id / delete_by_order_id
+    'CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)',
+    'CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items (product_id)',
+    # 按物料反查（物料被哪些产品使用），product_id 由 UNIQUE(product_id, material_id) 覆盖
+    'CREATE INDEX IF NOT EXISTS idx_bom_material ON bom (material_id)',
+    # ProductionPlan.get_all: ORDER BY scheduled_date DESC, created_at DESC，可按状态筛选
+    'CREATE INDEX IF NOT EXISTS idx_production_plans_date ON production_plans (scheduled_date, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_production_plans_status_date ON production_plans (status, scheduled_date, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_production_plans_product ON production_plans (product_id)',
+)
+
+# 迁移 3 删除的旧索引：已被唯一约束或上面的复合索引前缀覆盖
+REDUNDANT_INDEXES_V3 = (
+    'idx_products_sku',  # sku UNIQUE 自带索引
+    'idx_products_composite',
+    'idx_categories_parent',  # 与 idx_categories_parent_id 重复
+    'idx_categories_level',
+    'idx_transactions_product',
+    'idx_transactions_date',
+    'idx_transactions_type',
+    'idx_orders_number',  # order_number UNIQUE 自带索引
+    'idx_orders_type',
+    'idx_orders_status',
+    'idx_orders_date',
+    'idx_bom_product',  # UNIQUE(product_id, material_id) 的前缀
+)
+
+@migration(3, '按实际查询创建复合/覆盖索引，删除冗余索引并收集统计信息')
+def _create_query_indexes(conn: sqlite3.Connection):
+    for index_name in REDUNDANT_INDEXES_V3:
+        conn.execute(f'DROP INDEX IF EXISTS {index_name}')
+    for statement in QUERY_INDEXES_V3:
+        conn.execute(statement)
+    conn.execute('ANALYZE')
+
+@migration(4, '创建产品全文索引 products_fts 及同步触发器')
+def _create_product_fts(conn: sqlite3.Connection):
+    # 外部内容表：索引数据来自 products，不重复存储文本；trigram 分词支持中文子串匹配
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                name, sku, description,
+                content='products', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite 未编译 FTS5 或版本低于 3.34（无 trigram），产品搜索回退到 LIKE
+        logger.warning("无法创建产品全文索引，产品搜索将使用 LIKE: %s", e)
+        return
+
+    for statement in (
+        '''
+        CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, name, sku, description)
+            VALUES (new.id, new.name, new.sku, new.description);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, sku, description)
+            VALUES ('delete', old.id, old.name, old.sku, old.description);
+        END
+        ''',
+        # 只在搜索列变化时重建该行索引，库存数量等字段的更新不触碰全文索引
+        '''
+        CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, sku, description ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, sku, description)
+            VALUES ('delete', old.id, old.name, old.sku, old.description);
+            INSERT INTO products_fts(rowid, name, sku, description)
+            VALUES (new.id, new.name, new.sku, new.description);
+        END
+        ''',
+        "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+    ):
+        conn.execute(statement)
+
+@migration(5, '为订单统计创建覆盖索引')
+def _create_order_stats_index(conn: sqlite3.Connection):
+    # Order.get_statistics: GROUP BY order_type, status 按索引顺序汇总金额（覆盖索引，不回表）；
+    # 类型×状态组合很少，带日期区间时 ANALYZE 后可走 skip-scan，只读区间内的索引项
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_orders_type_status_date
+        ON orders (order_type, status, order_date, total_amount)
+    ''')
+    conn.execute('ANALYZE orders')
+
+@migration(6, '为库存预警创建部分索引')
+def _create_stock_alert_index(conn: sqlite3.Connection):
+    # Product.get_stock_alerts / get_low_stock_products: 只索引处于预警状态的产品，
+    # WHERE 子句须与 Product.STOCK_ALERT_CONDITION 保持一致
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_stock_alert ON products (quantity, name)
+        WHERE quantity <= 0 OR (min_stock > 0 AND quantity <= min_stock)
+    ''')
+    conn.execute('ANALYZE products')
+
+@migration(7, '创建交易日汇总表及同步触发器，并从交易明细回填')
+def _create_transaction_rollup(conn: sqlite3.Connection):
+    # 按 日期 × 产品 × 交易类型 汇总（TransactionRollup），由 transactions 上的触发器同步维护
+    for statement in (
+        '''
+        CREATE TABLE IF NOT EXISTS transaction_daily_rollup (
+            transaction_date DATE NOT NULL,
+            product_id INTEGER NOT NULL,
+            transaction_type TEXT NOT NULL,
+            quantity REAL NOT NULL DEFAULT 0,
+            total_value REAL NOT NULL DEFAULT 0,
+            transaction_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (transaction_date, product_id, transaction_type)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_transaction_rollup_product
+        ON transaction_daily_rollup (product_id, transaction_date)
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS transactions_rollup_ai AFTER INSERT ON transactions BEGIN
+            INSERT INTO transaction_daily_rollup
+                (transaction_date, product_id, transaction_type, quantity, total_value, transaction_count)
+            VALUES (new.transaction_date, new.product_id, new.transaction_type, new.quantity, new.total_value, 1)
+            ON CONFLICT (transaction_date, product_id, transaction_type) DO UPDATE SET
+                quantity = quantity + excluded.quantity,
+                total_value = total_value + excluded.total_value,
+                transaction_count = transaction_count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS transactions_rollup_ad AFTER DELETE ON transactions BEGIN
+            UPDATE transaction_daily_rollup SET
+                quantity = quantity - old.quantity,
+                total_value = total_value - old.total_value,
+                transaction_count = transaction_count - 1
+            WHERE transaction_date = old.transaction_date
+              AND product_id = old.product_id
+              AND transaction_type = old.transaction_type;
+            DELETE FROM transaction_daily_rollup
+            WHERE transaction_date = old.transaction_date
+              AND product_id = old.product_id
+              AND transaction_type = old.transaction_type
+              AND transaction_count <= 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS transactions_rollup_au
+        AFTER UPDATE OF transaction_date, product_id, transaction_type, quantity, total_value ON transactions
+        BEGIN
+            UPDATE transaction_daily_rollup SET
+                quantity = quantity - old.quantity,
+                total_value = total_value - old.total_value,
+                transaction_count = transaction_count - 1
+            WHERE transaction_date = old.transaction_date
+              AND product_id = old.product_id
+              AND transaction_type = old.transaction_type;
+            DELETE FROM transaction_daily_rollup
+            WHERE transaction_date = old.transaction_date
+              AND product_id = old.product_id
+              AND transaction_type = old.transaction_type
+              AND transaction_count <= 0;
+            INSERT INTO transaction_daily_rollup
+                (transaction_date, product_id, transaction_type, quantity, total_value, transaction_count)
+            VALUES (new.transaction_date, new.product_id, new.transaction_type, new.quantity, new.total_value, 1)
+            ON CONFLICT (transaction_date, product_id, transaction_type) DO UPDATE SET
+                quantity = quantity + excluded.quantity,
+                total_value = total_value + excluded.total_value,
+                transaction_count = transaction_count + 1;
+        END
+        ''',
+        # 从已有交易明细回填
+        'DELETE FROM transaction_daily_rollup',
+        '''
+        INSERT INTO transaction_daily_rollup
+            (transaction_date, product_id, transaction_type, quantity, total_value, transaction_count)
+        SELECT transaction_date, product_id, transaction_type,
+               SUM(quantity), SUM(total_value), COUNT(*)
+        FROM transactions
+        GROUP BY transaction_date, product_id, transaction_type
+        ''',
+    ):
+        conn.execute(statement)
+
+@migration(8, '创建 MRP 计划订单表')
+def _create_planned_orders(conn: sqlite3.Connection):
+    # 再生式 MRP 的计划订单（PlannedOrder），每次运行整体替换
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS planned_orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_at TIMESTAMP NOT NULL,
+            product_id INTEGER NOT NULL,
+            order_type TEXT NOT NULL,
+            level INTEGER NOT NULL DEFAULT 0,
+            due_date DATE NOT NULL,
+            gross_requirement REAL NOT NULL DEFAULT 0,
+            scheduled_receipt REAL NOT NULL DEFAULT 0,
+            quantity REAL NOT NULL,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_planned_orders_type_date
+        ON planned_orders (order_type, due_date)
+    ''')
@@ -0,0 +1,48 @@
+"""游标（keyset）分页
+
+按排序键的最后一行取值生成不透明游标，下一页用行值比较
+(col1, col2, ...) > (?, ?, ...) 从索引位置继续扫描，
+页数再深也不需要 OFFSET 跳过前面的行，也不需要每页执行 COUNT(*)。
+"""
+import json
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from utils.error_handler import ValidationError
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """把排序键取值编码为 URL 安全的游标字符串"""
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """解码游标，取值个数必须与排序键列数一致"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError, binascii.Error):
+        raise ValidationError("无效的分页游标", 'cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValidationError("无效的分页游标", 'cursor')
+    return values
+
+def keyset_condition(columns: Sequence[str], cursor: Optional[str], descending: bool = False) -> Tuple[str, List[Any]]:
+    """生成游标之后的行的 WHERE 条件，cursor 为空时返回空条件"""
+    if not cursor:
+        return '', []
+    values = decode_cursor(cursor, len(columns))
+    placeholders = ', '.join(['?'] * len(columns))
+    operator = '<' if descending else '>'
+    return f"({', '.join(columns)}) {operator} ({placeholders})", values
+
+def keyset_order(columns: Sequence[str], descending: bool = False) -> str:
+    """与 keyset_condition 配套的 ORDER BY 片段"""
+    direction = ' DESC' if descending else ''
+    return ', '.join(f'{column}{direction}' for column in columns)
+
+def split_page(rows: List[Dict[str, Any]], limit: int, keys: Sequence[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """查询时多取一行，据此判断是否有下一页并生成 next_cursor"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([rows[-1][key] for key in keys])
@@ -1,8 +1,12 @@
 """性能监控和缓存工具"""
+import os
+import re
 import time
 import functools
 import logging
-from typing import Any, Callable, Dict, Optional
+import threading
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, List, Optional
 from collections import defaultdict
 from datetime import datetime, timedelta
 
@@ -64,6 +68,131 @@ class PerformanceMonitor:
             'p99': sorted(values)[int(len(values) * 0.99)]
         }
 
+# SQL 指纹归一化：字面量替换为 ?，IN 列表折叠，空白压缩
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+def query_fingerprint(query: str) -> str:
+    """生成归一化的查询指纹，参数不同但结构相同的查询归为同一类"""
+    fingerprint = _STRING_LITERAL.sub('?', query)
+    fingerprint = _NUMBER_LITERAL.sub('?', fingerprint)
+    fingerprint = _IN_LIST.sub('IN (...)', fingerprint)
+    return _WHITESPACE.sub(' ', fingerprint).strip()
+
+slow_query_logger = logging.getLogger('slow_query')
+
+class QueryProfiler:
+    """SQL 查询剖析器
+    
+    按查询指纹聚合调用次数、耗时和返回行数；超过阈值的查询连同
+    EXPLAIN QUERY PLAN 一起写入滚动的慢查询日志。
+    """
+    
+    def __init__(self, threshold_ms: float, log_path: Optional[str] = None,
+                 max_fingerprints: int = 500, max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5):
+        self.threshold_ms = threshold_ms
+        self.max_fingerprints = max_fingerprints
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._slow_count = 0
+        if log_path:
+            self._attach_log_handler(log_path, max_bytes, backup_count)
+    
+    @staticmethod
+    def _attach_log_handler(log_path: str, max_bytes: int, backup_count: int):
+        """为慢查询日志挂载滚动文件处理器（同一文件只挂载一次）"""
+        log_path = os.path.abspath(log_path)
+        for handler in slow_query_logger.handlers:
+            if getattr(handler, 'baseFilename', None) == log_path:
+                return
+        try:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            handler = RotatingFileHandler(log_path, maxBytes=max_bytes,
+                                          backupCount=backup_count, encoding='utf-8')
+        except OSError as e:
+            logger.warning("无法创建慢查询日志 %s: %s", log_path, e)
+            return
+        handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s'))
+        slow_query_logger.addHandler(handler)
+        slow_query_logger.setLevel(logging.INFO)
+        # 慢查询记录为多行文本，只写入独立日志，不混入主日志
+        slow_query_logger.propagate = False
+    
+    def record(self, query: str, elapsed_ms: float, rows: int,
+               explain: Optional[Callable[[], List[str]]] = None):
+        """记录一次查询；超过阈值时调用 explain 获取查询计划并写入慢查询日志"""
+        fingerprint = query_fingerprint(query)
+        slow = elapsed_ms >= self.threshold_ms
+        
+        with self._lock:
+            stats = self._stats.get(fingerprint)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    # 淘汰累计耗时最少的指纹，保留真正的热点
+                    coldest = min(self._stats, key=lambda key: self._stats[key]['total_ms'])
+                    del self._stats[coldest]
+                stats = self._stats[fingerprint] = {
+                    'fingerprint': fingerprint,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'rows': 0,
+                    'slow_count': 0,
+                    'last_plan': None,
+                }
+            stats['count'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['rows'] += rows
+            if slow:
+                stats['slow_count'] += 1
+                self._slow_count += 1
+        
+        PerformanceMonitor.record_metric('database_query', elapsed_ms)
+        
+        if slow:
+            plan = None
+            if explain is not None:
+                try:
+                    plan = explain()
+                except Exception as e:
+                    logger.debug("获取查询计划失败: %s", e)
+            with self._lock:
+                if fingerprint in self._stats:
+                    self._stats[fingerprint]['last_plan'] = plan
+            slow_query_logger.info(
+                "耗时 %.2fms 行数 %s\n  SQL: %s\n  计划: %s",
+                elapsed_ms, rows, fingerprint, ' | '.join(plan) if plan else '-'
+            )
+    
+    def top(self, limit: int = 20, sort_by: str = 'total_ms') -> List[Dict[str, Any]]:
+        """按指定指标返回前 N 个查询指纹"""
+        with self._lock:
+            entries = [dict(stats) for stats in self._stats.values()]
+        for entry in entries:
+            entry['avg_ms'] = entry['total_ms'] / entry['count'] if entry['count'] else 0.0
+        entries.sort(key=lambda entry: entry.get(sort_by, 0), reverse=True)
+        return entries[:limit]
+    
+    def summary(self) -> Dict[str, Any]:
+        """返回整体统计"""
+        with self._lock:
+            return {
+                'threshold_ms': self.threshold_ms,
+                'fingerprints': len(self._stats),
+                'queries': sum(stats['count'] for stats in self._stats.values()),
+                'slow_queries': self._slow_count,
+            }
+    
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._stats.clear()
+            self._slow_count = 0
+
 def measure_performance(metric_name: str):
     """性能测量装饰器"""
     def decorator(func: Callable) -> Callable:
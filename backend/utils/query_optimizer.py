@@ -3,7 +3,7 @@ import logging
 from typing import List, Dict, Any, Optional, Union
 from functools import wraps
 from models.base import BaseModel
-from utils.performance import measure_performance, cache
+from utils.performance import measure_performance, cached
 
 logger = logging.getLogger(__name__)
 
@@ -78,7 +78,7 @@ class QueryOptimizer:
         return results
     
     @staticmethod
-    @cache(ttl=60)  # 缓存1分钟
+    @cached(ttl=60)  # 缓存1分钟
     def get_with_cache(
         model_class: BaseModel,
         record_id: int,
@@ -96,109 +96,25 @@ class BatchProcessor:
         data_list: List[Dict[str, Any]],
         batch_size: int = 100
     ) -> int:
-        """批量插入数据"""
+        """批量插入数据，返回成功插入的行数（委托给 model_class.create_many）"""
         if not data_list:
             return 0
         
-        total_inserted = 0
+        result = model_class.create_many(data_list, chunk_size=batch_size)
+        for error in result['errors']:
+            logger.error("单条插入失败: 行号=%s, 错误=%s", error['index'], error['error'])
         
-        for i in range(0, len(data_list), batch_size):
-            batch = data_list[i:i + batch_size]
-            inserted = BatchProcessor._insert_batch(model_class, batch)
-            total_inserted += inserted
-        
-        logger.info("批量插入完成: 总数=%s, 批次大小=%s", total_inserted, batch_size)
-        return total_inserted
-    
-    @staticmethod
-    def _insert_batch(model_class: BaseModel, batch: List[Dict[str, Any]]) -> int:
-        """插入单个批次"""
-        if not batch:
-            return 0
-        
-        # 获取所有字段
-        all_keys = set()
-        for item in batch:
-            all_keys.update(item.keys())
-        
-        columns = list(all_keys)
-        placeholders = ['?' for _ in columns]
-        
-        query = f"""
-            INSERT INTO {model_class.TABLE_NAME} 
-            ({', '.join(columns)}) 
-            VALUES ({', '.join(placeholders)})
-        """
-        
-        # 准备参数
-        params_list = []
-        for item in batch:
-            params = [item.get(col) for col in columns]
-            params_list.append(tuple(params))
-        
-        try:
-            return model_class.execute_many(query, params_list)
-        except Exception as e:
-            logger.error("批量插入失败: %s", e)
-            # 回退到逐条插入
-            return BatchProcessor._insert_individual(model_class, batch)
-    
-    @staticmethod
-    def _insert_individual(model_class: BaseModel, batch: List[Dict[str, Any]]) -> int:
-        """逐条插入（回退方法）"""
-        inserted_count = 0
-        
-        for item in batch:
-            try:
-                model_class.create(**item)
-                inserted_count += 1
-            except Exception as e:
-                logger.error("单条插入失败: %s, 数据: %s", e, item)
-        
-        return inserted_count
+        logger.info("批量插入完成: 总数=%s, 批次大小=%s", result['created'], batch_size)
+        return result['created']
 
 class IndexManager:
-    """索引管理器"""
+    """索引维护
+
+    索引的创建和删除由 utils.migrations 中的各个迁移完成（每个迁移只做自己的DDL），
+    这里只负责运行时的统计信息维护。
+    """
     
     @staticmethod
-    def create_indexes():
-        """创建必要的索引"""
-        indexes = {
-            'products': [
-                'CREATE INDEX IF NOT EXISTS idx_products_sku ON products (sku)',
-                'CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id)',
-                'CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)',
-                'CREATE INDEX IF NOT EXISTS idx_products_composite ON products (is_composite)'
-            ],
-            'categories': [
-                'CREATE INDEX IF NOT EXISTS idx_categories_parent ON categories (parent_id)',
-                'CREATE INDEX IF NOT EXISTS idx_categories_level ON categories (level)'
-            ],
-            'transactions': [
-                'CREATE INDEX IF NOT EXISTS idx_transactions_product ON transactions (product_id)',
-                'CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (transaction_date)',
-                'CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions (transaction_type)'
-            ],
-            'orders': [
-                'CREATE INDEX IF NOT EXISTS idx_orders_number ON orders (order_number)',
-                'CREATE INDEX IF NOT EXISTS idx_orders_type ON orders (order_type)',
-                'CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)',
-                'CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (order_date)'
-            ],
-            'order_items': [
-                'CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)',
-                'CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items (product_id)'
-            ],
-            'bom': [
-                'CREATE INDEX IF NOT EXISTS idx_bom_product ON bom (product_id)',
-                'CREATE INDEX IF NOT EXISTS idx_bom_material ON bom (material_id)'
-            ]
-        }
-        
-        for table, table_indexes in indexes.items():
-            for index_query in table_indexes:
-                try:
-                    BaseModel.execute_query(index_query)
-                    logger.debug("创建索引: %s", index_query)
-                except Exception as e:
-                    logger.warning("创建索引失败 %s: %s", index_query, e)
\ No newline at end of file
+    def optimize():
+        """PRAGMA optimize：只对统计信息过期的表重新分析，开销很小，适合每次启动执行"""
+        BaseModel.execute_update('PRAGMA optimize')
@@ -0,0 +1,260 @@
+"""计量单位（UoM）注册表
+
+单位名称规范化（去空白、小写、别名归一）后驻留为整数ID，每个单位属于一个量纲
+（数量、重量、体积、长度、包装），同量纲单位之间的换算系数预先计算为矩阵，
+按单位ID直接取值。包装单位（箱、小箱、大箱、包）没有全局换算，只按产品换算：
+产品的每小箱件数、每大箱小箱数取自该产品最近一次订单项的装箱数据。
+
+无法换算的单位组合（量纲不同、缺少产品包装数据）保持原值，与原先的换算行为一致。
+"""
+import logging
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+# 量纲
+COUNT = 'count'
+MASS = 'mass'
+VOLUME = 'volume'
+LENGTH = 'length'
+PACKAGE = 'package'
+
+# 内置单位：(名称, 量纲, 折合量纲基准单位的数量, 别名)
+DEFAULT_UNITS = (
+    ('个', COUNT, 1, ('pcs', 'pc', 'ea')),
+    ('件', COUNT, 1, ()),
+    ('套', COUNT, 1, ()),
+    ('g', MASS, 1, ('克',)),
+    ('kg', MASS, 1000, ('公斤', '千克')),
+    ('mg', MASS, 0.001, ('毫克',)),
+    ('t', MASS, 1000000, ('吨',)),
+    ('斤', MASS, 500, ()),
+    ('ml', VOLUME, 1, ('毫升',)),
+    ('l', VOLUME, 1000, ('升',)),
+    ('m³', VOLUME, 1000000, ('m3', '立方米')),
+    ('mm', LENGTH, 1, ('毫米',)),
+    ('cm', LENGTH, 10, ('厘米',)),
+    ('m', LENGTH, 1000, ('米',)),
+    ('小箱', PACKAGE, None, ('箱',)),
+    ('大箱', PACKAGE, None, ()),
+    ('包', PACKAGE, None, ()),
+)
+
+SMALL_BOX = '小箱'
+LARGE_BOX = '大箱'
+
+class UnitRegistry:
+    """计量单位注册表：单位驻留、全局换算矩阵和按产品的包装换算"""
+
+    PACKAGING_QUERY = '''
+        SELECT oi.product_id, COALESCE(NULLIF(oi.unit, ''), p.unit) AS unit,
+               oi.units_per_box, oi.large_box_units_per_box
+        FROM order_items oi
+        JOIN products p ON p.id = oi.product_id
+        WHERE oi.id IN (
+            SELECT MAX(id) FROM order_items
+            WHERE product_id IS NOT NULL
+              AND (units_per_box > 1 OR large_box_units_per_box > 0)
+            GROUP BY product_id
+        )
+    '''
+
+    def __init__(self, units: Iterable[Tuple[str, str, Optional[float], Sequence[str]]] = DEFAULT_UNITS):
+        self._lock = threading.RLock()
+        self._ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.dimensions: List[Optional[str]] = []
+        self._sizes: List[float] = []
+        self._matrix: Optional[np.ndarray] = None
+        # 矩阵的嵌套列表副本，逐项换算时避免 numpy 标量索引开销
+        self._factors: Optional[List[List[float]]] = None
+        # 产品ID -> {包装单位ID: (折合数量, 产品计数单位ID)}；None 表示尚未加载
+        self._packaging: Optional[Dict[int, Dict[int, Tuple[float, int]]]] = None
+        for name, dimension, size, aliases in units:
+            self.register(name, dimension, size, aliases)
+
+    @staticmethod
+    def normalize(name: Optional[str]) -> str:
+        """单位名称规范化：去空白、小写"""
+        return (name or '').strip().lower()
+
+    def register(self, name: str, dimension: Optional[str], size: Optional[float] = None,
+                 aliases: Sequence[str] = ()) -> int:
+        """注册单位（size 为折合量纲基准单位的数量），返回单位ID"""
+        with self._lock:
+            unit_id = self._ids.get(self.normalize(name))
+            if unit_id is None:
+                unit_id = len(self.names)
+                self.names.append(name)
+                self.dimensions.append(dimension)
+                self._sizes.append(float(size) if size else np.nan)
+                self._ids[self.normalize(name)] = unit_id
+                self._matrix = None
+                self._factors = None
+            for alias in aliases:
+                self._ids.setdefault(self.normalize(alias), unit_id)
+            return unit_id
+
+    def unit_id(self, name: Optional[str]) -> int:
+        """单位ID；未注册的单位驻留为无量纲单位（只能与自身换算）"""
+        unit_id = self._ids.get(name)
+        if unit_id is None:
+            unit_id = self._ids.get(self.normalize(name))
+        if unit_id is None:
+            unit_id = self.register((name or '').strip(), None)
+        return unit_id
+
+    def unit_ids(self, names: Sequence[Optional[str]]) -> np.ndarray:
+        """批量取单位ID（每个不同的单位名称只规范化一次）"""
+        ids = {name: self.unit_id(name) for name in set(names)}
+        return np.fromiter((ids[name] for name in names), dtype=np.int64, count=len(names))
+
+    def matrix(self) -> np.ndarray:
+        """全局换算系数矩阵：matrix[a, b] 为 1 个单位 a 折合多少单位 b，不可换算为 NaN"""
+        with self._lock:
+            if self._matrix is None:
+                sizes = np.array(self._sizes, dtype=float)
+                dimensions = np.array([dimension or '' for dimension in self.dimensions])
+                matrix = sizes[:, None] / sizes[None, :]
+                same_dimension = (dimensions[:, None] == dimensions[None, :]) & (dimensions[:, None] != '')
+                matrix[~same_dimension] = np.nan
+                np.fill_diagonal(matrix, 1.0)
+                self._matrix = matrix
+                self._factors = matrix.tolist()
+            return self._matrix
+
+    def factors(self) -> List[List[float]]:
+        """换算矩阵的嵌套列表形式（逐项换算用）"""
+        with self._lock:
+            if self._factors is None:
+                self.matrix()
+            return self._factors
+
+    def factor(self, from_unit: Optional[str], to_unit: Optional[str],
+               product_id: Optional[int] = None) -> Optional[float]:
+        """1 个 from_unit 折合多少 to_unit；给出 product_id 时可换算该产品的包装单位；不可换算返回 None"""
+        from_id, to_id = self.unit_id(from_unit), self.unit_id(to_unit)
+        value = self._factor_by_id(from_id, to_id, product_id)
+        return None if math.isnan(value) else value
+
+    def _factor_by_id(self, from_id: int, to_id: int, product_id: Optional[int]) -> float:
+        factors = self._factors or self.factors()
+        value = factors[from_id][to_id]
+        if not math.isnan(value) or product_id is None:
+            return value
+        packaging = self.packaging().get(product_id)
+        if not packaging:
+            return value
+        # 包装单位先折合为产品计数单位，再按全局矩阵换算
+        amount_from, from_id = packaging.get(from_id, (1.0, from_id))
+        amount_to, to_id = packaging.get(to_id, (1.0, to_id))
+        return amount_from * factors[from_id][to_id] / amount_to
+
+    def convert_quantity(self, quantity: float, from_unit: Optional[str], to_unit: Optional[str],
+                         product_id: Optional[int] = None) -> float:
+        """数量换算，不可换算时返回原值"""
+        factor = self.factor(from_unit, to_unit, product_id)
+        return float(quantity) * factor if factor is not None else float(quantity)
+
+    def convert_price(self, price: float, from_unit: Optional[str], to_unit: Optional[str],
+                      product_id: Optional[int] = None) -> float:
+        """单价换算（每 from_unit 的价格 -> 每 to_unit 的价格），不可换算时返回原价"""
+        if not price:
+            return 0.0
+        factor = self.factor(to_unit, from_unit, product_id)
+        return float(price) * factor if factor is not None else float(price)
+
+    def convert_prices(self, prices: Sequence[float], from_units: Sequence[Optional[str]],
+                       to_units: Sequence[Optional[str]],
+                       product_ids: Optional[Sequence[Optional[int]]] = None) -> np.ndarray:
+        """批量单价换算（每 from_unit 的价格 -> 每 to_unit 的价格），不可换算时保持原价"""
+        return np.asarray(prices, dtype=float) * self._batch_factors(to_units, from_units, product_ids)
+
+    def convert_quantities(self, quantities: Sequence[float], from_units: Sequence[Optional[str]],
+                           to_units: Sequence[Optional[str]],
+                           product_ids: Optional[Sequence[Optional[int]]] = None) -> np.ndarray:
+        """批量数量换算，不可换算时保持原值"""
+        return np.asarray(quantities, dtype=float) * self._batch_factors(from_units, to_units, product_ids)
+
+    def _batch_factors(self, from_units: Sequence[Optional[str]], to_units: Sequence[Optional[str]],
+                       product_ids: Optional[Sequence[Optional[int]]]) -> np.ndarray:
+        """按单位ID从换算矩阵成批取系数，只有缺少全局换算且给出产品时才逐项查包装；不可换算为 1"""
+        from_ids, to_ids = self.unit_ids(from_units), self.unit_ids(to_units)
+        factors = self.matrix()[from_ids, to_ids]
+        if product_ids is not None:
+            for i in np.flatnonzero(np.isnan(factors)):
+                if product_ids[i] is not None:
+                    factors[i] = self._factor_by_id(from_ids[i], to_ids[i], product_ids[i])
+        return np.where(np.isnan(factors), 1.0, factors)
+
+    def packaging(self) -> Dict[int, Dict[int, Tuple[float, int]]]:
+        """按产品的包装换算（首次使用时从订单项加载）"""
+        with self._lock:
+            if self._packaging is None:
+                self._packaging = self._load_packaging()
+            return self._packaging
+
+    def _load_packaging(self) -> Dict[int, Dict[int, Tuple[float, int]]]:
+        """每个产品取最近一次带装箱数据的订单项：每小箱件数、每大箱小箱数"""
+        packaging = {}
+        try:
+            rows = db_manager.fetch_dicts(self.PACKAGING_QUERY)
+        except Exception as e:
+            logger.warning("加载产品包装换算失败: %s", e)
+            return packaging
+        for row in rows:
+            packaging[row['product_id']] = self._box_conversions(
+                row['unit'], row['units_per_box'], row['large_box_units_per_box'])
+        return packaging
+
+    def _box_conversions(self, unit: Optional[str], units_per_box: Any,
+                         large_box_units_per_box: Any) -> Dict[int, Tuple[float, int]]:
+        """订单项装箱数据对应的包装换算：小箱/大箱 → (件数, 件的单位ID)"""
+        unit_id = self.unit_id(unit)
+        units_per_box = float(units_per_box or 1)
+        conversions = {self.unit_id(SMALL_BOX): (units_per_box, unit_id)}
+        if large_box_units_per_box:
+            conversions[self.unit_id(LARGE_BOX)] = (units_per_box * float(large_box_units_per_box), unit_id)
+        return conversions
+
+    @staticmethod
+    def has_packaging(units_per_box: Any, large_box_units_per_box: Any = None) -> bool:
+        """订单项是否带装箱数据（与 PACKAGING_QUERY 的条件一致）"""
+        return float(units_per_box or 1) > 1 or float(large_box_units_per_box or 0) > 0
+
+    def packaging_changed(self, product_id: Any, unit: Optional[str], units_per_box: Any,
+                          large_box_units_per_box: Any = None) -> bool:
+        """写入该订单项后产品的包装换算是否会变化
+
+        不带装箱数据的订单项不参与包装换算；带装箱数据时与已加载的换算比较，
+        尚未加载（或已失效）时视为变化，以便同时失效按旧换算展开的BOM。
+        """
+        if not product_id or not self.has_packaging(units_per_box, large_box_units_per_box):
+            return False
+        with self._lock:
+            if self._packaging is None:
+                return True
+            cached = self._packaging.get(int(product_id))
+        return cached != self._box_conversions(unit, units_per_box, large_box_units_per_box)
+
+    def invalidate_packaging(self):
+        """订单项装箱数据变化后重新加载包装换算"""
+        with self._lock:
+            self._packaging = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """统计"""
+        with self._lock:
+            return {
+                'units': len(self.names),
+                'packaged_products': len(self._packaging) if self._packaging is not None else None
+            }
+
+# 全局计量单位注册表
+uom_registry = UnitRegistry()
@@ -1,6 +1,7 @@
 """数据验证工具"""
 from typing import Any, Dict, List, Optional, Union
 from decimal import Decimal
+from datetime import datetime
 import re
 from utils.error_handler import ValidationError
 from utils.api_response import APIResponse
@@ -97,6 +98,17 @@ class DataValidator:
         
         return decimal_value
     
+    @staticmethod
+    def validate_date(value: Any, field: str) -> str:
+        """验证日期字段（YYYY-MM-DD），返回规范化的日期字符串"""
+        if value is None:
+            raise ValidationError(f"字段 '{field}' 不能为空", field=field)
+        
+        try:
+            return datetime.strptime(str(value).strip(), '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            raise ValidationError(f"字段 '{field}' 必须是 YYYY-MM-DD 格式的日期", field=field)
+    
     @staticmethod
     def validate_positive_number(value: Any, field: str) -> Union[int, float]:
         """验证正数"""
@@ -273,4 +285,38 @@ class OrderValidator:
             if field in data:
                 validated_data[field] = DataValidator.validate_string(data[field], field, min_length=0, max_length=200)
         
-        return validated_data
\ No newline at end of file
+        return validated_data
+
+class TransactionValidator:
+    """交易记录数据验证器"""
+    
+    @staticmethod
+    def validate_create_data(data: Dict[str, Any]) -> Dict[str, Any]:
+        """验证创建交易记录数据"""
+        DataValidator.validate_required(data, ['product_id', 'transaction_type', 'quantity', 'unit_price', 'transaction_date'])
+        
+        validated_data = {}
+        
+        validated_data['product_id'] = DataValidator.validate_integer(data['product_id'], 'product_id', min_value=1)
+        
+        # 验证交易类型
+        transaction_type = DataValidator.validate_string(data['transaction_type'], 'transaction_type')
+        if transaction_type not in ['in', 'out']:
+            raise ValidationError("交易类型必须是 'in' 或 'out'", field='transaction_type')
+        validated_data['transaction_type'] = transaction_type
+        
+        validated_data['quantity'] = DataValidator.validate_float(data['quantity'], 'quantity', min_value=0)
+        validated_data['unit_price'] = DataValidator.validate_float(data['unit_price'], 'unit_price', min_value=0)
+        validated_data['total_value'] = validated_data['quantity'] * validated_data['unit_price']
+        
+        validated_data['transaction_date'] = DataValidator.validate_date(data['transaction_date'], 'transaction_date')
+        
+        # 可选字段统一输出，保证批量插入时列集合一致
+        for field in ['reference_no', 'customer_supplier', 'notes']:
+            value = data.get(field)
+            validated_data[field] = (
+                DataValidator.validate_string(value, field, min_length=0, max_length=500)
+                if value is not None else None
+            )
+        
+        return validated_data